@@ -8,40 +8,56 @@ from Buttons import button
 
 button_images_file_path = "./Buttons/Button_images/"
 
-# 150 x 63 at 1 scale
-undo_button_img = pygame.image.load(button_images_file_path + 'undo_btn.png').convert_alpha()
-undo_button = button.Button(100, 940, undo_button_img, 0.9)
-clearall_button_img = pygame.image.load(button_images_file_path + 'clear_all_btn.png').convert_alpha()
-clearall_button = button.Button(100, 1010, clearall_button_img, 0.9)
+# Buttons are loaded on first use rather than at import time: images can only be converted
+# once a display exists, and headless runs never need them
+_buttonsLoaded = False
 
-edit_startline_button_img = pygame.image.load(button_images_file_path + 'edit_startline_btn.png').convert_alpha()
-edit_startline_button = button.Button(250, 940, edit_startline_button_img, 0.9)
-clear_startline_button_img = pygame.image.load(button_images_file_path + 'clear_startline_btn.png').convert_alpha()
-clear_startline_button = button.Button(250, 1010, clear_startline_button_img, 0.9)
+def _loadButtons():
+    global _buttonsLoaded
+    global undo_button, clearall_button, edit_startline_button, clear_startline_button
+    global add_checkpoint_button, clear_checkpoints_button, add_boundary_button, clear_boundaries_button
+    global finalize_boundary_button, save_button, load_button, change_startpos_button, change_startdir_button
 
-add_checkpoint_button_img = pygame.image.load(button_images_file_path + 'add_checkpoint_btn.png').convert_alpha()
-add_checkpoint_button = button.Button(400, 940, add_checkpoint_button_img, 0.9)
-clear_checkpoints_button_img = pygame.image.load(button_images_file_path + 'clear_checkpoints_btn.png').convert_alpha()
-clear_checkpoints_button = button.Button(400, 1010, clear_checkpoints_button_img, 0.9)
+    # 150 x 63 at 1 scale
+    undo_button_img = pygame.image.load(button_images_file_path + 'undo_btn.png').convert_alpha()
+    undo_button = button.Button(100, 940, undo_button_img, 0.9)
+    clearall_button_img = pygame.image.load(button_images_file_path + 'clear_all_btn.png').convert_alpha()
+    clearall_button = button.Button(100, 1010, clearall_button_img, 0.9)
 
-add_boundary_button_img = pygame.image.load(button_images_file_path + 'add_boundary_btn.png').convert_alpha()
-add_boundary_button = button.Button(550, 940, add_boundary_button_img, 0.9)
-clear_boundaries_button_img = pygame.image.load(button_images_file_path + 'clear_boundaries_btn.png').convert_alpha()
-clear_boundaries_button = button.Button(550, 1010, clear_boundaries_button_img, 0.9)
-finalize_boundary_button_img = pygame.image.load(button_images_file_path + 'finalize_boundary_btn.png').convert_alpha()
-finalize_boundary_button = button.Button(550, 940, finalize_boundary_button_img, 0.9) 
+    edit_startline_button_img = pygame.image.load(button_images_file_path + 'edit_startline_btn.png').convert_alpha()
+    edit_startline_button = button.Button(250, 940, edit_startline_button_img, 0.9)
+    clear_startline_button_img = pygame.image.load(button_images_file_path + 'clear_startline_btn.png').convert_alpha()
+    clear_startline_button = button.Button(250, 1010, clear_startline_button_img, 0.9)
 
-save_button_img = pygame.image.load(button_images_file_path + 'save_btn.png').convert_alpha()
-save_button = button.Button(700, 940, save_button_img, 0.9)
-load_button_img = pygame.image.load(button_images_file_path + 'load_btn.png').convert_alpha()
-load_button = button.Button(700, 1010, load_button_img, 0.9)
+    add_checkpoint_button_img = pygame.image.load(button_images_file_path + 'add_checkpoint_btn.png').convert_alpha()
+    add_checkpoint_button = button.Button(400, 940, add_checkpoint_button_img, 0.9)
+    clear_checkpoints_button_img = pygame.image.load(button_images_file_path + 'clear_checkpoints_btn.png').convert_alpha()
+    clear_checkpoints_button = button.Button(400, 1010, clear_checkpoints_button_img, 0.9)
 
-change_startpos_button_img = pygame.image.load(button_images_file_path + 'change_startpos_btn.png').convert_alpha()
-change_startpos_button = button.Button(850, 940, change_startpos_button_img, 0.9)
-change_startdir_button_img = pygame.image.load(button_images_file_path + 'change_startdir_btn.png').convert_alpha()
-change_startdir_button = button.Button(850, 1010, change_startdir_button_img, 0.9)
+    add_boundary_button_img = pygame.image.load(button_images_file_path + 'add_boundary_btn.png').convert_alpha()
+    add_boundary_button = button.Button(550, 940, add_boundary_button_img, 0.9)
+    clear_boundaries_button_img = pygame.image.load(button_images_file_path + 'clear_boundaries_btn.png').convert_alpha()
+    clear_boundaries_button = button.Button(550, 1010, clear_boundaries_button_img, 0.9)
+    finalize_boundary_button_img = pygame.image.load(button_images_file_path + 'finalize_boundary_btn.png').convert_alpha()
+    finalize_boundary_button = button.Button(550, 940, finalize_boundary_button_img, 0.9) 
+
+    save_button_img = pygame.image.load(button_images_file_path + 'save_btn.png').convert_alpha()
+    save_button = button.Button(700, 940, save_button_img, 0.9)
+    load_button_img = pygame.image.load(button_images_file_path + 'load_btn.png').convert_alpha()
+    load_button = button.Button(700, 1010, load_button_img, 0.9)
+
+    change_startpos_button_img = pygame.image.load(button_images_file_path + 'change_startpos_btn.png').convert_alpha()
+    change_startpos_button = button.Button(850, 940, change_startpos_button_img, 0.9)
+    change_startdir_button_img = pygame.image.load(button_images_file_path + 'change_startdir_btn.png').convert_alpha()
+    change_startdir_button = button.Button(850, 1010, change_startdir_button_img, 0.9)
+
+    _buttonsLoaded = True
 
 def handleButtons(surface, track):
+    """Draws the buttons and handles their clicks, returns the list of rects drawn on"""
+    if not _buttonsLoaded:
+        _loadButtons()
+
     # if (up_button.draw(surface)):
     #     pass
     # if (down_button.draw(surface)):
@@ -74,4 +90,10 @@ def handleButtons(surface, track):
     if change_startpos_button.draw(surface):
         track.editStartPos()
     if change_startdir_button.draw(surface):
-        print('TODO: implement')
\ No newline at end of file
+        print('TODO: implement')
+
+    boundary_button = finalize_boundary_button if track.isEditingBoundary else add_boundary_button
+    return [button.rect for button in (undo_button, clearall_button, edit_startline_button, clear_startline_button,
+                                       add_checkpoint_button, clear_checkpoints_button, boundary_button,
+                                       clear_boundaries_button, save_button, load_button,
+                                       change_startpos_button, change_startdir_button)]
\ No newline at end of file
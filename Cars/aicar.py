@@ -6,9 +6,9 @@ from Cars import car
 from nn import NeuralNetwork
 import random
 from utils import (rotateClockwise2d, 
-                   translate2d, 
-                   doIntersect, 
-                   findIntersectionPoint)
+                   translate2d)
+from raycast import castRays
+from profiling import profiler
 
 # Score parameters
 CHECKPOINT_REWARD = 20
@@ -25,6 +25,11 @@ BRAKE = 0.7
 TURNING_POWER = 1.5 * 0.08726646
 
 class AICar(car.Car):
+    __slots__ = ('drawSensors', 'simpleSensors', 'sensorRange', 'sensors',
+                 'numSensors', 'numActions',
+                 'sensorDistances', 'sensorHits', 'state', '_observed',
+                 'score', 'framesSinceLastReward')
+
     def __init__(self, track):
         """
         Args:
@@ -49,6 +54,12 @@ class AICar(car.Car):
                                                           # hardcoded for now, see self._updateSensors() to see all sensors
         self.numActions = 9 # Also hardcoded, see self.act() to see all possible actions
 
+        # Observation cache, the sensors are cast at most once per sensor update (see _observe)
+        self.sensorDistances = np.zeros(self.numSensors) # What each sensor reads
+        self.sensorHits = np.zeros((self.numSensors, 2)) # Where each sensor hits the track, or its end point
+        self.state = np.zeros(self.numSensors + 1, dtype=np.float32) # See getState
+        self._observed = False
+
         # AI Stuff!            
         self.score = 0
         self.framesSinceLastReward = 0
@@ -59,7 +70,7 @@ class AICar(car.Car):
 
     # NEW TO AICar: Need to give the car an action, first call initializes a lotta stuff but doesnt move the car
     # if no action is given
-    def update(self, surface, action=-1):
+    def update(self, action=-1):
         if not self.alive:
             return
     
@@ -73,45 +84,59 @@ class AICar(car.Car):
         if self.track.editStatus != 0:
             self.reset()
 
-        self._applyFriction()
-        self._drive()
-        self._updateHitboxPoints()
+        with profiler.span("car.physics"):
+            self._applyFriction()
+            self._drive()
+            self._updateHitboxPoints()
 
-        # Just make the car not move after it's moving slowly enough
-        if (self.getSpeed() < 0.1):
-            self.vel = [0, 0]
+            # Just make the car not move after it's moving slowly enough
+            if (self.getSpeed() < 0.1):
+                self._stop()
 
-        self.score += REWARD_DECAY # If car doesnt make progress it loses points
+            self.score += REWARD_DECAY # If car doesnt make progress it loses points
 
-        if self._isCrashed():
+        with profiler.span("car.crash"):
+            crashed = self._isCrashed()
+        if crashed:
             self.kill()
             return
         
-        if self._passedCheckpoint():
-            self.checkpointsPassed += 1
-            self.score += CHECKPOINT_REWARD
-            self.framesSinceLastReward = 0
-        if self._finishedLap():
-            self.lapsDone += 1
-            self.checkpointsPassed = 0
-            self.score += CHECKPOINT_REWARD       
-            self.framesSinceLastReward = 0     
-
-        self._updateSensors()
+        with profiler.span("car.checkpoints"):
+            if self._passedCheckpoint():
+                self.checkpointsPassed += 1
+                self.score += CHECKPOINT_REWARD
+                self.framesSinceLastReward = 0
+            if self._finishedLap():
+                self.lapsDone += 1
+                self.checkpointsPassed = 0
+                self.score += CHECKPOINT_REWARD       
+                self.framesSinceLastReward = 0     
+
+        with profiler.span("car.sensors"):
+            self._updateSensors()
+
+    def draw(self, surface):
+        """Draws the car and its sensors, returns the list of rects drawn on"""
+        if not self.alive:
+            return []
+        rects = []
         if self.drawSensors:
-            self._drawSensors(surface)
-
-        self._drawCar(surface)
+            rects += self._drawSensors(surface)
+        return rects + self._drawCar(surface)
 
 
     #============================================================================
     # AI Stuff
     def getState(self):
-        """Returns the current state of the car"""
-        # Sensor distance + current speed
-        sensor_data = self.getSensorData() 
-        state = sensor_data + [self.getSpeed()]
-        return state
+        """Returns the current state of the car: every sensor distance then the current speed
+
+        The state is written into the same float32 buffer every time, so it can be viewed as a
+        tensor with torch.from_numpy without copying. Copy it to keep it past the next update.
+        """
+        self._observe()
+        self.state[:self.numSensors] = self.sensorDistances
+        self.state[self.numSensors] = self.getSpeed()
+        return self.state
 
     def act(self, action=-1):
         """Car takes a given action
@@ -169,7 +194,7 @@ class AICar(car.Car):
 
         # These sensors mimic the viewpoints of a human driver in the front-center of the car!
         A, B, C, D = self.hitboxPoints
-        x, y = self.pos
+        x, y = self.x, self.y
 
         front_middle = ((A[0] + B[0]) / 2, (A[1] + B[1]) / 2) # Midpoint of front bumper
 
@@ -208,56 +233,47 @@ class AICar(car.Car):
             start_point, rot = data
             self.sensors.append((start_point, translate2d(start_point, rotateClockwise2d(base_sensor, self.direction + rot))))
 
+        # The sensors moved, what they read has to be cast again
+        self._observed = False
+
     def getSensorData(self):
-        distances = []
-        for sensor in self.sensors:
-            distance, _ = self._findMinDistanceSensorIntersection(sensor)
-            distances.append(distance)
-        return distances
+        self._observe()
+        return self.sensorDistances.tolist()
 
-    def _drawSensors(self, surface):
-        """Draws the sensors and what they're reading
-        
-        NOTE: current implementation has redundant calculation call
-        TODO: modularize the method call to calculate sensor readings
-        """
-        for sensor in self.sensors:
-            _, intersection = self._findMinDistanceSensorIntersection(sensor)
-            pygame.draw.line(surface, 'blue', sensor[0], intersection)
-            pygame.draw.circle(surface, 'red', intersection, 5)
-    
-    def _findMinDistanceSensorIntersection(self, sensor):
-        """Finds closest point on the car's track to the car along the given line
+    def _observe(self):
+        """Casts the sensors into sensorDistances and sensorHits, unless they haven't moved since last time"""
+        if self._observed or len(self.sensors) == 0:
+            return
 
-        Args:
-            sensor: a tuple representing the line extending from the car. ((p1x, p1y), (p2x, p2y))
-                (p1x, p1y) is the point originating at the car
+        # All sensors are cast in one batched pass, see raycast.castRays, against only
+        # the segments in the grid cells the sensors pass through
+        with profiler.span("car.raycast"):
+            table = self.track.sensorTable
+            if table is None:
+                segments = self.track.segmentGrid.segmentsAlongRays(self.sensors)
+                distances, points = castRays(self.sensors, segments)
+            else:
+                # Sensors the table can't answer are cast exactly, the others hit the track
+                # that far along the sensor
+                rays = np.asarray(self.sensors, dtype=np.float64).reshape(-1, 4)
+                distances = table.lookup(rays)
+                points = rays[:, 0:2] + (rays[:, 2:4] - rays[:, 0:2]) * (distances / table.sensorRange)[:, None]
+                missing = np.isnan(distances)
+                if missing.any():
+                    rays = rays[missing].reshape(-1, 2, 2)
+                    distances[missing], points[missing] = castRays(rays, self.track.segmentGrid.segmentsAlongRays(rays))
+        self.sensorDistances[:] = distances
+        self.sensorHits[:] = points
+        self._observed = True
 
-        Returns:
-            (distance, (ix, iy)) where distance is min(length of line, closest point on track to the car)
-                and (ix, iy) is the point of intersection on the track of the closest point to the car
-                or (p2x, p2y) if there is no such intersection
-        """
-        p1, p2 = sensor
-        # By default, sensor 'detects' the furthest possible point from the car using given line segment
-        min_distance = math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
-        best_intersection = p2
-
-        for boundary in self.track.trackpoints:
-            for i in range(-1, len(boundary) - 1):
-                if doIntersect(
-                    p1,
-                    p2,
-                    boundary[i], 
-                    boundary[i + 1]
-                ):
-                    intersection = findIntersectionPoint(p1, p2, boundary[i], boundary[i + 1])
-                    distance = math.sqrt((p1[0] - intersection[0])**2 + (p1[1] - intersection[1])**2)
-                    if distance < min_distance:
-                        min_distance = distance
-                        best_intersection = intersection
-
-        return (min_distance, best_intersection)
+    def _drawSensors(self, surface):
+        """Draws the sensors and what they're reading"""
+        self._observe()
+        rects = []
+        for sensor, intersection in zip(self.sensors, self.sensorHits.tolist()):
+            rects.append(pygame.draw.line(surface, 'blue', sensor[0], intersection))
+            rects.append(pygame.draw.circle(surface, 'red', intersection, 5))
+        return rects
     
     def kill(self):
         if not self.autoRespawn:
@@ -266,6 +282,7 @@ class AICar(car.Car):
 
     def reset(self):
         super().reset()
+        self._updateSensors()
         self.framesSinceLastReward = 0
         self.score = 0
 
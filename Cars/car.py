@@ -1,6 +1,6 @@
 import math
 import pygame
-from utils import rotateClockwise2d, translate2d, doIntersect
+from utils import doIntersect
 
 # Few things to note due to pygame coordinate plane having positive y going downwards:
 # - All rotations within this method are CLCKWISE w.r.t theta (rad)
@@ -8,6 +8,14 @@ from utils import rotateClockwise2d, translate2d, doIntersect
 #   - Rotating by theta CLOCKWISE in this new unit circle is the equivalent of moving theta COUNTERCLOCKWISE in the normal unit circle
 
 class Car:
+    # Cars are made by the thousand for training, slots keep each one small and attribute access fast
+    __slots__ = ('alive', 'immortal', 'autoRespawn',
+                 'x', 'y', '_direction', '_cos', '_sin', 'hitboxPoints',
+                 'width', 'height',
+                 'vx', 'vy', '_speed', 'friction', 'driftFactor',
+                 'lapsDone', 'checkpointsPassed',
+                 'track')
+
     def __init__(self, track): # Note: a car is assigned to a track at instantiation
         # Setup
         self.alive = True
@@ -15,9 +23,10 @@ class Car:
         self.autoRespawn = True
 
         # Positioning
-        self.pos = track.startPos[:] # Stores the car's current position
+        self.x, self.y = track.startPos # The car's current position, also available as pos
         self.direction = track.startDir # Represents the direction the car faces.
                                         # is the number of radians turned CLOCKWISE from theta=0
+                                        # Setting it also caches its cos and sin, see direction
         self.hitboxPoints = ((0, 0),(0, 0),(0, 0),(0, 0)) # Represents rectangle ABCD where A is the front left point of the car, points move CLOCKWISE
 
         # Dimensions
@@ -25,7 +34,9 @@ class Car:
         self.height = self.width * 2
 
         # Movement
-        self.vel = [0, 0]
+        self.vx = 0.0 # Velocity, also available as vel
+        self.vy = 0.0
+        self._speed = 0.0 # Cached length of the velocity, None when it needs recomputing (see getSpeed)
         self.friction = 1.1
         self.driftFactor = 0.02
 
@@ -37,9 +48,9 @@ class Car:
         self.track = track
 
     
-    # Call this method to update the car every frame
+    # Call this method to update the car every frame, only steps the physics (see draw)
     # Will reset the car if it detects its track is being edited
-    def update(self, surface):
+    def update(self):
         if self.track.editStatus != 0:
             self.reset()
         self._applyFriction()
@@ -48,7 +59,7 @@ class Car:
 
         # Just make the car not move after it's moving slowly enough
         if (self.getSpeed() < 0.1):
-            self.vel = [0, 0]
+            self._stop()
         
         if self._isCrashed():
             self.kill()
@@ -59,13 +70,11 @@ class Car:
             self.checkpointsPassed = 0
             print('laps done: ', self.lapsDone)
 
-        self._drawCar(surface)
-
     #================================================================
     # Movement
     def _drive(self):
-        self.pos[0] += self.vel[0]
-        self.pos[1] += self.vel[1]
+        self.x += self.vx
+        self.y += self.vy
 
     # When turning, the car's velocity is going in one direction, but is accelerating
     # in a different direction (the direction the tires face). 
@@ -74,41 +83,56 @@ class Car:
         self.direction += math.log(self.getSpeed() + 1) / 3 * rad
 
     def accelerate(self, boost):
-        self.vel[0] += boost * math.cos(self.direction)
-        self.vel[1] += boost * math.sin(self.direction)
+        self.vx += boost * self._cos
+        self.vy += boost * self._sin
+        self._speed = None
 
     def _applyFriction(self):
-        self.vel[0] /= self.friction
-        self.vel[1] /= self.friction
+        self.vx /= self.friction
+        self.vy /= self.friction
+        self._speed = None
+
+    def _stop(self):
+        self.vx = 0.0
+        self.vy = 0.0
+        self._speed = 0.0
 
     # TODO - FIX AND RUN IN CAR UPDATE
     # just add some horizontal movement
     def _applyDrift(self, goingRight):
         # Reduce the speed in the direction car is currently moving and then
         # accelerate perpendicular to the car
+        # Note: the y component uses the speed after the x component has already changed
         if goingRight:
-            self.vel[0] = (self.vel[0] * self.driftFactor) + (1 - self.driftFactor) * math.cos(self.direction) * self.getSpeed()
-            self.vel[1] = (self.vel[1] * self.driftFactor) + (1 - self.driftFactor) * math.sin(self.direction) * self.getSpeed()
+            self.vx = (self.vx * self.driftFactor) + (1 - self.driftFactor) * self._cos * self.getSpeed()
+            self._speed = None
+            self.vy = (self.vy * self.driftFactor) + (1 - self.driftFactor) * self._sin * self.getSpeed()
         else:
-            self.vel[0] = (self.vel[0] * self.driftFactor) - (1 - self.driftFactor) * math.cos(self.direction) * self.getSpeed()
-            self.vel[1] = (self.vel[1] * self.driftFactor) - (1 - self.driftFactor) * math.sin(self.direction) * self.getSpeed()
+            self.vx = (self.vx * self.driftFactor) - (1 - self.driftFactor) * self._cos * self.getSpeed()
+            self._speed = None
+            self.vy = (self.vy * self.driftFactor) - (1 - self.driftFactor) * self._sin * self.getSpeed()
+        self._speed = None
         
     # Fully resets the car to it's starting values
     def reset(self):
         self.alive = True
-        self.pos = self.track.startPos[:]
+        self.x, self.y = self.track.startPos
         self.direction = self.track.startDir
-        self.vel = [0, 0]
+        self._stop()
         self._updateHitboxPoints()
         self.checkpointsPassed = 0
 
     #================================================================
     # Display
+    def draw(self, surface):
+        """Draws the car, returns the list of rects drawn on"""
+        return self._drawCar(surface)
+
     def _drawCar(self, surface):
         A, B, C, D = self.hitboxPoints
 
         # Main car frame
-        pygame.draw.polygon(surface, 'black', [A, B, C, D])
+        rect = pygame.draw.polygon(surface, 'black', [A, B, C, D])
 
         # Headlights
         # pygame.draw.ellipse(surface, 'white', pygame.Rect(
@@ -117,32 +141,54 @@ class Car:
         #     4,
         #     4
         # ))
+        return [rect]
 
     # ALWAYS call right after updating car position, speed, direction, etc for precise collision detection detection
     def _updateHitboxPoints(self):
         # Note: when direction = 0 radians, the car faces "right" (along the positive x direction)
-        self.hitboxPoints = (translate2d(self.pos, rotateClockwise2d((self.height / 2, -self.width / 2), self.direction)),
-                             translate2d(self.pos, rotateClockwise2d((self.height / 2, self.width / 2), self.direction)),
-                             translate2d(self.pos, rotateClockwise2d((-self.height / 2, self.width / 2), self.direction)),
-                             translate2d(self.pos, rotateClockwise2d((-self.height / 2, -self.width / 2), self.direction)))
+        # Same as translating pos by each corner (+-height / 2, +-width / 2) rotated by utils.rotateClockwise2d,
+        # written out so the products are shared. Opposite corners are mirrored through pos.
+        half_height = self.height / 2
+        half_width = self.width / 2
+        hc = half_height * self._cos
+        hs = half_height * self._sin
+        wc = half_width * self._cos
+        ws = half_width * self._sin
+        x, y = self.x, self.y
+        self.hitboxPoints = ((x + (hc + ws), y + (hs - wc)),
+                             (x + (hc - ws), y + (hs + wc)),
+                             (x - (hc + ws), y - (hs - wc)),
+                             (x - (hc - ws), y - (hs + wc)))
 
     #================================================================
     # Collision Detection
     def _isCrashed(self):
         A, B, C, D = self.hitboxPoints
-        
-        for boundary in self.track.trackpoints:
-            for i in range(-1, len(boundary) - 1):
-                if doIntersect(
-                    A, B, boundary[i], boundary[i + 1]
-                ) or doIntersect(
-                    B, C, boundary[i], boundary[i + 1]
-                ) or doIntersect(
-                    C, D, boundary[i], boundary[i + 1]
-                ) or doIntersect(
-                    D, A, boundary[i], boundary[i + 1]
-                ):
-                    return True       
+
+        # Cars far enough from every wall can't be crashed, see Track.enableDistanceField
+        field = self.track.getDistanceField()
+        if field is not None:
+            samples = (A, B, C, D, _midpoint(A, B), _midpoint(B, C), _midpoint(C, D), _midpoint(D, A))
+            # A wall crossing an edge passes within a quarter of the edge's length of one of its samples
+            if field.isClear(samples, max(self.width, self.height) / 4):
+                return False
+
+        # Only the segments in grid cells overlapping the hitbox can touch it
+        xs = (A[0], B[0], C[0], D[0])
+        ys = (A[1], B[1], C[1], D[1])
+        nearby_segments = self.track.segmentGrid.query(min(xs), min(ys), max(xs), max(ys))
+
+        for p, q in nearby_segments:
+            if doIntersect(
+                A, B, p, q
+            ) or doIntersect(
+                B, C, p, q
+            ) or doIntersect(
+                C, D, p, q
+            ) or doIntersect(
+                D, A, p, q
+            ):
+                return True       
         return False
 
     def _passedCheckpoint(self):
@@ -202,4 +248,39 @@ class Car:
     #================================================================
     # Calculations
     def getSpeed(self):
-        return math.sqrt(self.vel[0]**2 + self.vel[1]**2)
+        if self._speed is None:
+            self._speed = math.sqrt(self.vx**2 + self.vy**2)
+        return self._speed
+
+    #================================================================
+    # State
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        # Every use of the direction needs its cos and sin, so they are computed once per change
+        self._direction = direction
+        self._cos = math.cos(direction)
+        self._sin = math.sin(direction)
+
+    @property
+    def pos(self):
+        return (self.x, self.y)
+
+    @pos.setter
+    def pos(self, pos):
+        self.x, self.y = pos
+
+    @property
+    def vel(self):
+        return (self.vx, self.vy)
+
+    @vel.setter
+    def vel(self, vel):
+        self.vx, self.vy = vel
+        self._speed = None
+
+def _midpoint(p, q):
+    return ((p[0] + q[0]) / 2, (p[1] + q[1]) / 2)
@@ -0,0 +1,57 @@
+import numpy as np
+from Cars.car_fleet import CarFleet
+
+class VecCarEnv:
+    """Gym style vectorized environment of num_envs AICars driving the same track
+
+    Every environment is one car of a CarFleet, so stepping all of them is a single
+    vectorized call. An environment whose car dies is reset on its own straight away.
+    """
+
+    def __init__(self, track, num_envs):
+        self.num_envs = num_envs
+        self.fleet = CarFleet(track, num_envs)
+        self.observationSize = self.fleet.numSensors + 1
+        self.numActions = self.fleet.numActions
+
+        # The fleet overwrites its states every step, so they are handed out from two buffers
+        # taking turns. A step's states stay valid through the next step, which is what lets
+        # them be used as the old states of the following experience without a copy.
+        self._states = np.zeros((2, num_envs, self.observationSize), dtype=np.float32)
+        self._current = 0
+
+    def reset(self):
+        """Resets every environment
+
+        Returns:
+            states: float32 array of shape (num_envs, observationSize), overwritten by the step after next
+        """
+        self.fleet.reset()
+        return self._handOut(self.fleet.getStates())
+
+    def step(self, actions):
+        """Takes one action in every environment
+
+        Args:
+            actions: int array of shape (num_envs,)
+        Returns:
+            (states, rewards, dones)
+            states: float32 array (num_envs, observationSize), the state after the action or the
+                    first state of the new episode for environments that were just reset.
+                    Overwritten by the step after next
+            rewards: float array (num_envs,), change in each car's score
+            dones: bool array (num_envs,), whether each car died and its environment was reset
+        """
+        old_scores = self.fleet.score.copy()
+        self.fleet.step(actions)
+        rewards = self.fleet.score - old_scores
+
+        dones = ~self.fleet.alive
+        if dones.any():
+            self.fleet.reset(np.flatnonzero(dones))
+        return self._handOut(self.fleet.getStates()), rewards, dones
+
+    def _handOut(self, states):
+        self._current = 1 - self._current
+        np.copyto(self._states[self._current], states)
+        return self._states[self._current]
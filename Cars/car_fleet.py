@@ -0,0 +1,333 @@
+import math
+import numpy as np
+import pygame
+from Cars.aicar import (CHECKPOINT_REWARD,
+                        REWARD_DECAY,
+                        PURGE_FRAME_THRESHOLD,
+                        FORWARD_REWARD,
+                        TURN_REWARD,
+                        BACKWARDS_REWARD,
+                        CRASH_REWARD,
+                        ACCELERATION,
+                        BRAKE,
+                        TURNING_POWER)
+from raycast import castRays
+from vec_utils import segmentsIntersect, rotateTranslate2d
+from profiling import profiler
+
+# Per action (see AICar.act): (boost passed to accelerate, rad passed to turn, score change)
+# Index -1 (the last row) is "no action"
+ACTION_TABLE = np.array([
+    (ACCELERATION, 0, FORWARD_REWARD), # W
+    (0, -TURNING_POWER, TURN_REWARD), # A
+    (-BRAKE, 0, BACKWARDS_REWARD), # S
+    (0, TURNING_POWER, TURN_REWARD), # D
+    (ACCELERATION, -TURNING_POWER, (FORWARD_REWARD + TURN_REWARD)), # W + A
+    (ACCELERATION, TURNING_POWER, (FORWARD_REWARD + TURN_REWARD)), # W + D
+    (ACCELERATION - BRAKE, 0, (FORWARD_REWARD + BACKWARDS_REWARD)), # W + S
+    (ACCELERATION - BRAKE, -TURNING_POWER, (FORWARD_REWARD + BACKWARDS_REWARD + TURN_REWARD)), # W + S + A
+    (ACCELERATION - BRAKE, TURNING_POWER, (FORWARD_REWARD + BACKWARDS_REWARD + TURN_REWARD)), # W + S + D
+    (0, 0, 0), # No action
+])
+
+# Above this many car-segment pairs, crash tests of cars near a wall look up the segments
+# around each car instead of testing every car against every segment
+MAX_BRUTE_FORCE_CRASH_PAIRS = 1 << 16
+
+# Sensor directions relative to the car, in the same order as AICar._updateSensors
+FRONT_SENSOR_ANGLES = [-math.pi/5, -math.pi/3, -math.pi/2, 0, math.pi/2, -math.pi/3, math.pi/5]
+MIRROR_SENSOR_ANGLES = [13*math.pi/12, 11*math.pi/12, 5*math.pi/6, 7*math.pi/6]
+
+class CarFleet:
+    """Structure-of-arrays version of a population of AICars
+
+    Steps the physics, hitboxes, sensors and reward/kill rules of every live car at once.
+    Follows the exact same rules as AICar.update, car i's state lives at index i of every array.
+    """
+
+    def __init__(self, track, num_cars, simpleSensors=False):
+        self.track = track
+        self.num_cars = num_cars
+
+        # Same parameters as Car and AICar
+        self.width = 15
+        self.height = self.width * 2
+        self.friction = 1.1
+        self.sensorRange = 800
+        self.simpleSensors = simpleSensors
+        self.numSensors = 7 if simpleSensors else 11
+        self.numActions = 9
+
+        # Car state
+        self.pos = np.zeros((num_cars, 2))
+        self.vel = np.zeros((num_cars, 2))
+        self.direction = np.zeros(num_cars)
+        self.hitboxPoints = np.zeros((num_cars, 4, 2)) # ABCD like Car.hitboxPoints
+        self.sensors = np.zeros((num_cars, self.numSensors, 4)) # Sensor rays like AICar.sensors
+
+        # Trackers and AI stuff
+        self.alive = np.zeros(num_cars, dtype=bool)
+        self.score = np.zeros(num_cars)
+        self.framesSinceLastReward = np.zeros(num_cars, dtype=np.int64)
+        self.checkpointsPassed = np.zeros(num_cars, dtype=np.int64)
+        self.lapsDone = np.zeros(num_cars, dtype=np.int64)
+
+        # Observation cache, the sensors are cast at most once per step (see getStates)
+        self.states = np.zeros((num_cars, self.numSensors + 1), dtype=np.float32)
+        self._observed = False
+
+        # Hitbox corners relative to the car when it faces theta = 0, see Car._updateHitboxPoints
+        self._hitboxOffsets = np.array([(self.height / 2, -self.width / 2),
+                                        (self.height / 2, self.width / 2),
+                                        (-self.height / 2, self.width / 2),
+                                        (-self.height / 2, -self.width / 2)])
+        self._sensorAngles = np.array(FRONT_SENSOR_ANGLES + ([] if simpleSensors else MIRROR_SENSOR_ANGLES))
+
+        self.reset()
+
+    #============================================================================
+    # Simulation
+
+    def reset(self, indices=None):
+        """Resets the given cars (all by default) to the track's start, like AICar.reset"""
+        if indices is None:
+            indices = np.arange(self.num_cars)
+        self.alive[indices] = True
+        self.pos[indices] = self.track.startPos
+        self.direction[indices] = self.track.startDir
+        self.vel[indices] = 0
+        self.checkpointsPassed[indices] = 0
+        self.framesSinceLastReward[indices] = 0
+        self.score[indices] = 0
+        self._updateHitboxPoints(indices)
+        self._updateSensors(indices)
+        self._observed = False
+
+    def step(self, actions):
+        """Updates every live car once, the vectorized AICar.update
+
+        Args:
+            actions: int array of shape (num_cars,), action for each car or -1 for no action
+                     (dead cars' actions are ignored)
+        """
+        live = np.flatnonzero(self.alive)
+        if len(live) == 0:
+            return
+        boost, rad, reward = ACTION_TABLE[np.asarray(actions)[live]].T
+
+        # Act: accelerate, then turn with the new speed
+        self.vel[live, 0] += boost * np.cos(self.direction[live])
+        self.vel[live, 1] += boost * np.sin(self.direction[live])
+        self.direction[live] += np.log(self._getSpeed(live) + 1) / 3 * rad
+        self.score[live] += reward
+
+        # Kill off cars that have not been rewarded in a while
+        self.framesSinceLastReward[live] += 1
+        purged = live[self.framesSinceLastReward[live] >= PURGE_FRAME_THRESHOLD]
+        self.kill(purged)
+        live = live[self.alive[live]]
+
+        if self.track.editStatus != 0:
+            self.reset(live)
+
+        # Physics
+        with profiler.span("fleet.physics"):
+            self.vel[live] /= self.friction
+            self.pos[live] += self.vel[live]
+            self._updateHitboxPoints(live)
+
+            # Just make the car not move after it's moving slowly enough
+            self.vel[live[self._getSpeed(live) < 0.1]] = 0
+
+            self.score[live] += REWARD_DECAY # If car doesnt make progress it loses points
+
+        with profiler.span("fleet.crash"):
+            crashed = live[self._isCrashed(live)]
+            self.kill(crashed)
+            live = live[self.alive[live]]
+
+        with profiler.span("fleet.checkpoints"):
+            passed = live[self._crossesLine(live, self._nextCheckpoints(live))]
+            self.checkpointsPassed[passed] += 1
+            self.score[passed] += CHECKPOINT_REWARD
+            self.framesSinceLastReward[passed] = 0
+
+            compiled = self.track.getCompiled()
+            lapping = live[self.checkpointsPassed[live] == len(compiled.checkpoints)]
+            start_line = np.broadcast_to(compiled.startLine, (len(lapping), 4))
+            finished = lapping[self._crossesLine(lapping, start_line)]
+            self.lapsDone[finished] += 1
+            self.checkpointsPassed[finished] = 0
+            self.score[finished] += CHECKPOINT_REWARD
+            self.framesSinceLastReward[finished] = 0
+
+        with profiler.span("fleet.sensors"):
+            self._updateSensors(live)
+        self._observed = False
+
+    def kill(self, indices):
+        self.alive[indices] = False
+        self.score[indices] += CRASH_REWARD
+        self._observed = False
+
+    #============================================================================
+    # AI Stuff
+
+    def getStates(self):
+        """Returns the state of every car like AICar.getState, shape (num_cars, numSensors + 1)
+
+        Dead cars get a zero state. The sensors are only cast again once the cars have moved,
+        and the states are always written into the same float32 buffer (states) so it can be
+        viewed as a tensor with torch.from_numpy without copying. Copy it to keep it past the
+        next step.
+        """
+        if self._observed:
+            return self.states
+        states = self.states
+        live = np.flatnonzero(self.alive)
+        states[~self.alive] = 0
+        if len(live) > 0:
+            with profiler.span("fleet.raycast"):
+                rays = self.sensors[live].reshape(-1, 4)
+                table = self.track.sensorTable
+                if table is None:
+                    distances, _ = castRays(rays, self.track.getBoundarySegments())
+                else:
+                    # Sensors the table can't answer are cast exactly
+                    distances = table.lookup(rays)
+                    missing = np.isnan(distances)
+                    if missing.any():
+                        distances[missing], _ = castRays(rays[missing], self.track.getBoundarySegments())
+            states[live, :self.numSensors] = distances.reshape(len(live), self.numSensors)
+            states[live, self.numSensors] = self._getSpeed(live)
+        self._observed = True
+        return states
+
+    #============================================================================
+    # Geometry
+
+    def _getSpeed(self, indices):
+        return np.sqrt(self.vel[indices, 0]**2 + self.vel[indices, 1]**2)
+
+    def _updateHitboxPoints(self, indices):
+        self.hitboxPoints[indices] = rotateTranslate2d(self._hitboxOffsets, self.direction[indices][:, None], self.pos[indices][:, None, :])
+
+    def _updateSensors(self, indices):
+        """Vectorized AICar._updateSensors"""
+        A, B, C, D = (self.hitboxPoints[indices, i] for i in range(4))
+        front_middle = (A + B) / 2
+        origins = [front_middle] * len(FRONT_SENSOR_ANGLES)
+
+        if not self.simpleSensors:
+            r1 = 2
+            r2 = 3
+            rearview_mirror = (r2 * front_middle + r1 * self.pos[indices]) / (r2 + r1)
+            right_sideview_mirror = (r1 * C + ((r2 + r1) * 2 - r1) * B) / ((r2 + r1) * 2)
+            left_sideview_mirror = (r1 * D + ((r2 + r1) * 2 - r1) * A) / ((r2 + r1) * 2)
+            origins += [rearview_mirror, rearview_mirror, right_sideview_mirror, left_sideview_mirror]
+
+        origins = np.stack(origins, axis=1) # (n, numSensors, 2)
+        angles = self.direction[indices][:, None] + self._sensorAngles
+        self.sensors[indices, :, 0:2] = origins
+        self.sensors[indices, :, 2] = origins[:, :, 0] + self.sensorRange * np.cos(angles)
+        self.sensors[indices, :, 3] = origins[:, :, 1] + self.sensorRange * np.sin(angles)
+
+    def _hitboxEdges(self, indices):
+        # (n, 4, 4) edges AB, BC, CD, DA of each hitbox
+        corners = self.hitboxPoints[indices]
+        return np.concatenate((corners, np.roll(corners, -1, axis=1)), axis=2)
+
+    def _isCrashed(self, indices):
+        """Vectorized Car._isCrashed, returns a bool mask over the given cars"""
+        crashed = np.zeros(len(indices), dtype=bool)
+        compiled = self.track.getCompiled()
+        segments = compiled.segments
+        if len(indices) == 0 or len(segments) == 0:
+            return crashed
+
+        # Cars far enough from every wall can't be crashed, see Track.enableDistanceField
+        field = self.track.getDistanceField()
+        if field is not None:
+            corners = self.hitboxPoints[indices]
+            samples = np.concatenate((corners, (corners + np.roll(corners, -1, axis=1)) / 2), axis=1)
+            near_wall = np.flatnonzero(~field.isClear(samples, max(self.width, self.height) / 4))
+            if len(near_wall) * len(segments) <= MAX_BRUTE_FORCE_CRASH_PAIRS:
+                crashed[near_wall] = self._isCrashedExact(indices[near_wall], compiled)
+            else:
+                crashed[near_wall] = self._isCrashedNearWall(indices[near_wall])
+            return crashed
+
+        return self._isCrashedExact(indices, compiled)
+
+    def _isCrashedNearWall(self, indices):
+        """Exact crash test of a few cars against the segments around each of them
+
+        Candidate segments come from the track's SegmentGrid like in Car._isCrashed, so the
+        cost does not grow with the size of the track.
+        """
+        crashed = np.zeros(len(indices), dtype=bool)
+        if len(indices) == 0:
+            return crashed
+
+        corners = self.hitboxPoints[indices]
+        boxes = np.hstack((corners.min(axis=1), corners.max(axis=1))).tolist()
+        nearby = [self.track.segmentGrid.query(*box) for box in boxes]
+        counts = [len(segments) for segments in nearby]
+        if sum(counts) == 0:
+            return crashed
+
+        car_index = np.repeat(np.arange(len(indices)), counts)
+        edges = self._hitboxEdges(indices)[car_index] # (P, 4, 4)
+        candidates = np.array([segment for segments in nearby for segment in segments], dtype=np.float64).reshape(-1, 1, 4)
+        hits = segmentsIntersect(edges, candidates).any(axis=1)
+        crashed[car_index[hits]] = True
+        return crashed
+
+    def _isCrashedExact(self, indices, compiled):
+        """Exact crash test of cars against every segment of the compiled track"""
+        crashed = np.zeros(len(indices), dtype=bool)
+        if len(indices) == 0:
+            return crashed
+
+        # Broad phase: only pair up cars and segments whose bounding boxes overlap
+        corners = self.hitboxPoints[indices]
+        car_min = corners.min(axis=1)
+        car_max = corners.max(axis=1)
+        boxes = compiled.segmentBoxes
+        overlap = ((boxes[None, :, 0] <= car_max[:, None, 0]) & (boxes[None, :, 2] >= car_min[:, None, 0]) &
+                   (boxes[None, :, 1] <= car_max[:, None, 1]) & (boxes[None, :, 3] >= car_min[:, None, 1]))
+        car_index, segment_index = np.nonzero(overlap)
+        if len(car_index) == 0:
+            return crashed
+
+        # Narrow phase: exact doIntersect of all 4 hitbox edges with each candidate segment
+        edges = self._hitboxEdges(indices)[car_index] # (P, 4, 4)
+        candidates = compiled.segments[segment_index][:, None, :] # (P, 1, 4)
+        hits = segmentsIntersect(edges, candidates).any(axis=1)
+        crashed[car_index[hits]] = True
+        return crashed
+
+    def _nextCheckpoints(self, indices):
+        """Returns the (n, 4) next checkpoint of each car, NaN if it has none to pass"""
+        lines = np.full((len(indices), 4), np.nan)
+        checkpoints = self.track.getCompiled().checkpoints
+        has_next = self.checkpointsPassed[indices] < len(checkpoints)
+        lines[has_next] = checkpoints[self.checkpointsPassed[indices][has_next]]
+        return lines
+
+    def _crossesLine(self, indices, lines):
+        """Returns a bool mask of which given cars' hitboxes touch their (n, 4) line, NaN lines never do"""
+        if len(indices) == 0:
+            return np.zeros(0, dtype=bool)
+        edges = self._hitboxEdges(indices)
+        lines = np.asarray(lines)[:, None, :]
+        valid = ~np.isnan(lines[:, 0, 0])
+        hits = segmentsIntersect(edges, lines).any(axis=1)
+        return hits & valid
+
+    #============================================================================
+    # Display
+
+    def draw(self, surface):
+        """Draws every live car, returns the list of rects drawn on"""
+        return [pygame.draw.polygon(surface, 'black', self.hitboxPoints[i].tolist()) for i in np.flatnonzero(self.alive)]
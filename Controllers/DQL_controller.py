@@ -1,14 +1,15 @@
-from Cars.aicar import AICar
-import random
+from Cars.car_env import VecCarEnv
 import numpy as np
 import torch
 from nn import NeuralNetwork
 from Controllers.controller import Controller
+from Controllers.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from profiling import profiler
+from hud import hud
 import torch.optim as optim
 from torch import nn
-import pygame
-from collections import deque
 import json
+import os
 
 # RL hyperparameters
 GAMMA = 0.97 # Reward discount factor (lower values immediate score more)
@@ -24,27 +25,51 @@ BATCH_SIZE = 1024 # Number of experiences to train on after collecting memory
 STEPS_BETWEEN_OPTIMIZER_UPDATE = 100
 LEARNING_RATE = 0.001
 
+# Where save and load keep everything
+BRAIN_PATH = './Cars/DQL_car_brain.pth'
+DATA_PATH = './Cars/DQL_car_data.json' # epsilon and generation
+MEMORY_DIRECTORY = './Cars/DQL_car_memory' # Flat memory-mapped arrays, see ReplayBuffer.save
+LEGACY_MEMORY_PATH = './Cars/DQL_car_memory.pth' # Pickled deque of experiences from older versions
+
 MIN_REPLAY_SIZE = 1024 # Minimum number of experiences in memory needed before training
-MEMORY_CAPACITY = 20000
+MEMORY_CAPACITY = 20000 # Memory is preallocated, a million experiences take roughly 100 MB
+STATE_DTYPE = np.float32 # dtype states are stored as in memory, np.float16 halves their size
+
+# Prioritized experience replay, samples experiences with large TD errors more often
+PRIORITIZED_REPLAY = False
+PRIORITY_ALPHA = 0.6 # How much prioritization is used, 0 is uniform sampling
+PRIORITY_BETA_START = 0.4 # Starting importance sampling correction, annealed to 1
+PRIORITY_BETA_TRAINS = 2000 # Number of training steps to anneal beta over
 
 class DQL_Controller(Controller):
 
-    def __init__(self, track, surface, brain_template):
+    def __init__(self, track, brain_template, num_envs=1, prioritizedReplay=PRIORITIZED_REPLAY):
+        """
+        Args:
+            track: the track cars learn to drive on
+            brain_template: sizes of the hidden layers of the network
+            num_envs: number of cars collecting experiences in parallel
+            prioritizedReplay: whether experiences are sampled by TD error, see PrioritizedReplayBuffer
+        """
         self.track = track
-        self.surface = surface
+        self.num_envs = num_envs
+        self.prioritizedReplay = prioritizedReplay
 
         # Each generation is an episode (spawn -> death)
         self.generation = 1
         print("On Generation:", 1)
+        hud.publish("Generation", 1)
 
         # Select gpu or cpu 
-        self.device = torch.device("cuda:0" if torch.cuda.is_available else "cpu") # For GPU
+        self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu") # For GPU
         # self.device = "cpu"
 
+        # Every update steps all environments, see Cars/car_env.py
+        self.env = VecCarEnv(self.track, num_envs)
+        self.states = self.env.reset()
+
         # Setup NN brain template
-        self.car = AICar(self.track)
-        self.car.update(self.surface)
-        self.brain_template = [self.car.numSensors + 1] + brain_template + [self.car.numActions]
+        self.brain_template = [self.env.observationSize] + brain_template + [self.env.numActions]
 
         # Initialize the 2 networks needed for DQL
         self.predicting_network = NeuralNetwork(self.brain_template).to(self.device)
@@ -52,36 +77,44 @@ class DQL_Controller(Controller):
         self.optimizing_network.load_state_dict(self.predicting_network.state_dict())
         self.optimizer = optim.Adam(self.predicting_network.parameters(), lr=LEARNING_RATE)
 
-        self.lossFN = nn.SmoothL1Loss()
+        # Unreduced so each experience can be weighted, see _train
+        self.lossFN = nn.SmoothL1Loss(reduction='none')
 
         # RL parameters
         self.epsilon = MAX_EPSILON
-        self.steps_episode = 0
+        self.steps_episode = 0 # Experiences since the last hard update of the optimizing network
+        self.total_experiences = 0 # Experiences collected so far, schedules training
+        self.train_steps = 0
 
-        # Memory for experiences
-        self.memory = deque(maxlen=MEMORY_CAPACITY) # dequeue automatically handles capacity
+        # Memory for experiences, see Controllers/replay_buffer.py
+        self.memory = self._createMemory()
 
     def update(self):
-        # Show car's score
-        pygame.font.init()
-        font = pygame.font.SysFont('Comic Sans MS', 10)
-        score_surface = font.render("Score: " + str(round(self.car.score, 3)), False, (0, 0, 0))
-        self.surface.blit(score_surface, (20,50))
-
-        # Update car and gain an experience
-        experience = self._act()
-        self.memory.append(experience)
-        self.steps_episode += 1
-
-        # Train once we've gone through enough experiences
-        if self.steps_episode % STEPS_BETWEEN_TRAIN == 0 and len(self.memory) >= MIN_REPLAY_SIZE:
-            self._train()
+        # Update every car and gain one experience from each
+        with profiler.span("dql.act"):
+            experiences = self._act()
+        with profiler.span("dql.push"):
+            self.memory.push(*experiences)
+        self.steps_episode += self.num_envs
+        old_experiences = self.total_experiences
+        self.total_experiences += self.num_envs
+
+        # Train once every STEPS_BETWEEN_TRAIN experiences
+        num_trains = self.total_experiences // STEPS_BETWEEN_TRAIN - old_experiences // STEPS_BETWEEN_TRAIN
+        if len(self.memory) >= MIN_REPLAY_SIZE:
+            for _ in range(num_trains):
+                with profiler.span("dql.train"):
+                    self._train()
  
         # Epsilon decay after every learning iteration
         self._decayEpsilon()
 
-        # If this episode is done, reset
-        if not self.car.alive:
+        # Show the best car's score
+        hud.publish("Score", float(self.env.fleet.score.max()))
+
+        # Every car that died ended its episode and has already been reset
+        num_done = np.count_nonzero(experiences[4])
+        if num_done > 0:
             # Update optimizing network to match the predicting one after enough training cycles
             if self.steps_episode >= STEPS_BETWEEN_OPTIMIZER_UPDATE:
                 if UPDATE_MODE == 0:
@@ -96,27 +129,27 @@ class DQL_Controller(Controller):
                         optimizing_network_state_dict[key] = predicting_network_state_dict[key] * ALPHA + optimizing_network_state_dict[key] * (1 - ALPHA)
                     self.optimizing_network.load_state_dict(optimizing_network_state_dict)
 
-            self._nextGeneration()
-            self.generation += 1
+            self.generation += num_done
             print("Epsilon:", self.epsilon)
             print("On Generation:", self.generation)
+            hud.publish("Generation", self.generation)
+            hud.publish("Epsilon", float(self.epsilon))
 
+    def render(self, surface):
+        return self.env.fleet.draw(surface)
 
     def _train(self):
         # Create training batch of experiences to train on
-        # np.random.shuffle(self.memory)
-        # sampled_experiences = self.memory[0:BATCH_SIZE]
-        sampled_experiences = random.sample(self.memory, BATCH_SIZE)
-
-        # Attempt at vectorizing training
-        batch = list(zip(*sampled_experiences))
-        old_states, actions, new_states, rewards, done = batch[0], batch[1], batch[2], batch[3], batch[4]
-        old_states = torch.stack(old_states)
-        new_states = torch.stack(new_states)
-        rewards = torch.tensor(rewards, device=self.device)
-        actions = torch.tensor(actions, device=self.device)
-        done = torch.tensor(done, device=self.device)
+        with profiler.span("dql.sample"):
+            if self.prioritizedReplay:
+                beta = min(1.0, PRIORITY_BETA_START + (1 - PRIORITY_BETA_START) * self.train_steps / PRIORITY_BETA_TRAINS)
+                *batch, weights, indices = self.memory.sample(BATCH_SIZE, beta)
+            else:
+                batch = self.memory.sample(BATCH_SIZE)
+                weights = np.ones(BATCH_SIZE, dtype=np.float32)
+            old_states, actions, new_states, rewards, done, weights = (torch.from_numpy(array).to(self.device) for array in (*batch, weights))
         notdone = ~done
+        self.train_steps += 1
 
         Q_predictions = self.predicting_network(old_states)
         Q_samples = Q_predictions[torch.arange(BATCH_SIZE), actions]
@@ -142,71 +175,68 @@ class DQL_Controller(Controller):
         # y_train = torch.tensor(y_train).to(self.device)
         # y_test = torch.tensor(y_test).to(self.device)
 
-        loss = self.lossFN(Q_samples, Q_targets)
+        # Importance sampling weights are all 1 without prioritized replay, giving the plain mean loss
+        loss = (self.lossFN(Q_samples, Q_targets) * weights).mean()
+        if self.prioritizedReplay:
+            self.memory.updatePriorities(indices, (Q_samples - Q_targets).detach().cpu().numpy())
         # print("loss:", loss)
         # print(y_train)
         # print(y_test)
 
         # Backword pass
-        self.optimizer.zero_grad()
-        loss.backward()
+        with profiler.span("dql.backprop"):
+            self.optimizer.zero_grad()
+            loss.backward()
 
-        # Gradient clipping
-        torch.nn.utils.clip_grad_value_(self.predicting_network.parameters(), 100)
-        self.optimizer.step()
+            # Gradient clipping
+            torch.nn.utils.clip_grad_value_(self.predicting_network.parameters(), 100)
+            self.optimizer.step()
 
     def _getLoss(self, Q_sample, Q_target):
         return torch.square(torch.subtract(Q_sample, Q_target))
 
     def _act(self):
-        """Obtains one experience from the car
+        """Obtains one experience from every car
 
-        The car takes one action which is recorded
+        Every car takes one action which is recorded, actions for all cars are picked
+        with a single forward pass
         
         Returns:
-            (old_state, action, new_state, reward, done) 
-            old_state: torch.Tensor
-            action: torch.Tensor(a)
-            new_state: torch.Tensor
-            reward: float
-            done: boolean
+            (old_states, actions, new_states, rewards, dones) arrays with num_envs rows
+            old_states: float32 array (num_envs, state size)
+            actions: int array
+            new_states: float32 array (num_envs, state size)
+            rewards: float array
+            dones: bool array
 
             Where Q() is the predicting network and Q'() is the optimizing network
         """
-        old_score = self.car.score
-        state = torch.tensor(self.car.getState(), device=self.device)
-
-        # Pick action based on epsilon greedy
-        action = self._selectAction(state)
+        old_states = self.states
 
-        # Update car based on chosen action
-        self.car.update(self.surface, action=action)
+        # Pick actions based on epsilon greedy
+        with profiler.span("dql.inference"):
+            actions = self._selectActions(torch.from_numpy(old_states).to(self.device))
 
-        new_score = self.car.score
-        
-        reward = new_score - old_score
-        new_state = torch.tensor(self.car.getState(), device=self.device)
-
-        done = self.car.alive
+        # Update cars based on chosen actions, cars that died are reset to start a new episode
+        with profiler.span("dql.envStep"):
+            new_states, rewards, dones = self.env.step(actions)
+        self.states = new_states
 
-        return (state, action, new_state, reward, done)
+        return (old_states, actions, new_states, rewards, dones)
     
 
-    def _selectAction(self, state):
-        # Pick action based on epsilon greedy
-        Q_samples = self.predicting_network(state)
-        action = -1
-        rand = random.random()
-        if rand < self.epsilon:
-            action = torch.tensor([random.randint(0, self.car.numActions - 1)], device=self.device)
-        else:
-            with torch.no_grad():
-                action = torch.argmax(Q_samples)
-        return action
-
-    def _nextGeneration(self):
-        self.car.reset()
-        self.car.update(self.surface)
+    def _selectActions(self, states):
+        # Pick every car's action based on epsilon greedy
+        with torch.no_grad():
+            actions = torch.argmax(self.predicting_network(states), dim=1).cpu().numpy()
+        random_actions = np.random.random(self.num_envs) < self.epsilon
+        actions[random_actions] = np.random.randint(0, self.env.numActions, np.count_nonzero(random_actions))
+        return actions
+
+    def _createMemory(self):
+        if self.prioritizedReplay:
+            return PrioritizedReplayBuffer(MEMORY_CAPACITY, self.env.observationSize, stateDtype=STATE_DTYPE, alpha=PRIORITY_ALPHA)
+        return ReplayBuffer(MEMORY_CAPACITY, self.env.observationSize, stateDtype=STATE_DTYPE)
 
     def _decayEpsilon(self):
         self.epsilon = MIN_EPSILON + (MAX_EPSILON - MIN_EPSILON) * np.exp(-1 * EPSILON_DECAY * self.generation)
@@ -215,26 +245,47 @@ class DQL_Controller(Controller):
 
 
     def save(self):
-        torch.save(self.predicting_network.state_dict(), './Cars/DQL_car_brain.pth')
+        torch.save(self.predicting_network.state_dict(), BRAIN_PATH)
         saveFile = json.dumps({
             "epsilon": self.epsilon,
             "generation": self.generation,
         })
-        torch.save(self.memory, './Cars/DQL_car_memory.pth')
+        with open(DATA_PATH, 'w') as f:
+            f.write(saveFile)
+        self.memory.save(MEMORY_DIRECTORY)
 
-        print(saveFile) # TODO: save json to file
+        print(saveFile)
 
     def load(self):
         # Initialize the 2 networks needed for DQL
         self.predicting_network = NeuralNetwork(self.brain_template).to(self.device)
         self.optimizing_network = NeuralNetwork(self.brain_template).to(self.device)
 
-        self.predicting_network.load_state_dict(torch.load('./Cars/DQL_car_brain.pth'))
+        self.predicting_network.load_state_dict(torch.load(BRAIN_PATH))
         self.optimizing_network.load_state_dict(self.predicting_network.state_dict())
         self.optimizer = optim.Adam(self.predicting_network.parameters(), lr=LEARNING_RATE)
 
-        save = json.loads(open('./Cars/DQL_car_data.json', 'r').read())
+        save = json.loads(open(DATA_PATH, 'r').read())
         self.epsilon = save["epsilon"]
         self.generation = save["generation"]
 
-        self.memory = torch.load('./Cars/DQL_car_memory.pth')
\ No newline at end of file
+        self.memory = self._createMemory()
+        if os.path.exists(MEMORY_DIRECTORY):
+            self.memory.restore(MEMORY_DIRECTORY)
+        elif os.path.exists(LEGACY_MEMORY_PATH):
+            self._loadLegacyMemory(LEGACY_MEMORY_PATH)
+
+    def _loadLegacyMemory(self, path):
+        """Loads a pickled deque of (state, action, new_state, reward, done) experiences into memory
+
+        Older versions recorded whether the car was still alive as the done flag, so it is flipped.
+        """
+        experiences = torch.load(path, weights_only=False)
+        if len(experiences) == 0:
+            return
+        old_states, actions, new_states, rewards, alive = zip(*experiences)
+        self.memory.push(torch.stack(old_states).cpu().numpy(),
+                         np.array([int(action) for action in actions]),
+                         torch.stack(new_states).cpu().numpy(),
+                         np.array(rewards),
+                         ~np.array(alive))
@@ -1,36 +1,101 @@
-from Cars.aicar import AICar
-import random
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import numpy as np
 import torch
-from nn import NeuralNetwork
+from Cars.car_fleet import CarFleet
+from Track.track import Track
+from nn import (NeuralNetwork,
+                StackedNetworks,
+                parameterShapes,
+                flattenBrain,
+                brainFromParameters,
+                randomParameters)
 from Controllers.controller import Controller
+from profiling import profiler
+from hud import hud
 
 TOP_N = 7 # Number of top cars to keep in each generation to cross breed
-MUTATION_RATE = 0.1
+MUTATION_RATE = 0.1 # Probability each parameter tensor (a layer's weights or its biases) of a brain gets mutated
+MUTATION_STD = 0.1 # Standard deviation of the Gaussian noise added to mutated parameters
 CROSSOVER_RATE = 0.7 # Probability child takes gene from parent 1 vs parent 2
+CROSSOVER_PER_WEIGHT = False # Genes are single weights when true, whole parameter tensors otherwise
 BLANKS_PER_GEN = 5
 MUTANTS_PER_GEN = TOP_N # Number of mutations to make from the top_n cars from the last generation
 
 EPSILON = 0.02 # Chance that a car takes a completely random action on a given update
 
+BRAIN_PATH = './Cars/GA_car_brain.pth'
+DATA_PATH = './Cars/GA_car_data.json' # Best score of the saved brain
+CHECKPOINT_PATH = './Cars/GA_checkpoint.npz' # Whole population, see saveCheckpoint
+
+# Parallel evaluation
+CHUNKS_PER_WORKER = 2 # Cars are split into this many chunks per worker so fast workers can pick up more work
+MAX_EVAL_FRAMES = 10000 # Cars still driving after this many frames in a worker keep their current score
+
 class GA_Controller(Controller):
     # Genetic algorithm
-    def __init__(self, track, surface, brain_template, num_cars=50):
+    def __init__(self, track, brain_template, num_cars=50, workers=0, checkpointEvery=0, steadyState=False):
+        """
+        Args:
+            track: the track cars are evaluated on
+            brain_template: sizes of the hidden layers of each car's brain
+            num_cars: number of cars in each generation
+            workers: when above 0, each update evaluates a whole generation headlessly
+                     across this many processes instead of stepping every car once
+            checkpointEvery: when above 0, the whole population is checkpointed in the background
+                             every this many generations, see saveCheckpoint
+            steadyState: when true, evolves without generations: a car that dies is replaced
+                         straight away by a child of the elite archive, see _updateSteadyState
+        """
         self.track = track
         self.num_cars = num_cars
-        self.surface = surface
+        self.workers = workers
+        self.pool = None
+        self._poolTrackVersion = None # Track.version the workers loaded, see _startPool
+        self.steadyState = steadyState
+        self.checkpointEvery = checkpointEvery
+        self._checkpointWriter = None # Thread writing the last checkpoint
+        self.rng = np.random.default_rng()
 
         # Select gpu or cpu (gpu not recommended atm)
         # self.device = torch.device("cuda:0" if torch.cuda.is_available else "cpu") # For GPU
         self.device = "cpu"
 
+        # All cars are simulated together, car i of the fleet is driven by row i of self.genomes
+        self.fleet = CarFleet(self.track, num_cars)
+        self.genomes = None # (num_cars, num_params) tensor, every car's brain flattened (see nn.flattenBrain)
+        self.startScores = None # Scores the generation started with, NaN for the cars that drive
+        self._startRngStates = None # States of self.rng and self.generator when the generation started
+        self.population = None # self.genomes as one batched network for inference, see nn.StackedNetworks
+
         # Setup NN brain template
-        dummy_car = AICar(self.track)
-        self.brain_template = [dummy_car.numSensors + 1] + brain_template + [dummy_car.numActions]
+        self.brain_template = [self.fleet.numSensors + 1] + brain_template + [self.fleet.numActions]
+
+        # Index of the parameter tensor (a layer's weights or its biases) each flat parameter belongs to
+        sizes = [math.prod(shape) for shape in parameterShapes(self.brain_template)]
+        self._numTensors = len(sizes)
+        self._tensorOfParameter = torch.repeat_interleave(torch.arange(len(sizes)), torch.tensor(sizes))
+
+        # Breeding randomness, seeded from torch's global generator
+        self.generator = torch.Generator()
+        self.generator.manual_seed(int(torch.randint(2**62, (1,)).item()))
 
-        self.cars = [] # List of (AICar, brain)
         self.generation = 0
-        self.bestBrain = None
+        self.bestGenome = None # Flat brain of the best car so far, only materialized into a brain on save
         self.bestScore = -100
+
+        # Steady state evolution
+        self.archiveGenomes = None # (<= TOP_N, num_params) tensor of the best cars so far, best first
+        self.archiveScores = np.empty(0) # Score of each car of the archive
+        self.births = 0 # Children born since the last generation, a generation is num_cars births
+        self._inFlight = {} # Slots of each chunk the workers are evaluating, by task number
+        self._finished = queue.Queue() # (task number, scores) of each chunk as soon as it finishes
+        self._nextTask = 0
+
         assert TOP_N + BLANKS_PER_GEN + MUTANTS_PER_GEN < num_cars
         assert TOP_N > 0
 
@@ -45,23 +110,216 @@ class GA_Controller(Controller):
             self._initFirstGeneration()
             self.generation += 1
             print('On generation', self.generation)
+            hud.publish("Generation", self.generation)
+
+        if self.steadyState:
+            self._updateSteadyState()
+            return
 
-        num_dead = 0
+        if self.workers > 0:
+            with profiler.span("ga.parallelEval"):
+                self._evaluateInParallel()
 
-        for car, brain in self.cars:
-            if not car.alive:
-                num_dead += 1
-            else:
-                car_state = torch.tensor(car.getState()).to(self.device)
-                action = torch.argmax(brain(car_state)).item()
-                car.update(self.surface, action=action, epsilon=EPSILON)
+        num_dead = self.num_cars - np.count_nonzero(self.fleet.alive)
+        with profiler.span("ga.inference"):
+            actions = _selectActions(self.population, self.fleet, self.rng, self.device)
+        with profiler.span("ga.step"):
+            self.fleet.step(actions)
 
         # Start next generation if all cars are dead from last generation
         if num_dead == self.num_cars:
             self.generation += 1
-            self._nextGeneration()
-            print('On generation', self.generation)
+            with profiler.span("ga.nextGeneration"):
+                self._nextGeneration()
+            self._finishGeneration()
 
+    def _finishGeneration(self):
+        print('On generation', self.generation)
+        hud.publish("Generation", self.generation)
+        hud.publish("Best score", float(self.bestScore))
+
+        if self.checkpointEvery > 0 and self.generation % self.checkpointEvery == 0:
+            self.saveCheckpoint(background=True)
+
+    def render(self, surface):
+        return self.fleet.draw(surface)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+            self._inFlight = {}
+        if self._checkpointWriter is not None:
+            self._checkpointWriter.join()
+            self._checkpointWriter = None
+
+    def _startPool(self):
+        """Starts the worker pool, or restarts it once an edit of the track is finished
+
+        Returns:
+            int array of the slots of the cars that were in flight on a restarted pool,
+            they have to be submitted again
+        """
+        dropped = np.empty(0, dtype=np.int64)
+        edited = self.track.version != self._poolTrackVersion and self.track.editStatus == 0
+        if self.pool is not None and edited:
+            self.pool.terminate()
+            self.pool = None
+            if self._inFlight:
+                dropped = np.concatenate(list(self._inFlight.values()))
+            self._inFlight = {} # Anything the old pool already finished is dropped when collected
+
+        if self.pool is None:
+            # Spawn rather than fork, torch does not like being forked.
+            # Each worker loads its own copy of the track, so the pool only fits this track.
+            # The workers sense like this track does, sensor table and distance field included
+            context = multiprocessing.get_context("spawn")
+            self.pool = context.Pool(self.workers, initializer=_initWorker,
+                                     initargs=(self.track.toJSON(), self.track.getSensingOptions()))
+            self._poolTrackVersion = self.track.version
+        return dropped
+
+    def _evaluateInParallel(self):
+        """Runs every live car of the generation to death across the worker processes
+
+        Each worker simulates its chunk of cars headlessly in its own CarFleet and sends back
+        the final scores, which are written into self.fleet with every car marked dead.
+        """
+        self._startPool()
+
+        live = np.flatnonzero(self.fleet.alive)
+        chunks = [chunk for chunk in np.array_split(live, self.workers * CHUNKS_PER_WORKER) if len(chunk) > 0]
+        tasks = [(self.brain_template,
+                  self.genomes[chunk].cpu().numpy(),
+                  self.rng.integers(2**32)) for chunk in chunks]
+
+        for chunk, scores in zip(chunks, self.pool.map(_evaluateCars, tasks)):
+            self.fleet.score[chunk] = scores
+        self.fleet.alive[:] = False
+
+    #================================================================
+    # Steady state evolution
+    #
+    # There is no generation barrier: whenever cars die, their scores are merged into an archive
+    # of the TOP_N best cars so far and their slots are refilled with children of the archive.
+    # The children are bred like a generation would be, as blanks, mutants and crossbred cars in
+    # the same proportions, so every slot keeps driving instead of waiting on the slowest car.
+
+    def _updateSteadyState(self):
+        if self.workers > 0:
+            with profiler.span("ga.parallelEval"):
+                dead = self._collectFinishedChunks()
+        else:
+            with profiler.span("ga.inference"):
+                actions = _selectActions(self.population, self.fleet, self.rng, self.device)
+            with profiler.span("ga.step"):
+                self.fleet.step(actions)
+            dead = np.flatnonzero(~self.fleet.alive)
+
+        if len(dead) == 0:
+            return
+        with profiler.span("ga.replace"):
+            self._archive(dead)
+            self._replace(dead)
+        if self.workers > 0:
+            self._submitChunks(dead)
+
+        self.births += len(dead)
+        while self.births >= self.num_cars:
+            self.births -= self.num_cars
+            self.generation += 1
+            self._finishGeneration()
+
+    def _archive(self, slots):
+        """Merges the finished cars in the given slots into the archive, keeping the TOP_N best"""
+        genomes = self.genomes[slots]
+        if self.archiveGenomes is not None:
+            genomes = torch.cat((self.archiveGenomes, genomes))
+        scores = np.concatenate((self.archiveScores, self.fleet.score[slots]))
+
+        best = np.argsort(-scores, kind='stable')[:TOP_N]
+        self.archiveGenomes = genomes[torch.from_numpy(best)]
+        self.archiveScores = scores[best]
+
+        if self.archiveScores[0] > self.bestScore:
+            self.bestScore = float(self.archiveScores[0])
+            self.bestGenome = self.archiveGenomes[0].clone()
+
+    def _replace(self, slots):
+        """Puts a newborn child of the archive in each of the given slots, at the track's start
+
+        Each child is a blank, a mutant of an archived car or an archived car crossbred with a
+        car of the population, with the same odds as a slot of a generation from _nextGeneration.
+        """
+        num_archived = len(self.archiveGenomes)
+        kinds = torch.randint(0, self.num_cars, (len(slots),), generator=self.generator)
+        blank = kinds < BLANKS_PER_GEN
+        mutant = (kinds >= BLANKS_PER_GEN) & (kinds < BLANKS_PER_GEN + MUTANTS_PER_GEN)
+        bred = ~(blank | mutant)
+
+        children = torch.empty((len(slots), self.genomes.shape[1]))
+        children[blank] = randomParameters(self.brain_template, int(blank.sum()), self.generator)
+        parents = torch.randint(0, num_archived, (int(mutant.sum()),), generator=self.generator)
+        children[mutant] = self._mutate(self.archiveGenomes[parents])
+        parents1 = torch.randint(0, num_archived, (int(bred.sum()),), generator=self.generator)
+        parents2 = torch.randint(0, self.num_cars, (int(bred.sum()),), generator=self.generator)
+        children[bred] = self._mutate(self._crossover(self.archiveGenomes[parents1], self.genomes[parents2]))
+
+        # In place, self.population sees the new brains without being rebuilt
+        self.genomes[slots] = children.to(self.device)
+        self.fleet.reset(slots)
+
+    def _submitChunks(self, slots):
+        """Sends the cars in the given slots off to the workers, see _evaluateCars"""
+        slots = np.concatenate((slots, self._startPool()))
+
+        # The cars are driven by the workers, locally they wait off the track
+        self.fleet.alive[slots] = False
+        num_chunks = max(1, len(slots) * self.workers * CHUNKS_PER_WORKER // self.num_cars)
+        for chunk in np.array_split(slots, num_chunks):
+            if len(chunk) == 0:
+                continue
+            task = (self.brain_template, self.genomes[chunk].cpu().numpy(), self.rng.integers(2**32))
+            task_number = self._nextTask
+            self._nextTask += 1
+            self._inFlight[task_number] = chunk
+
+            # The callbacks run on the pool's result thread as soon as the chunk is done
+            finished = lambda result, task_number=task_number: self._finished.put((task_number, result))
+            self.pool.apply_async(_evaluateCars, (task,), callback=finished, error_callback=finished)
+
+    def _collectFinishedChunks(self):
+        """Waits for any chunk of cars to finish on the workers, whichever is first
+
+        Chunks are collected in the order they finish, so a slow chunk never holds up the
+        others.
+
+        Returns:
+            int array of the slots of every finished car, their scores written into self.fleet
+        """
+        if not self._inFlight:
+            self._submitChunks(np.arange(self.num_cars))
+        else:
+            # Restarts the pool if the track was edited, the cars it was driving drive again
+            self._submitChunks(np.empty(0, dtype=np.int64))
+
+        finished = []
+        task_number, result = self._finished.get()
+        while True:
+            chunk = self._inFlight.pop(task_number, None)
+            if chunk is not None: # Otherwise it was driven by a pool that has since been restarted
+                if isinstance(result, Exception):
+                    raise result
+                self.fleet.score[chunk] = result
+                finished.append(chunk)
+            try:
+                task_number, result = self._finished.get_nowait()
+            except queue.Empty:
+                break
+
+        if not finished:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(finished)
 
     def _initFirstGeneration(self):
         """Initializes the first generation
@@ -69,112 +327,247 @@ class GA_Controller(Controller):
         Fills the first generation with randomly initialized cars. If a car was loaded in,
         Replaces one of the randomly initialized cars with the loaded one.
         """
-        self.cars = []
-
-        if self.bestBrain:
-            new_car = AICar(self.track)
-            new_car.update(self.surface)
-            self.cars.append((new_car, self.bestBrain))
-        
-        num_cars_needed = self.num_cars - len(self.cars)
-        for _ in range(num_cars_needed):
-            new_car = AICar(self.track)
-            new_car.update(self.surface)
-            new_brain = NeuralNetwork(self.brain_template).to(self.device)
-            self.cars.append((new_car, new_brain))
+        genomes = randomParameters(self.brain_template, self.num_cars, self.generator)
+        if self.bestGenome is not None:
+            genomes[0] = self.bestGenome
+        self._startGeneration(genomes, np.full(self.num_cars, np.nan))
 
     def _nextGeneration(self):
         """Sets up the next generation of cars
         
-        Should be called once all cars from the previous generation are done running
+        Should be called once all cars from the previous generation are done running.
+        The whole generation is bred at once with batched tensor ops on the flat genomes.
         """
         # Get the TOP_N best cars of the last generation
-        sorted_cars = sorted(self.cars, key = lambda x: x[0].score, reverse = True)
-        top_n_cars = sorted_cars[:TOP_N]
+        sorted_indices = np.argsort(-self.fleet.score, kind='stable')
+        top_n = sorted_indices[:TOP_N]
+        top_n_scores = self.fleet.score[top_n]
 
-        # Erase all cars from the last generation
-        self.cars = []
+        # Next generation's cars and their scores, a score of NaN means the car still has to drive
+        genomes = torch.empty_like(self.genomes)
+        scores = np.full(self.num_cars, np.nan)
 
-        # Update global best car if better car exists and add to next gen cars
-        if top_n_cars[0][0].score > self.bestScore:
-            self.bestScore = top_n_cars[0][0].score
-            self.bestBrain = top_n_cars[0][1]
+        # Update global best car if better car exists, otherwise the existing best car drives
+        # again in place of last gen's best car
+        if top_n_scores[0] > self.bestScore:
+            self.bestScore = float(top_n_scores[0])
+            self.bestGenome = self.genomes[top_n[0]].clone()
+            num_kept = 0
         else:
-            # No better car exists, use existing best car
-            self.cars.append((AICar(self.track), self.bestBrain))
+            genomes[0] = self.bestGenome
+            num_kept = 1
 
         ###################### Add next gen cars!! ######################
-        # First add best cars from last generation
-        self.cars = self.cars + top_n_cars[len(self.cars) : TOP_N] # Exclude last gen's best car if it is the new global best car
+        # First add best cars from last generation, they keep their score and do not drive again
+        genomes[num_kept:TOP_N] = self.genomes[top_n[num_kept:]]
+        scores[num_kept:TOP_N] = top_n_scores[num_kept:]
+        num_cars = TOP_N
 
         # Add blank cars for gene diversity
-        for _ in range(BLANKS_PER_GEN):
-            new_brain = NeuralNetwork(self.brain_template)
-            self.cars.append((AICar(self.track), new_brain))
+        genomes[num_cars:num_cars + BLANKS_PER_GEN] = randomParameters(self.brain_template, BLANKS_PER_GEN, self.generator)
+        num_cars += BLANKS_PER_GEN
 
         # Add cars that are slightly mutated from the top_n cars of previous generations
-        for _ in range(MUTANTS_PER_GEN):
-            mutate_index = random.randint(0, TOP_N - 1)
-            brain_to_mutate = self.cars[mutate_index][1]
-            mutated_brain = self._mutate(brain_to_mutate)
-            self.cars.append((AICar(self.track), mutated_brain))
+        parents = torch.randint(0, TOP_N, (MUTANTS_PER_GEN,), generator=self.generator)
+        genomes[num_cars:num_cars + MUTANTS_PER_GEN] = self._mutate(genomes[parents])
+        num_cars += MUTANTS_PER_GEN
 
         # Cross-breed best cars with other cars for the rest of the generation
-        num_cars_to_breed = self.num_cars - len(self.cars)
-        for _ in range(num_cars_to_breed):
-            ran1 = random.randint(0, TOP_N - 1)
-            ran2 = random.randint(0, len(self.cars) - 1)
-            self.cars.append((AICar(self.track), self._crossbreed(self.cars[ran1][1], self.cars[ran2][1])))
-        
-        # Set all brains to current device and call update once for each car
-        for car, brain in self.cars:
-            car.update(self.surface)
-            brain.to(self.device)
-            
-    def _crossbreed(self, brain1, brain2):
-        """Creates a child brain using information from 2 brains
-        
+        num_cars_to_breed = self.num_cars - num_cars
+        parents1 = torch.randint(0, TOP_N, (num_cars_to_breed,), generator=self.generator)
+        parents2 = torch.randint(0, num_cars, (num_cars_to_breed,), generator=self.generator)
+        genomes[num_cars:] = self._mutate(self._crossover(genomes[parents1], genomes[parents2]))
+
+        self._startGeneration(genomes, scores)
+
+    def _startGeneration(self, genomes, scores):
+        """Puts the given cars on the track
+
         Args:
-            brain1: First parent brain
-            brain2: Second parent brain
-        Returns:
-            child: a brain is a mixture of both parents with mutations
-                   as dictated by CROSSOVER_RATE and MUTATION_RATE
+            genomes: (num_cars, num_params) tensor of the cars' flat brains
+            scores: float array (num_cars,), cars with a score are kept dead with that score,
+                    the NaN ones are reset to the start of the track
         """
-        brain1 = brain1.state_dict()
-        brain2 = brain2.state_dict()
-
-        child_brain = self._crossover(brain1, brain2)
-        child_brain = self._mutate(child_brain)
-        return child_brain
-
-    def _crossover(self, brain1, brain2):
-        child_brain_state = {}
-
-        for key in brain1.keys():
-            if random.random() < CROSSOVER_RATE:
-                child_brain_state[key] = brain1[key].clone()
-            else:
-                child_brain_state[key] = brain2[key].clone()
-        child_brain = NeuralNetwork(self.brain_template)
-        child_brain.load_state_dict(child_brain_state)
-        return child_brain
-    
-    def _mutate(self, brain):
-        for param in brain.parameters():
-            if torch.rand(1).item() < MUTATION_RATE:
-                param.data += torch.randn_like(param.data) * 0.1  # Adding Gaussian noise with std=0.1
-        return brain
+        self.genomes = genomes.to(self.device)
+        self.startScores = scores
+        self._startRngStates = (self.rng.bit_generator.state, self.generator.get_state())
+        self.population = StackedNetworks.fromParameters(self.brain_template, self.genomes)
+        self.fleet.reset()
+
+        kept = np.flatnonzero(~np.isnan(scores))
+        self.fleet.alive[kept] = False
+        self.fleet.score[kept] = scores[kept]
+
+        # Call update once for each car
+        self.fleet.step(np.full(self.num_cars, -1))
+
+    def _crossover(self, parents1, parents2):
+        """Creates one child per row of the (C, num_params) parents
+
+        Each gene comes from parent 1 with probability CROSSOVER_RATE, from parent 2 otherwise.
+        """
+        if CROSSOVER_PER_WEIGHT:
+            from_parent1 = torch.rand(parents1.shape, generator=self.generator) < CROSSOVER_RATE
+        else:
+            from_parent1 = (torch.rand((len(parents1), self._numTensors), generator=self.generator) < CROSSOVER_RATE)[:, self._tensorOfParameter]
+        return torch.where(from_parent1, parents1, parents2)
+
+    def _mutate(self, genomes):
+        """Adds Gaussian noise to each parameter tensor of the given (C, num_params) genomes
+        with probability MUTATION_RATE, in place"""
+        mutated = (torch.rand((len(genomes), self._numTensors), generator=self.generator) < MUTATION_RATE)[:, self._tensorOfParameter]
+        genomes += torch.randn(genomes.shape, generator=self.generator) * MUTATION_STD * mutated
+        return genomes
     
     def save(self):
-        torch.save(self.bestBrain.state_dict(), './Cars/GA_car_brain.pth')
+        """Saves the best brain and its score, plus a checkpoint of the whole population"""
+        torch.save(brainFromParameters(self.brain_template, self.bestGenome).state_dict(), BRAIN_PATH)
+        with open(DATA_PATH, 'w') as f:
+            f.write(json.dumps({"bestScore": self.bestScore}))
+        self.saveCheckpoint()
         print("Model's best score: ", self.bestScore)
 
     def load(self):
-        self.bestBrain = NeuralNetwork(self.brain_template)
-        self.bestBrain.load_state_dict(torch.load('./Cars/GA_car_brain.pth'))
-        self.bestBrain.to(self.device)
-        self.bestBrain.eval()  # Set the model to evaluation mode
+        """Resumes training from the population checkpoint, or seeds the first generation with
+        the saved best brain if there is no checkpoint"""
+        if os.path.exists(CHECKPOINT_PATH):
+            self.loadCheckpoint()
+            print("Resumed at generation", self.generation)
+            return
+
+        brain = NeuralNetwork(self.brain_template)
+        brain.load_state_dict(torch.load(BRAIN_PATH))
+        self.bestGenome = flattenBrain(brain).to(self.device)
+        if os.path.exists(DATA_PATH):
+            self.bestScore = json.loads(open(DATA_PATH, 'r').read())["bestScore"]
+
+    #================================================================
+    # Checkpoints
+
+    def saveCheckpoint(self, path=CHECKPOINT_PATH, background=False):
+        """Saves everything needed to carry on training exactly where it is
+
+        Stores the population as one contiguous (num_cars, num_params) array along with the
+        scores the generation started with, the generation, the best car and the state of every
+        random generator. Everything is saved as it was at the start of the generation, so
+        resuming starts that generation over and carries on exactly as it would have, even when
+        saving partway through it. In steady state, the current population is saved instead and
+        every car starts its drive over.
+
+        The file is written under a temporary name and renamed, so a checkpoint is never left
+        half written. In the background, only copying the arrays happens on this thread.
+        """
+        if self.genomes is None:
+            return
+        if self.steadyState:
+            rng_state, generator_state = self.rng.bit_generator.state, self.generator.get_state()
+        else:
+            rng_state, generator_state = self._startRngStates
+        arrays = {
+            "genomes": self.genomes.cpu().numpy().copy(),
+            "startScores": np.array(self.startScores),
+            "generatorState": generator_state.numpy(),
+        }
+        if self.bestGenome is not None:
+            arrays["bestGenome"] = self.bestGenome.cpu().numpy().copy()
+        if self.archiveGenomes is not None:
+            arrays["archiveGenomes"] = self.archiveGenomes.cpu().numpy().copy()
+            arrays["archiveScores"] = self.archiveScores.copy()
+        header = {
+            "generation": self.generation,
+            "births": self.births,
+            "bestScore": self.bestScore,
+            "brainTemplate": self.brain_template,
+            "rngState": rng_state,
+        }
+
+        # One checkpoint written at a time
+        if self._checkpointWriter is not None:
+            self._checkpointWriter.join()
+            self._checkpointWriter = None
+        if background:
+            self._checkpointWriter = threading.Thread(target=_writeCheckpoint, args=(path, arrays, header))
+            self._checkpointWriter.start()
+        else:
+            _writeCheckpoint(path, arrays, header)
+
+    def loadCheckpoint(self, path=CHECKPOINT_PATH):
+        """Restores a checkpoint saved by saveCheckpoint and restarts its generation"""
+        with np.load(path) as checkpoint:
+            header = json.loads(str(checkpoint["header"]))
+            if header["brainTemplate"] != self.brain_template:
+                raise ValueError("Checkpoint brains have dimensions " + str(header["brainTemplate"]) +
+                                 ", expected " + str(self.brain_template))
+            if len(checkpoint["genomes"]) != self.num_cars:
+                raise ValueError("Checkpoint has " + str(len(checkpoint["genomes"])) + " cars, expected " + str(self.num_cars))
+
+            self.generation = header["generation"]
+            self.bestScore = header["bestScore"]
+            if "bestGenome" in checkpoint:
+                self.bestGenome = torch.from_numpy(checkpoint["bestGenome"]).to(self.device)
+            if "archiveGenomes" in checkpoint:
+                self.archiveGenomes = torch.from_numpy(checkpoint["archiveGenomes"]).to(self.device)
+                self.archiveScores = checkpoint["archiveScores"]
+            self.births = header.get("births", 0)
+            self.rng.bit_generator.state = header["rngState"]
+            self.generator.set_state(torch.from_numpy(checkpoint["generatorState"]))
+            self._startGeneration(torch.from_numpy(checkpoint["genomes"]), checkpoint["startScores"])
+        hud.publish("Generation", self.generation)
+        hud.publish("Best score", float(self.bestScore))
+
+
+
+#================================================================
+# Helpers shared by the controller and its worker processes
+
+def _selectActions(population, fleet, rng, device="cpu"):
+    """Picks every car's action in one batched forward pass
+
+    Dead cars are evaluated too but their actions are ignored by the fleet.
+    Each car takes a random action with probability EPSILON.
+    """
+    states = torch.from_numpy(fleet.getStates()).to(device)
+    actions = torch.argmax(population(states), dim=1).cpu().numpy()
+
+    random_actions = rng.random(fleet.num_cars) < EPSILON
+    actions[random_actions] = rng.integers(0, fleet.numActions, np.count_nonzero(random_actions))
+    return actions
+
+def _writeCheckpoint(path, arrays, header):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)), **arrays)
+    os.replace(path + ".tmp", path)
+
+_workerTrack = None # Each worker process's own copy of the track
+
+def _initWorker(trackJSON, sensingOptions):
+    global _workerTrack
+    torch.set_num_threads(1) # Parallelism comes from the processes
+    _workerTrack = Track()
+    _workerTrack.load(trackJSON)
+    _workerTrack.applySensingOptions(sensingOptions)
+
+def _evaluateCars(task):
+    """Drives the given brains' cars until they all die, runs in a worker process
+
+    Args:
+        task: (brain_template, (K, num_params) array of flat brains, seed for the random actions)
+    Returns:
+        list of the final score of each car
+    """
+    brain_template, genomes, seed = task
+    rng = np.random.default_rng(seed)
+    population = StackedNetworks.fromParameters(brain_template, torch.from_numpy(genomes))
+
+    # Same start as GA_Controller._startGeneration
+    fleet = CarFleet(_workerTrack, len(genomes))
+    fleet.step(np.full(len(genomes), -1))
 
-        self.bestScore = float(input("Input the model's best score: "))
-        
\ No newline at end of file
+    frames = 0
+    while fleet.alive.any() and frames < MAX_EVAL_FRAMES:
+        fleet.step(_selectActions(population, fleet, rng))
+        frames += 1
+    return fleet.score.tolist()
@@ -4,10 +4,24 @@ class Controller(ABC):
     """Abstract class for a controller
     
     A controller should handle everything within a single update method that is
-    called every frame.
+    called every frame. Updates never draw anything, so a controller can run headless;
+    drawing happens in render, which is only called when something is watching.
     """
 
     @abstractmethod
     def update(self):
         """Updates everything for the frame"""
-        pass
\ No newline at end of file
+        pass
+
+    def render(self, surface):
+        """Draws whatever this controller controls onto the given surface
+
+        Returns:
+            list of pygame.Rect covering everything drawn, only those areas of the screen are
+            updated. Returning None updates the whole screen
+        """
+        return []
+
+    def close(self):
+        """Releases anything the controller holds on to, like worker processes"""
+        pass
@@ -0,0 +1,232 @@
+import json
+import os
+import numpy as np
+
+# Arrays a ReplayBuffer saves, each one is stored as <name>.npy next to a header.json
+ARRAY_NAMES = ["states", "nextStates", "actions", "rewards", "dones"]
+
+def _saveArrays(directory, arrays, header):
+    """Writes each array to <directory>/<name>.npy plus the header as header.json
+
+    Every file is written under a temporary name and then renamed over the old one, so
+    arrays that are currently memory-mapped from the old files stay readable.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        path = os.path.join(directory, name + ".npy")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+
+    path = os.path.join(directory, "header.json")
+    with open(path + ".tmp", "w") as f:
+        f.write(json.dumps(header))
+    os.replace(path + ".tmp", path)
+
+def _loadArray(directory, name):
+    # Copy-on-write mapping: nothing is read until it is used and changes never touch the file
+    return np.load(os.path.join(directory, name + ".npy"), mmap_mode="c")
+
+class ReplayBuffer:
+    """Fixed capacity ring buffer of experiences stored in preallocated arrays
+
+    Experiences are (state, action, next state, reward, done). Once full, new
+    experiences overwrite the oldest ones.
+    """
+
+    def __init__(self, capacity, stateSize, stateDtype=np.float32):
+        """
+        Args:
+            capacity: max number of experiences kept
+            stateSize: number of values in a state
+            stateDtype: dtype states are stored as, np.float16 halves the memory of states.
+                        States are always handed back as float32
+        """
+        self.capacity = capacity
+        self.states = np.zeros((capacity, stateSize), dtype=stateDtype)
+        self.nextStates = np.zeros((capacity, stateSize), dtype=stateDtype)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        self.cursor = 0 # Index the next experience is written to
+        self.size = 0
+        self.rng = np.random.default_rng()
+
+    def __len__(self):
+        return self.size
+
+    def push(self, states, actions, nextStates, rewards, dones):
+        """Adds a batch of K experiences, each argument has K rows"""
+        indices = (self.cursor + np.arange(len(actions))) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.nextStates[indices] = nextStates
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+
+        self.cursor = (self.cursor + len(actions)) % self.capacity
+        self.size = min(self.size + len(actions), self.capacity)
+        return indices
+
+    def sample(self, batchSize):
+        """Picks batchSize distinct experiences uniformly at random
+
+        Returns:
+            (states, actions, nextStates, rewards, dones) arrays with batchSize rows
+        """
+        indices = self.rng.choice(self.size, batchSize, replace=False)
+        return self._gather(indices)
+
+    def save(self, directory):
+        """Saves the buffer as one flat .npy file per array plus a small header.json"""
+        header = {
+            "capacity": self.capacity,
+            "cursor": self.cursor,
+            "size": self.size,
+            "stateSize": self.states.shape[1],
+            "stateDtype": self.states.dtype.name,
+        }
+        _saveArrays(directory, {name: getattr(self, name) for name in ARRAY_NAMES}, header)
+
+    def restore(self, directory):
+        """Replaces the contents of this buffer with a saved one
+
+        The saved arrays are memory-mapped instead of read, so restoring is near instant
+        and only the parts of the memory that get sampled are ever read from disk.
+        The saved capacity and state dtype replace this buffer's.
+
+        Returns:
+            the header of the saved buffer
+        """
+        header = json.loads(open(os.path.join(directory, "header.json"), "r").read())
+        if header["stateSize"] != self.states.shape[1]:
+            raise ValueError("Saved experiences have states of size " + str(header["stateSize"]) +
+                             ", expected " + str(self.states.shape[1]))
+
+        for name in ARRAY_NAMES:
+            setattr(self, name, _loadArray(directory, name))
+        self.capacity = header["capacity"]
+        self.cursor = header["cursor"]
+        self.size = header["size"]
+        return header
+
+    def _gather(self, indices):
+        return (self.states[indices].astype(np.float32),
+                self.actions[indices],
+                self.nextStates[indices].astype(np.float32),
+                self.rewards[indices],
+                self.dones[indices])
+
+
+class SumTree:
+    """Binary tree where every node holds the sum of its children's values
+
+    Leaves hold the priorities, so the root is the total priority. Supports batched
+    O(log n) priority updates and batched O(log n) proportional lookups.
+    """
+
+    def __init__(self, capacity):
+        # Leaves start at index self.numLeaves, node i has children 2i and 2i + 1, the root is node 1
+        self.numLeaves = 1
+        while self.numLeaves < capacity:
+            self.numLeaves *= 2
+        self.depth = self.numLeaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.numLeaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[indices + self.numLeaves]
+
+    def update(self, indices, priorities):
+        """Sets the priorities of the given leaves and fixes the sums above them"""
+        nodes = np.asarray(indices) + self.numLeaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Finds, for every value in [0, total), the leaf whose prefix sum range holds it"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= self.tree[left] * go_right
+            nodes = left + go_right
+        return nodes - self.numLeaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """ReplayBuffer that samples experiences in proportion to their TD error
+
+    Experience i is sampled with probability p_i^alpha / sum_k p_k^alpha where p_i is its
+    last absolute TD error. New experiences get the highest priority seen so far so they
+    are sampled at least once. Sampling returns importance sampling weights that undo the
+    bias of non-uniform sampling when beta is 1.
+    """
+
+    def __init__(self, capacity, stateSize, stateDtype=np.float32, alpha=0.6, epsilon=1e-5):
+        """
+        Args:
+            alpha: how much prioritization is used, 0 is uniform sampling
+            epsilon: added to TD errors so no experience gets a zero priority
+        """
+        super().__init__(capacity, stateSize, stateDtype)
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.priorities = SumTree(capacity)
+        self.maxPriority = 1.0
+
+    def push(self, states, actions, nextStates, rewards, dones):
+        indices = super().push(states, actions, nextStates, rewards, dones)
+        self.priorities.update(indices, np.full(len(indices), self.maxPriority))
+        return indices
+
+    def sample(self, batchSize, beta=0.4):
+        """Picks batchSize experiences in proportion to their priority
+
+        Uses stratified sampling: the total priority is split in batchSize equal ranges
+        and one experience is picked from each.
+
+        Returns:
+            (states, actions, nextStates, rewards, dones, weights, indices) where weights are the
+            importance sampling weights (max weight is 1) and indices are needed by updatePriorities
+        """
+        total = self.priorities.total()
+        values = (np.arange(batchSize) + self.rng.random(batchSize)) * (total / batchSize)
+        indices = self.priorities.find(np.minimum(values, np.nextafter(total, 0)))
+        indices = np.minimum(indices, self.size - 1) # Guards against float error landing past the end
+
+        probabilities = self.priorities.get(indices) / total
+        weights = (self.size * probabilities) ** -beta
+        weights = (weights / weights.max()).astype(np.float32)
+        return self._gather(indices) + (weights, indices)
+
+    def save(self, directory):
+        super().save(directory)
+        _saveArrays(os.path.join(directory, "priorities"), {"tree": self.priorities.tree},
+                    {"numLeaves": self.priorities.numLeaves, "maxPriority": float(self.maxPriority)})
+
+    def restore(self, directory):
+        header = super().restore(directory)
+        priorities_directory = os.path.join(directory, "priorities")
+        if os.path.exists(os.path.join(priorities_directory, "header.json")):
+            priorities_header = json.loads(open(os.path.join(priorities_directory, "header.json"), "r").read())
+            self.priorities = SumTree(self.capacity)
+            self.priorities.tree = _loadArray(priorities_directory, "tree")
+            self.maxPriority = priorities_header["maxPriority"]
+        else:
+            # Saved without priorities, every experience starts out equally likely
+            self.priorities = SumTree(self.capacity)
+            self.maxPriority = 1.0
+            self.priorities.update(np.arange(self.size), np.full(self.size, self.maxPriority))
+        return header
+
+    def updatePriorities(self, indices, tdErrors):
+        priorities = (np.abs(tdErrors) + self.epsilon) ** self.alpha
+        self.priorities.update(indices, priorities)
+        self.maxPriority = max(self.maxPriority, float(priorities.max()))
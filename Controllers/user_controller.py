@@ -8,9 +8,8 @@ BRAKE = 0.7
 TURNING_POWER = 1.5 * 0.08726646
 
 class User_Controller(Controller):
-    def __init__(self, track, surface):
+    def __init__(self, track):
         self.track = track
-        self.surface = surface
         self.car = Car(track)
 
     def update(self):
@@ -27,4 +26,7 @@ class User_Controller(Controller):
         if keys[pygame.K_d]:
             self.car.turn(TURNING_POWER)
 
-        self.car.update(self.surface)
\ No newline at end of file
+        self.car.update()
+
+    def render(self, surface):
+        return self.car.draw(surface)
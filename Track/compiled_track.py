@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from raycast import boundarySegments
+
+CACHE_DIRECTORY = './Track/compiled'
+CACHE_MIN_SEGMENTS = 2000 # Smaller tracks parse faster than their cache loads, so they are never cached
+
+# Arrays a CompiledTrack caches, each one is stored as <name>.npy next to a header.json
+ARRAY_NAMES = ["segments", "boundaryOffsets", "segmentBoxes"]
+FORMAT_VERSION = 1 # Bump whenever what is cached or how it is compiled changes, older caches are then ignored
+
+class CompiledTrack:
+    """Contiguous array form of a track's geometry, kept by Track next to its editable lists
+
+    segments: (S, 4) float array of every boundary segment, closing segments included, in the
+              order of raycast.boundarySegments
+    boundaryOffsets: (B + 1,) int array, boundary i is segments[boundaryOffsets[i]:boundaryOffsets[i + 1]]
+    segmentBoxes: (S, 4) float array of each segment's (minX, minY, maxX, maxY)
+    bounds: (minX, minY, maxX, maxY) of every segment, None without segments
+    checkpoints: (C, 4) float array of the checkpoint segments
+    startLine: (4,) float array of the start line segment
+    """
+
+    def __init__(self, segments, boundaryOffsets, segmentBoxes, checkpoints, startLine):
+        """Use compile or load rather than constructing a compiled track directly"""
+        self.segments = segments
+        self.boundaryOffsets = boundaryOffsets
+        self.segmentBoxes = segmentBoxes
+        if len(segmentBoxes) > 0:
+            self.bounds = (*segmentBoxes[:, 0:2].min(axis=0).tolist(), *segmentBoxes[:, 2:4].max(axis=0).tolist())
+        else:
+            self.bounds = None
+        self.setLines(checkpoints, startLine)
+
+    @staticmethod
+    def compile(trackpoints, checkpoints, startLine):
+        """Compiles the editable lists of a Track, see Track.trackpoints"""
+        segments = boundarySegments(trackpoints)
+        boundaryOffsets = np.cumsum([0] + [len(boundary) for boundary in trackpoints], dtype=np.int64)
+        segmentBoxes = np.hstack((np.minimum(segments[:, 0:2], segments[:, 2:4]),
+                                  np.maximum(segments[:, 0:2], segments[:, 2:4])))
+        return CompiledTrack(segments, boundaryOffsets, segmentBoxes, checkpoints, startLine)
+
+    def setLines(self, checkpoints, startLine):
+        """Recompiles the checkpoints and start line, the boundaries are left as they are"""
+        self.checkpoints = np.asarray(checkpoints, dtype=np.float64).reshape(-1, 4)
+        self.startLine = np.ravel(np.asarray(startLine, dtype=np.float64))
+
+    def toTrackpoints(self, integer):
+        """Rebuilds Track.trackpoints: an array of arrays of (x, y) tuples
+
+        Args:
+            integer: whether the coordinates were ints, see save
+        """
+        # Row i of a boundary's segments ends at its point i
+        points = self.segments[:, 2:4].astype(np.int64) if integer else self.segments[:, 2:4]
+        points = [tuple(point) for point in points.tolist()]
+        offsets = self.boundaryOffsets.tolist()
+        return [points[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    #============================================================================
+    # Sidecar cache
+
+    def save(self, directory, header):
+        """Saves the arrays as one .npy file each plus header.json, see Controllers/replay_buffer.py
+
+        The whole directory is written under a unique temporary name and then renamed into
+        place, so processes caching the same track at once never see each other's partial
+        files. Whoever renames first wins, the others throw their copy away.
+
+        Args:
+            header: JSON serializable dict saved along with the arrays, FORMAT_VERSION is added
+        Returns:
+            whether this copy ended up in the cache
+        """
+        parent = os.path.dirname(directory)
+        os.makedirs(parent, exist_ok=True)
+        temporary = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            for name in ARRAY_NAMES:
+                np.save(os.path.join(temporary, name + ".npy"), getattr(self, name))
+            with open(os.path.join(temporary, "header.json"), "w") as f:
+                f.write(json.dumps({**header, "version": FORMAT_VERSION}))
+
+            # A cache from another format version is in the way, see isCached
+            if os.path.exists(directory) and not isCached(directory):
+                shutil.rmtree(directory, ignore_errors=True)
+            os.replace(temporary, directory)
+            return True
+        except OSError:
+            # Lost the race to another process caching the same track
+            return False
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    @staticmethod
+    def load(directory):
+        """Loads a saved compiled track, the arrays are memory-mapped so nothing is parsed
+
+        Returns:
+            (compiled track, header given to save)
+        """
+        header = json.loads(open(os.path.join(directory, "header.json"), "r").read())
+        arrays = [np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in ARRAY_NAMES]
+        return CompiledTrack(*arrays, header["checkpoints"], header["startLine"]), header
+
+def cachePath(saveJSON, cacheDirectory=CACHE_DIRECTORY):
+    """Returns the sidecar directory of a track's JSON, named by a hash of the JSON text"""
+    return os.path.join(cacheDirectory, hashlib.sha256(saveJSON.encode()).hexdigest()[:16])
+
+def isCached(path):
+    """Whether path holds a complete cache saved in the current FORMAT_VERSION"""
+    try:
+        header = json.loads(open(os.path.join(path, "header.json"), "r").read())
+    except (OSError, ValueError):
+        return False
+    return header.get("version") == FORMAT_VERSION
@@ -0,0 +1,102 @@
+import math
+import numpy as np
+from raycast import drivableGrid
+
+DEFAULT_CELL_SIZE = 4 # Distance in pixels between samples of the field
+MAX_DISTANCE = 64 # Distances are only computed up to this far from a wall, anything further is clamped
+
+class DistanceField:
+    """Signed distance to the closest track boundary, sampled on a regular grid
+
+    Positive on the drivable side of the boundaries (see raycast.drivableGrid) and negative
+    elsewhere. Distances are clamped to MAX_DISTANCE. Points outside the grid count as being
+    right on a wall.
+
+    Used as a conservative early out for crash tests: a point whose sampled distance is large
+    enough is guaranteed to be further than a given radius from every wall, anything else still
+    needs an exact test.
+    """
+
+    def __init__(self, cellSize, origin, field):
+        """Use build rather than constructing a field directly
+
+        Args:
+            cellSize: distance in pixels between samples
+            origin: (x, y) of sample (0, 0)
+            field: float32 array of shape (rows, columns)
+        """
+        self.cellSize = cellSize
+        self.origin = origin
+        self.field = field
+        # The distance function changes by at most 1 per pixel moved, and a point is at most
+        # this far from its nearest sample
+        self.sampleError = cellSize * math.sqrt(0.5)
+
+    @staticmethod
+    def build(segments, cellSize=DEFAULT_CELL_SIZE):
+        """Bakes the field from the (S, 4) boundary segments, see raycast.boundarySegments
+
+        Each segment only updates the samples within MAX_DISTANCE of its bounding box, so
+        baking costs about the same per segment whatever the number of segments.
+        """
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        points = segments.reshape(-1, 2)
+        if len(points) == 0:
+            return DistanceField(cellSize, (0.0, 0.0), np.zeros((1, 1), dtype=np.float32))
+
+        origin = points.min(axis=0) - MAX_DISTANCE
+        columns, rows = (np.ceil((points.max(axis=0) + MAX_DISTANCE - origin) / cellSize).astype(int) + 1).tolist()
+        field = np.full((rows, columns), MAX_DISTANCE, dtype=np.float64)
+
+        for x1, y1, x2, y2 in segments:
+            # Window of samples within MAX_DISTANCE of the segment
+            column_start = max(int((min(x1, x2) - MAX_DISTANCE - origin[0]) // cellSize), 0)
+            column_end = min(int((max(x1, x2) + MAX_DISTANCE - origin[0]) // cellSize) + 2, columns)
+            row_start = max(int((min(y1, y2) - MAX_DISTANCE - origin[1]) // cellSize), 0)
+            row_end = min(int((max(y1, y2) + MAX_DISTANCE - origin[1]) // cellSize) + 2, rows)
+            xs = origin[0] + cellSize * np.arange(column_start, column_end)[None, :]
+            ys = origin[1] + cellSize * np.arange(row_start, row_end)[:, None]
+
+            # Distance from each sample to the closest point of the segment
+            dx, dy = x2 - x1, y2 - y1
+            length_squared = dx * dx + dy * dy
+            if length_squared > 0:
+                t = np.clip(((xs - x1) * dx + (ys - y1) * dy) / length_squared, 0, 1)
+            else:
+                t = 0
+            distances = np.hypot(xs - (x1 + t * dx), ys - (y1 + t * dy))
+            window = field[row_start:row_end, column_start:column_end]
+            np.minimum(window, distances, out=window)
+
+        drivable = drivableGrid(origin[0] + cellSize * np.arange(columns), origin[1] + cellSize * np.arange(rows), segments)
+        field[~drivable] *= -1
+
+        return DistanceField(cellSize, tuple(origin.tolist()), field.astype(np.float32))
+
+    def sample(self, points):
+        """Returns the field at the sample nearest to each point
+
+        Args:
+            points: float array of shape (..., 2)
+        Returns:
+            float array of shape (...), 0 for points outside the grid
+        """
+        points = np.asarray(points, dtype=np.float64)
+        rows, columns = self.field.shape
+        column = np.rint((points[..., 0] - self.origin[0]) / self.cellSize).astype(np.int64)
+        row = np.rint((points[..., 1] - self.origin[1]) / self.cellSize).astype(np.int64)
+        inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        values = self.field[np.where(inside, row, 0), np.where(inside, column, 0)]
+        return np.where(inside, values, 0)
+
+    def isClear(self, points, radius):
+        """Checks whether all points are guaranteed to be more than radius from every wall
+
+        Args:
+            points: float array of shape (..., K, 2)
+            radius: distance in pixels
+        Returns:
+            bool array of shape (...), True if all K points are on the drivable side and further
+            than radius from any wall. False means unknown, not that a point is close to a wall
+        """
+        return (self.sample(points) - self.sampleError > radius).all(axis=-1)
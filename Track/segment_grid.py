@@ -0,0 +1,168 @@
+import math
+import numpy as np
+
+DEFAULT_CELL_SIZE = 64 # Side length of a grid cell in pixels
+
+class SegmentGrid:
+    """Uniform grid over the boundary segments of a track
+
+    Every segment is registered in each cell its (closed) extent touches, so any query
+    that visits the cells covering a region is guaranteed to see every segment inside it.
+    Cells are stored sparsely in a dict, so the grid does not need to know the track's size.
+
+    Segments are kept per boundary so a single boundary can be re-indexed when it is edited.
+    """
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        self.cellSize = cellSize
+        self.cells = {} # (cx, cy) -> set of segment ids
+        self.segments = {} # segment id -> ((x1, y1), (x2, y2))
+        self.boundaryIds = [] # boundaryIds[i] is the list of segment ids of boundary i
+        self._nextId = 0
+        self._epsilon = cellSize * 1e-9 # Dilation so segments lying on a cell edge land in both cells
+
+    #============================================================================
+    # Building and editing
+
+    def build(self, trackpoints):
+        """Indexes every boundary of the given trackpoints from scratch"""
+        self.clear()
+        for i, boundary in enumerate(trackpoints):
+            self.setBoundary(i, boundary)
+
+    def buildFromSegments(self, segments, boundaryOffsets):
+        """Indexes every boundary of a compiled track from scratch, see Track/compiled_track.py"""
+        self.clear()
+        rows = np.asarray(segments).tolist()
+        for i in range(len(boundaryOffsets) - 1):
+            self._setSegments(i, [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in rows[boundaryOffsets[i]:boundaryOffsets[i + 1]]])
+
+    def clear(self):
+        self.cells = {}
+        self.segments = {}
+        self.boundaryIds = []
+
+    def setBoundary(self, index, boundary):
+        """(Re)indexes the segments of boundary number index
+
+        Args:
+            index: index of the boundary in Track.trackpoints, may be negative
+            boundary: array of points of the boundary, closing segment included like Car._isCrashed
+        """
+        self._setSegments(index, [(tuple(boundary[i]), tuple(boundary[i + 1])) for i in range(-1, len(boundary) - 1)])
+
+    def _setSegments(self, index, segments):
+        if index < 0:
+            index += len(self.boundaryIds)
+        while len(self.boundaryIds) <= index:
+            self.boundaryIds.append([])
+
+        self._removeIds(self.boundaryIds[index])
+        ids = []
+        for segment in segments:
+            segment_id = self._nextId
+            self._nextId += 1
+            self.segments[segment_id] = segment
+            for cell in self._cellsAlong(segment[0], segment[1], self._epsilon):
+                self.cells.setdefault(cell, set()).add(segment_id)
+            ids.append(segment_id)
+        self.boundaryIds[index] = ids
+
+    def truncate(self, numBoundaries):
+        """Drops every boundary from index numBoundaries onwards"""
+        for ids in self.boundaryIds[numBoundaries:]:
+            self._removeIds(ids)
+        del self.boundaryIds[numBoundaries:]
+
+    def _removeIds(self, ids):
+        for segment_id in ids:
+            p, q = self.segments.pop(segment_id)
+            for cell in self._cellsAlong(p, q, self._epsilon):
+                cell_ids = self.cells[cell]
+                cell_ids.discard(segment_id)
+                if len(cell_ids) == 0:
+                    del self.cells[cell]
+
+    #============================================================================
+    # Queries
+
+    def query(self, minX, minY, maxX, maxY):
+        """Returns the segments registered in any cell overlapping the given box"""
+        ids = set()
+        for cx in range(math.floor(minX / self.cellSize), math.floor(maxX / self.cellSize) + 1):
+            for cy in range(math.floor(minY / self.cellSize), math.floor(maxY / self.cellSize) + 1):
+                cell_ids = self.cells.get((cx, cy))
+                if cell_ids:
+                    ids |= cell_ids
+        return [self.segments[segment_id] for segment_id in ids]
+
+    def segmentsAlongRays(self, rays):
+        """Returns the segments in the cells traversed by any of the given rays
+
+        Args:
+            rays: list of sensors ((p1x, p1y), (p2x, p2y))
+        Returns:
+            float array of shape (K, 4), see raycast.boundarySegments
+        """
+        ids = set()
+        for p1, p2 in rays:
+            for cell in self._cellsAlongRay(p1, p2):
+                cell_ids = self.cells.get(cell)
+                if cell_ids:
+                    ids |= cell_ids
+        if len(ids) == 0:
+            return np.empty((0, 4))
+        return np.array([self.segments[segment_id] for segment_id in ids], dtype=np.float64).reshape(-1, 4)
+
+    #============================================================================
+    # Grid traversal
+
+    def _cellsAlongRay(self, p1, p2):
+        """Yields every cell p1 -> p2 passes through, in order from p1"""
+        seen = set()
+        for _, _, cells in self._pieces(p1, p2, 0):
+            for cell in cells:
+                if cell not in seen:
+                    seen.add(cell)
+                    yield cell
+
+    def _cellsAlong(self, p, q, epsilon):
+        cells = set()
+        for _, _, piece_cells in self._pieces(p, q, epsilon):
+            cells.update(piece_cells)
+        return cells
+
+    def _pieces(self, p, q, epsilon):
+        """Splits p -> q at every grid line it crosses
+
+        Yields (t0, t1, cells) for each piece, where cells are the cells the piece's bounding
+        box (grown by epsilon) overlaps. Without growth that is the single cell holding the piece,
+        or its neighbours too when the piece lies exactly on a grid line.
+        """
+        size = self.cellSize
+        dx = q[0] - p[0]
+        dy = q[1] - p[1]
+
+        ts = [0.0, 1.0]
+        for start, delta in ((p[0], dx), (p[1], dy)):
+            if delta == 0:
+                continue
+            end = start + delta
+            for k in range(math.floor(min(start, end) / size) + 1, math.floor(max(start, end) / size) + 1):
+                t = (k * size - start) / delta
+                if 0 < t < 1:
+                    ts.append(t)
+        ts.sort()
+
+        for i in range(len(ts) - 1):
+            t0, t1 = ts[i], ts[i + 1]
+            x0, x1 = p[0] + dx * t0, p[0] + dx * t1
+            y0, y1 = p[1] + dy * t0, p[1] + dy * t1
+            if epsilon == 0:
+                # A piece lies inside one cell, use its midpoint to pick it
+                cells = [(math.floor((x0 + x1) / 2 / size), math.floor((y0 + y1) / 2 / size))]
+            else:
+                cells = [(cx, cy)
+                         for cx in range(math.floor((min(x0, x1) - epsilon) / size), math.floor((max(x0, x1) + epsilon) / size) + 1)
+                         for cy in range(math.floor((min(y0, y1) - epsilon) / size), math.floor((max(y0, y1) + epsilon) / size) + 1)]
+            yield t0, t1, cells
@@ -0,0 +1,200 @@
+import json
+import math
+import os
+import numpy as np
+from raycast import castRays, drivableGrid
+
+DEFAULT_CELL_SIZE = 8 # Distance in pixels between sampled ray origins
+DEFAULT_NUM_ANGLES = 256 # Number of sampled ray directions
+DEFAULT_DTYPE = np.uint16 # uint8 halves the table's size, distances are then rounded to range / 254
+DEFAULT_MAX_SPREAD = 32 # Largest difference in pixels between the samples a lookup interpolates
+CACHE_DIRECTORY = './Track/sensor_tables'
+BUILD_ORIGINS_PER_CHUNK = 256 # Ray origins cast together while building
+
+class SensorTable:
+    """Precomputed sensor distances of a fixed track
+
+    Samples the distance to the closest boundary along rays of a fixed length starting at every
+    point of a regular grid over the drivable part of the track, in numAngles directions. Sensor
+    readings are then answered by trilinear interpolation over (x, y, angle) instead of ray
+    casting. Distances are quantized to an unsigned integer dtype.
+
+    Only grid points inside the drivable region are sampled, so rays starting next to a wall
+    (where any of the 8 surrounding samples is missing) can't be answered by the table and are
+    left to an exact raycast. So are rays whose surrounding samples differ by more than maxSpread,
+    which happens where a small change of the ray makes it hit a different wall and interpolation
+    would be far off. Accuracy is set by maxSpread, the cell size, the number of angles and the
+    dtype, see measureError.
+    """
+
+    def __init__(self, sensorRange, cellSize, numAngles, origin, table, maxSpread=DEFAULT_MAX_SPREAD):
+        """Use build or load rather than constructing a table directly
+
+        Args:
+            sensorRange: length of the rays the table answers for
+            cellSize: distance in pixels between grid points
+            numAngles: number of ray directions, evenly spaced over the full turn
+            origin: (x, y) of grid point (0, 0)
+            table: integer array of shape (rows, columns, numAngles), the max value of the dtype
+                   marks grid points that were not sampled
+            maxSpread: lookups whose samples differ by more than this many pixels are not answered,
+                       lower is more accurate but leaves more rays to exact raycasting
+        """
+        self.sensorRange = sensorRange
+        self.cellSize = cellSize
+        self.numAngles = numAngles
+        self.origin = origin
+        self.table = table
+        self.maxSpread = maxSpread
+        self.missing = np.iinfo(table.dtype).max
+        self.scale = sensorRange / (self.missing - 1) # Distance of one quantization step
+
+    #============================================================================
+    # Building and caching
+
+    @staticmethod
+    def build(segments, sensorRange, cellSize=DEFAULT_CELL_SIZE, numAngles=DEFAULT_NUM_ANGLES, dtype=DEFAULT_DTYPE):
+        """Samples every ray of the table
+
+        Args:
+            segments: (S, 4) boundary segments of the track, see raycast.boundarySegments
+        """
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        points = segments.reshape(-1, 2)
+        origin = points.min(axis=0) if len(points) > 0 else np.zeros(2)
+        size = points.max(axis=0) - origin if len(points) > 0 else np.zeros(2)
+        columns, rows = np.maximum(np.ceil(size / cellSize).astype(int) + 1, 2).tolist()
+
+        missing = np.iinfo(dtype).max
+        table = np.full((rows, columns, numAngles), missing, dtype=dtype)
+
+        xs = origin[0] + cellSize * np.arange(columns)
+        ys = origin[1] + cellSize * np.arange(rows)
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        drivable = np.flatnonzero(drivableGrid(xs, ys, segments))
+
+        angles = 2 * math.pi * np.arange(numAngles) / numAngles
+        directions = np.stack((np.cos(angles), np.sin(angles)), axis=1) * sensorRange
+        scale = sensorRange / (missing - 1)
+        for start in range(0, len(drivable), BUILD_ORIGINS_PER_CHUNK):
+            cells = drivable[start:start + BUILD_ORIGINS_PER_CHUNK]
+            starts = np.stack((grid_x.ravel()[cells], grid_y.ravel()[cells]), axis=1)
+            rays = np.empty((len(cells), numAngles, 4))
+            rays[:, :, 0:2] = starts[:, None]
+            rays[:, :, 2:4] = starts[:, None] + directions
+            distances, _ = castRays(rays.reshape(-1, 4), segments)
+            quantized = np.minimum(np.round(distances / scale), missing - 1).astype(dtype)
+            table.reshape(-1, numAngles)[cells] = quantized.reshape(len(cells), numAngles)
+
+        return SensorTable(sensorRange, cellSize, numAngles, tuple(origin.tolist()), table)
+
+    @staticmethod
+    def loadOrBuild(track, sensorRange, cellSize=DEFAULT_CELL_SIZE, numAngles=DEFAULT_NUM_ANGLES,
+                    dtype=DEFAULT_DTYPE, maxSpread=DEFAULT_MAX_SPREAD, cacheDirectory=CACHE_DIRECTORY):
+        """Loads the table of this track from the cache, building and caching it if there is none
+
+        Tables are cached per track (by a hash of its JSON) and per set of parameters.
+        """
+        name = "_".join(str(part) for part in (track.hash()[:16], sensorRange, cellSize, numAngles, np.dtype(dtype).name))
+        path = os.path.join(cacheDirectory, name)
+        if os.path.exists(path + ".json"):
+            table = SensorTable.load(path)
+        else:
+            table = SensorTable.build(track.getBoundarySegments(), sensorRange, cellSize, numAngles, dtype)
+            table.save(path)
+        table.maxSpread = maxSpread
+        return table
+
+    def save(self, path):
+        """Saves the table as <path>.npy plus a small <path>.json header"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".npy.tmp", "wb") as f:
+            np.save(f, self.table)
+        os.replace(path + ".npy.tmp", path + ".npy")
+
+        header = {
+            "sensorRange": self.sensorRange,
+            "cellSize": self.cellSize,
+            "numAngles": self.numAngles,
+            "origin": self.origin,
+        }
+        with open(path + ".json.tmp", "w") as f:
+            f.write(json.dumps(header))
+        os.replace(path + ".json.tmp", path + ".json")
+
+    @staticmethod
+    def load(path):
+        """Loads a saved table, the table is memory-mapped so only the parts used are read"""
+        header = json.loads(open(path + ".json", "r").read())
+        table = np.load(path + ".npy", mmap_mode="r")
+        return SensorTable(header["sensorRange"], header["cellSize"], header["numAngles"], tuple(header["origin"]), table)
+
+    #============================================================================
+    # Lookup
+
+    def lookup(self, rays):
+        """Interpolates the distance seen along each ray
+
+        Args:
+            rays: array-like of shape (R, 4) or a list of sensors ((p1x, p1y), (p2x, p2y))
+        Returns:
+            float array of shape (R,), NaN for rays the table can't answer: rays starting too
+            close to a wall or off the track, or rays that are not sensorRange long
+        """
+        rays = np.asarray(rays, dtype=np.float64).reshape(-1, 4)
+        dx = rays[:, 2] - rays[:, 0]
+        dy = rays[:, 3] - rays[:, 1]
+        rows, columns, num_angles = self.table.shape
+
+        # Position of each ray in grid units, the angle wraps around
+        gx = (rays[:, 0] - self.origin[0]) / self.cellSize
+        gy = (rays[:, 1] - self.origin[1]) / self.cellSize
+        ga = (np.arctan2(dy, dx) % (2 * math.pi)) / (2 * math.pi) * num_angles
+
+        x0 = np.floor(gx).astype(np.int64)
+        y0 = np.floor(gy).astype(np.int64)
+        a0 = np.floor(ga).astype(np.int64)
+        valid = (x0 >= 0) & (x0 < columns - 1) & (y0 >= 0) & (y0 < rows - 1)
+        valid &= np.abs(np.hypot(dx, dy) - self.sensorRange) <= 1e-6 * self.sensorRange
+        x0 = np.where(valid, x0, 0)
+        y0 = np.where(valid, y0, 0)
+        tx, ty, ta = gx - x0, gy - y0, ga - a0
+        a0 %= num_angles
+        a1 = (a0 + 1) % num_angles
+
+        distances = np.zeros(len(rays))
+        lowest = np.full(len(rays), self.missing)
+        highest = np.zeros(len(rays), dtype=self.table.dtype)
+        for corner_x, weight_x in ((x0, 1 - tx), (x0 + 1, tx)):
+            for corner_y, weight_y in ((y0, 1 - ty), (y0 + 1, ty)):
+                for corner_a, weight_a in ((a0, 1 - ta), (a1, ta)):
+                    samples = self.table[corner_y, corner_x, corner_a]
+                    lowest = np.minimum(lowest, samples)
+                    highest = np.maximum(highest, samples)
+                    distances += samples * (weight_x * weight_y * weight_a)
+
+        valid &= highest != self.missing
+        valid &= (highest.astype(np.float64) - lowest) * self.scale <= self.maxSpread
+        distances *= self.scale
+        distances[~valid] = np.nan
+        return distances
+
+    def measureError(self, segments, numSamples=10000, seed=0):
+        """Compares the table against exact raycasting on random rays it can answer
+
+        Returns:
+            (mean absolute error, max absolute error, fraction of rays the table answered)
+        """
+        rng = np.random.default_rng(seed)
+        rows, columns, _ = self.table.shape
+        starts = np.array(self.origin) + rng.random((numSamples, 2)) * (np.array([columns, rows]) - 1) * self.cellSize
+        angles = rng.random(numSamples) * 2 * math.pi
+        rays = np.hstack((starts, starts + np.stack((np.cos(angles), np.sin(angles)), axis=1) * self.sensorRange))
+
+        approximate = self.lookup(rays)
+        answered = ~np.isnan(approximate)
+        if not answered.any():
+            return 0.0, 0.0, 0.0
+        exact, _ = castRays(rays[answered], segments)
+        errors = np.abs(approximate[answered] - exact)
+        return float(errors.mean()), float(errors.max()), float(answered.mean())
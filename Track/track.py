@@ -1,6 +1,12 @@
+import hashlib
 import json
 import math
 import pygame
+from Track.compiled_track import CompiledTrack, CACHE_MIN_SEGMENTS, FORMAT_VERSION, cachePath, isCached
+from Track.segment_grid import SegmentGrid
+from Track.sensor_table import SensorTable
+from Track.distance_field import DistanceField, DEFAULT_CELL_SIZE as DISTANCE_FIELD_CELL_SIZE
+from profiling import profiler
 
 class Track:
 
@@ -11,9 +17,12 @@ class Track:
     DEFAULT_CAR_START_POS = [20, 20]
     DEFAULT_CAR_START_DIR = math.pi
 
+    BACKGROUND_COLOR = 'grey'
+
     def __init__(self):
         # Track Data
-        self.trackpoints = [] # array of arrays of points, each array represents a border (so most likely 2 arrays for 2 borders, inner an outer)
+        self._trackpoints = [] # see trackpoints
+        self._integerPoints = True # Whether trackpoints rebuilt from a cached compiled track get int coordinates
         self.startLine = [(0, 0), (0, 0)] # array of 2 points
         self.checkpoints = [] # array of arrays of 2 points
         self.startPos = Track.DEFAULT_CAR_START_POS # 1 point
@@ -33,16 +42,48 @@ class Track:
         # Show track details
         self.showCheckpoints = True
 
+        # Goes up every time an edit of the track is finished or the track is loaded, so anything
+        # built from the track can tell it is out of date without comparing the whole track
+        self.version = 0
+
         # Keeps track of most recently added track feature for UNDO
         # 0 is start line, 1 is checkpoint, 2 + i is boundary array with index i (e.g. 3 on stack means the boundary with index 1)
         self.editStack = []
 
+        # Array form of the geometry, see getCompiled. Its boundaries are recompiled lazily after
+        # trackpoints change, its checkpoints and start line straight away (see _linesChanged)
+        self._compiled = None
+
+        # Spatial index over the boundary segments for crash tests and sensors, see segmentGrid
+        self._segmentGrid = None
+
+        # Optional precomputed sensor distances, see enableSensorTable. Dropped whenever the boundaries change
+        self.sensorTable = None
+        self._sensorTableOptions = None # What enableSensorTable was given, see getSensingOptions
+
+        # Optional distance field for fast crash tests, see enableDistanceField. Rebaked after the boundaries change
+        self._distanceField = None
+        self._distanceFieldCellSize = None # None while disabled
+
+        # Background and every finished track feature pre-rendered, redrawn only once marked dirty.
+        # Features still being edited are drawn on top of it every frame
+        self._staticLayer = None
+        self._staticLayerDirty = True
+        self._overlayRects = [] # Where the edit overlay was drawn last frame
+
     #============================================================================
     # Track save and load
         
     # Requires a properly formatted JSON file (i.e. one created by the save function)
-    def load(self, saveJSON):
+    # Large tracks are compiled into a binary sidecar cache the first time they are loaded,
+    # later loads of the same JSON memory-map it instead of parsing, see Track/compiled_track.py
+    def load(self, saveJSON, useCache=True):
         self.reset()
+        path = cachePath(saveJSON) if useCache else None
+        if path is not None and isCached(path) and self._loadCompiled(path):
+            self.version += 1
+            return
+
         save = json.loads(saveJSON)
         self.startPos = save["startPos"]
         self.startDir = save["startDir"]
@@ -64,6 +105,48 @@ class Track:
         for i in range(len(self.startLine)):
             self.startLine[i] = tuple(self.startLine[i])
 
+        self._boundaryChanged()
+        self._linesChanged()
+        self._markDirty()
+        self.version += 1
+
+        if path is not None and len(self.getBoundarySegments()) >= CACHE_MIN_SEGMENTS:
+            self._saveCompiled(path)
+
+    def _saveCompiled(self, path):
+        coordinates = [value for boundary in self.trackpoints for point in boundary for value in point]
+        integer = all(type(value) is int for value in coordinates)
+        if not integer and not all(type(value) is float for value in coordinates):
+            return # Mixed ints and floats can't be rebuilt exactly, see CompiledTrack.toTrackpoints
+        self.getCompiled().save(path, {
+            "startPos": self.startPos,
+            "startDir": self.startDir,
+            "checkpoints": self.checkpoints,
+            "startLine": self.startLine,
+            "integer": integer,
+        })
+
+    # Returns whether the cache could be loaded, a cache replaced mid-load is treated as a miss
+    def _loadCompiled(self, path):
+        try:
+            compiled, header = CompiledTrack.load(path)
+        except (OSError, ValueError, KeyError):
+            return False
+        if header.get("version") != FORMAT_VERSION:
+            return False
+        self.startPos = header["startPos"]
+        self.startDir = header["startDir"]
+        self.checkpoints = [[tuple(point) for point in checkpoint] for checkpoint in header["checkpoints"]]
+        self.startLine = [tuple(point) for point in header["startLine"]]
+
+        # trackpoints are only rebuilt from the compiled track if something asks for them
+        self._boundaryChanged()
+        self._trackpoints = None
+        self._integerPoints = header["integer"]
+        self._compiled = compiled
+        self._markDirty()
+        return True
+
 
     # Saves the track as JSON in the following format:
     # "startPos": (x, y) // 1 point
@@ -76,7 +159,15 @@ class Track:
             print("Finish editing before saving")
             return
 
-        saveFile = json.dumps({
+        print(self.toJSON())
+
+    # Returns a hash of the track's JSON, identifies the track in on disk caches
+    def hash(self):
+        return hashlib.sha256(self.toJSON().encode()).hexdigest()
+
+    # Returns the JSON that save prints, can be given to load
+    def toJSON(self):
+        return json.dumps({
             "startPos": self.startPos,
             "startDir": self.startDir,
             "trackpoints": self.trackpoints,
@@ -84,34 +175,184 @@ class Track:
             "startLine": self.startLine
         })
 
-        print(saveFile)
+    #============================================================================
+    # Geometry
+
+    @property
+    def trackpoints(self):
+        """Array of arrays of points, each array represents a border (so most likely 2 arrays for 2 borders, inner an outer)"""
+        if self._trackpoints is None:
+            self._trackpoints = self._compiled.toTrackpoints(self._integerPoints)
+        return self._trackpoints
+
+    @trackpoints.setter
+    def trackpoints(self, trackpoints):
+        self._trackpoints = trackpoints
+
+    def getCompiled(self):
+        """Returns the track's geometry as contiguous arrays, see Track/compiled_track.py"""
+        if self._compiled is None:
+            self._compiled = CompiledTrack.compile(self.trackpoints, self.checkpoints, self.startLine)
+        return self._compiled
+
+    def getBoundarySegments(self):
+        """Returns every boundary segment as an (S, 4) array, see raycast.boundarySegments"""
+        return self.getCompiled().segments
+
+    @property
+    def segmentGrid(self):
+        """SegmentGrid over the boundaries, built on first use"""
+        if self._segmentGrid is None:
+            self._segmentGrid = SegmentGrid()
+            compiled = self.getCompiled()
+            self._segmentGrid.buildFromSegments(compiled.segments, compiled.boundaryOffsets)
+        return self._segmentGrid
+
+    def enableSensorTable(self, sensorRange=800, **options):
+        """Answers sensor readings from a precomputed table from now on, see Track/sensor_table.py
+
+        The table is loaded from the on disk cache or built and cached. Editing the track's
+        boundaries drops the table, sensors then go back to exact raycasting.
+
+        Args:
+            sensorRange: length of the sensors, AICar.sensorRange
+            options: passed to SensorTable.loadOrBuild (cellSize, numAngles, dtype, cacheDirectory)
+        """
+        self.sensorTable = SensorTable.loadOrBuild(self, sensorRange, **options)
+        self._sensorTableOptions = {"sensorRange": sensorRange, **options}
+        self.version += 1
+
+    def enableDistanceField(self, cellSize=DISTANCE_FIELD_CELL_SIZE):
+        """Lets crash tests skip cars far from every wall using a baked distance field
+
+        See Track/distance_field.py. The field is baked on first use and again after the boundaries change.
+        """
+        self._distanceFieldCellSize = cellSize
+        self._distanceField = None
+        self.version += 1
+
+    def getSensingOptions(self):
+        """Returns how sensors and crash tests are currently sped up, see applySensingOptions
+
+        Lets another copy of the track (like a worker process's) sense exactly like this one.
+        """
+        return {
+            "sensorTable": self._sensorTableOptions if self.sensorTable is not None else None,
+            "distanceField": self._distanceFieldCellSize,
+        }
+
+    def applySensingOptions(self, options):
+        """Enables what getSensingOptions returned on another copy of the track"""
+        if options["sensorTable"] is not None:
+            self.enableSensorTable(**options["sensorTable"])
+        if options["distanceField"] is not None:
+            self.enableDistanceField(options["distanceField"])
+
+    def getDistanceField(self):
+        """Returns the DistanceField of the boundaries, or None if disabled or while editing"""
+        if self._distanceFieldCellSize is None or self.editStatus != 0:
+            return None
+        if self._distanceField is None:
+            self._distanceField = DistanceField.build(self.getBoundarySegments(), self._distanceFieldCellSize)
+        return self._distanceField
+
+    def _boundaryChanged(self, index=None):
+        """Call after editing trackpoints to keep the cached geometry in sync
+
+        Args:
+            index: index of the only boundary that changed, or None to rebuild everything
+        """
+        self._compiled = None
+        self.sensorTable = None
+        self._distanceField = None
+        if index is None:
+            self._segmentGrid = None
+        elif self._segmentGrid is not None:
+            self._segmentGrid.setBoundary(index, self.trackpoints[index])
+
+    def _linesChanged(self):
+        """Call after editing the checkpoints or start line to keep the compiled track in sync"""
+        if self._compiled is not None:
+            self._compiled.setLines(self.checkpoints, self.startLine)
 
     #============================================================================
     # Display and updates
-    def render(self, surface):
-        self._updateClickStatus()
-        self._handleEdits()
-        self._displayStartLine(surface)
-        if self.showCheckpoints:
-            self._displayCheckpoints(surface)
-        self._displayTrack(surface)
-
+    def render(self, surface, restoreRects=None):
+        """Draws the track, background included
+
+        Args:
+            surface: surface to draw on
+            restoreRects: if given, only these areas get their background and track redrawn (as
+                          long as the track did not change), otherwise the whole surface does
+        Returns:
+            list of rects drawn on
+        """
+        with profiler.span("track.edits"):
+            self._updateClickStatus()
+            self._handleEdits()
+        with profiler.span("track.draw"):
+            layer, redrawn = self._getStaticLayer(surface)
+            if redrawn or restoreRects is None:
+                rects = [surface.blit(layer, (0, 0))]
+            else:
+                # Last frame's edit overlay is erased too
+                rects = [surface.blit(layer, rect, rect) for rect in restoreRects + self._overlayRects]
+            self._overlayRects = self._displayEditOverlay(surface)
+            return rects + self._overlayRects
+
+    def _markDirty(self):
+        """Call after a track feature is added, removed, or starts or stops being edited"""
+        self._staticLayerDirty = True
+
+    def _getStaticLayer(self, surface):
+        """Returns (the cached background and finished track features, whether they were just redrawn)"""
+        if self._staticLayer is None or self._staticLayer.get_size() != surface.get_size():
+            self._staticLayer = pygame.Surface(surface.get_size(), 0, surface)
+            self._staticLayerDirty = True
+
+        redrawn = self._staticLayerDirty
+        if redrawn:
+            layer = self._staticLayer
+            layer.fill(Track.BACKGROUND_COLOR)
+            if not self.isEditingStartLine:
+                self._displayStartLine(layer)
+            if self.showCheckpoints:
+                checkpoints = self.checkpoints[:-1] if self.isEditingCheckpoint else self.checkpoints
+                for checkpoint in checkpoints:
+                    self._displayCheckpoint(layer, checkpoint)
+            boundaries = self.trackpoints[:-1] if self.isEditingBoundary else self.trackpoints
+            for boundary in boundaries:
+                self._displayBoundary(layer, boundary)
+            self._staticLayerDirty = False
+        return self._staticLayer, redrawn
+
+    def _displayEditOverlay(self, surface):
+        # Only the features being edited change from frame to frame
+        rects = []
+        if self.isEditingStartLine:
+            rects.append(self._displayStartLine(surface))
+        if self.isEditingCheckpoint and self.showCheckpoints and len(self.checkpoints) > 0:
+            rects.append(self._displayCheckpoint(surface, self.checkpoints[-1]))
+        if self.isEditingBoundary and len(self.trackpoints) > 0:
+            rects.append(self._displayBoundary(surface, self.trackpoints[-1]))
+        return rects
+
+    # Each display method returns the rect it drew on
     def _displayStartLine(self, surface):
-        pygame.draw.line(surface, 'green', self.startLine[0], self.startLine[1])
+        return pygame.draw.line(surface, 'green', self.startLine[0], self.startLine[1])
 
-    def _displayCheckpoints(self, surface):
-        for checkpoint in self.checkpoints:
-            pygame.draw.line(surface, 'white', checkpoint[0], checkpoint[1])
-
-    def _displayTrack(self, surface):
-        for boundary in self.trackpoints: # boundary is an array of points
-            if len(boundary) == 2:
-                pygame.draw.line(surface, 'black', boundary[0], boundary[1])
-            elif len(boundary) > 2:
-                pygame.draw.lines(surface, 'black', True, boundary)
-            else:
-                for point in boundary:
-                    pygame.draw.circle(surface, 'black', point, 1)
+    def _displayCheckpoint(self, surface, checkpoint):
+        return pygame.draw.line(surface, 'white', checkpoint[0], checkpoint[1])
+
+    def _displayBoundary(self, surface, boundary): # boundary is an array of points
+        if len(boundary) == 2:
+            return pygame.draw.line(surface, 'black', boundary[0], boundary[1])
+        elif len(boundary) > 2:
+            return pygame.draw.lines(surface, 'black', True, boundary)
+        rect = pygame.Rect(boundary[0], (0, 0)) if boundary else pygame.Rect(0, 0, 0, 0)
+        for point in boundary:
+            rect.union_ip(pygame.draw.circle(surface, 'black', point, 1))
+        return rect
 
     # Will set self.clicked to True the frame it detects a new click, will set it to false the frame after         
     def _updateClickStatus(self):
@@ -143,6 +384,7 @@ class Track:
         if not(self.isEditingStartLine) and self.editStatus == 0:
             self.editStatus = 1
             self.isEditingStartLine = True
+            self._markDirty()
         elif self.isEditingStartLine:
             # Temporary sets start line position to the mouse cursor
             if self.editStatus == 1:
@@ -158,12 +400,18 @@ class Track:
                 self.editStatus = 0
                 self.isEditingStartLine = False
                 self.editStack.append(0)
+                self._linesChanged()
+                self._markDirty()
+                self.version += 1
 
     def clearStartLine(self):
         if self.isEditingStartLine:
             self.editStatus = 0
             self.isEditingStartLine = False
         self.startLine = [[0, 0], [0, 0]]
+        self._linesChanged()
+        self._markDirty()
+        self.version += 1
 
     # Call once to init checkpoint addition, continue to call so long as isEditingCheckpoint is true
     def addCheckpoint(self):
@@ -174,6 +422,7 @@ class Track:
 
             # Adds new checkpoint at mouse position temporarily
             self.checkpoints.append([[i for i in pygame.mouse.get_pos()],[i for i in pygame.mouse.get_pos()]])
+            self._markDirty()
         elif self.isEditingCheckpoint:
             # Temporary sets the position of the new checkpoint to mouse position
             if self.editStatus == 1:
@@ -189,12 +438,18 @@ class Track:
                 self.editStatus = 0
                 self.isEditingCheckpoint = False
                 self.editStack.append(1)
+                self._linesChanged()
+                self._markDirty()
+                self.version += 1
 
     def clearCheckpoints(self):
         if self.isEditingCheckpoint:
             self.editStatus = 0
             self.isEditingCheckpoint = False
         self.checkpoints = []
+        self._linesChanged()
+        self._markDirty()
+        self.version += 1
 
     # Call once to init the creation of a new boundary, continue to call so long as isEditingBoundary is true
     def addBoundary(self):
@@ -204,16 +459,20 @@ class Track:
 
             # Add a new empty boundary
             self.trackpoints.append([[i for i in pygame.mouse.get_pos()]])
+            self._boundaryChanged(len(self.trackpoints) - 1)
+            self._markDirty()
 
         elif self.isEditingBoundary:
             # Sets next point on the boundary to current mouse position
             self.trackpoints[-1][-1] = [i for i in pygame.mouse.get_pos()]
 
-            # On click, adds a new point to the boundary and preps the next point
+            # On click, adds a new point to the boundary and preps the next point. The point
+            # following the mouse only reaches the cached geometry once it is placed
             if self.clicked:
                 self.trackpoints[-1][-1] = [i for i in pygame.mouse.get_pos()]
                 self.trackpoints[-1].append([i for i in pygame.mouse.get_pos()])
                 self.editStack.append(1 + len(self.trackpoints))
+                self._boundaryChanged(len(self.trackpoints) - 1)
 
     # Call once currently drawing boundary is done
     def finalizeBoundary(self):
@@ -223,13 +482,25 @@ class Track:
         # Remove the newly drawn 'boundary' if it's empty
         if len(self.trackpoints[-1]) == 0:
             self.trackpoints.pop()
+            if self._segmentGrid is not None:
+                self._segmentGrid.truncate(len(self.trackpoints))
+            self._compiled = None
+            self.sensorTable = None
+            self._distanceField = None
+        else:
+            self._boundaryChanged(len(self.trackpoints) - 1)
         self.isEditingBoundary = False
         self.editStatus = 0
+        self._markDirty()
+        self.version += 1
 
     def clearBoundaries(self):
         if self.isEditingBoundary:
             self.finalizeBoundary()
         self.trackpoints = []
+        self._boundaryChanged()
+        self._markDirty()
+        self.version += 1
 
     def editStartPos(self):
         if not(self.isEditingStartPos) and self.editStatus == 0:
@@ -241,6 +512,7 @@ class Track:
             if self.clicked:
                 self.isEditingStartPos = False
                 self.editStatus = 0
+                self.version += 1
     
     # Primitive UNDO function that simply removes the last thing added. Does not account for
     # other clear functions nor does it replace the old features
@@ -253,9 +525,13 @@ class Track:
                 self.clearStartLine()
             elif toRemove == 1: # checkpoint
                 self.checkpoints.pop()
+                self._linesChanged()
             else:
                 removeIndex = toRemove - 2
                 self.trackpoints[removeIndex].pop()
+                self._boundaryChanged(removeIndex)
+            self._markDirty()
+            self.version += 1
             
     # Resets the track to default
     def reset(self):
@@ -271,4 +547,6 @@ class Track:
         self.isEditingStartLine = False
         self.isEditingBoundary = False
         self.isEditingStartPos = False
-        self.isEditingStartDir = False
\ No newline at end of file
+        self.isEditingStartDir = False
+        self._markDirty()
+        self.version += 1
@@ -0,0 +1,244 @@
+"""Headless performance benchmarks
+
+Run from the repository root:
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --quick --compare bench.json
+
+Every benchmark reports the median seconds per call over a few repeats. Results are saved
+as JSON together with the commit they were measured on, so runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import timeit
+import numpy as np
+import torch
+from Track.track import Track
+from Cars.aicar import AICar
+from Cars.car_fleet import CarFleet
+from Controllers.GA_controller import GA_Controller
+from Controllers.DQL_controller import DQL_Controller, BATCH_SIZE
+from nn import NeuralNetwork
+from utils import doIntersect, findIntersectionPoint
+from benchmarks.tracks import ringTrackJSON
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRACK_PATH = os.path.join(REPO_ROOT, 'Track', 'defaultTrackCode.json')
+
+#============================================================================
+# Helpers
+
+def seedEverything(seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+def loadTrack(trackJSON):
+    track = Track()
+    track.load(trackJSON)
+    return track
+
+def timeCall(fn, repeat):
+    """Returns (median seconds per call, calls per repeat) of fn"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = timer.repeat(repeat=repeat, number=number)
+    return float(np.median(times)) / number, number
+
+def timeOnce(fn, repeat):
+    """For benchmarks too slow or stateful for autorange, times one call per repeat"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), 1
+
+def randomCars(track, numCars, seed=0):
+    """AICars scattered around the track's start with up to date hitboxes and sensors"""
+    rng = random.Random(seed)
+    cars = []
+    for _ in range(numCars):
+        car = AICar(track)
+        car.pos = [track.startPos[0] + rng.uniform(-40, 40), track.startPos[1] + rng.uniform(-40, 40)]
+        car.direction = track.startDir + rng.uniform(-0.5, 0.5)
+        car._updateHitboxPoints()
+        car._updateSensors()
+        cars.append(car)
+    return cars
+
+#============================================================================
+# Micro benchmarks
+
+def benchGeometry(repeat):
+    p1, q1, p2, q2 = (0, 0), (10, 10), (0, 10), (10, 0)
+    yield "utils.doIntersect", {}, timeCall(lambda: doIntersect(p1, q1, p2, q2), repeat)
+    yield "utils.findIntersectionPoint", {}, timeCall(lambda: findIntersectionPoint(p1, q1, p2, q2), repeat)
+
+def benchSensors(tracks, repeat):
+    for name, track in tracks:
+        car = randomCars(track, 1)[0]
+        params = {"track": name, "segments": len(track.getBoundarySegments())}
+
+        def sense():
+            car._observed = False # Cast every time rather than reading the observation cache
+            return car.getSensorData()
+
+        yield "AICar.getSensorData", params, timeCall(sense, repeat)
+
+def benchCrashTest(tracks, repeat):
+    for name, track in tracks:
+        cars = randomCars(track, 16)
+        params = {"track": name, "segments": len(track.getBoundarySegments())}
+        seconds, number = timeCall(lambda: [car._isCrashed() for car in cars], repeat)
+        yield "Car._isCrashed", params, (seconds / len(cars), number * len(cars))
+
+def benchForward(widths, repeat):
+    for width in widths:
+        network = NeuralNetwork([12, width, width, 9])
+        state = torch.rand(12)
+        with torch.no_grad():
+            yield "NeuralNetwork.forward", {"width": width}, timeCall(lambda: network(state), repeat)
+
+#============================================================================
+# End to end benchmarks
+
+def benchFleetStep(tracks, carCounts, repeat):
+    for name, track in tracks:
+        for num_cars in carCounts:
+            fleet = CarFleet(track, num_cars)
+            actions = np.zeros(num_cars, dtype=np.int64)
+
+            def step():
+                # Keep every car alive so each step does the same amount of work
+                fleet.reset()
+                fleet.step(actions)
+                fleet.getStates()
+
+            params = {"track": name, "segments": len(track.getBoundarySegments()), "cars": num_cars}
+            yield "CarFleet.step+getStates", params, timeCall(step, repeat)
+
+def benchGAGeneration(tracks, carCounts, repeat):
+    for name, track in tracks:
+        for num_cars in carCounts:
+            seedEverything()
+            controller = GA_Controller(track, brain_template=[32, 32], num_cars=num_cars)
+            controller.rng = np.random.default_rng(0)
+            controller.update() # Sets up the first generation
+
+            def generation():
+                current = controller.generation
+                while controller.generation == current:
+                    controller.update()
+
+            params = {"track": name, "segments": len(track.getBoundarySegments()), "cars": num_cars}
+            yield "GA generation", params, timeOnce(generation, repeat)
+
+def benchDQLTrain(tracks, widths, trainCalls, repeat):
+    for name, track in tracks:
+        for width in widths:
+            seedEverything()
+            controller = DQL_Controller(track, brain_template=[width, width])
+
+            # Fill memory with random experiences so training has something to sample
+            size = controller.env.observationSize
+            num = 4 * BATCH_SIZE
+            controller.memory.push(np.random.rand(num, size).astype(np.float32) * 800,
+                                   np.random.randint(0, controller.env.numActions, num),
+                                   np.random.rand(num, size).astype(np.float32) * 800,
+                                   np.random.randn(num),
+                                   np.random.rand(num) < 0.05)
+
+            def train():
+                for _ in range(trainCalls):
+                    controller._train()
+
+            params = {"track": name, "width": width, "trainCalls": trainCalls}
+            yield "DQL_Controller._train", params, timeOnce(train, repeat)
+
+#============================================================================
+# Running and comparing
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def runAll(quick):
+    repeat = 3 if quick else 5
+    segment_counts = [200, 2000] if quick else [200, 1000, 5000, 20000]
+    car_counts = [10, 40] if quick else [10, 40, 160, 640]
+    ga_car_counts = [20, 40] if quick else [20, 40, 160] # GA needs more cars than it carries over
+    widths = [32, 128] if quick else [32, 128, 512]
+
+    default_track = ("default", loadTrack(open(DEFAULT_TRACK_PATH, 'r').read()))
+    synthetic_tracks = [("ring" + str(n), loadTrack(ringTrackJSON(n))) for n in segment_counts]
+    all_tracks = [default_track] + synthetic_tracks
+
+    benchmarks = [
+        benchGeometry(repeat),
+        benchSensors(all_tracks, repeat),
+        benchCrashTest(all_tracks, repeat),
+        benchForward(widths, repeat),
+        benchFleetStep(all_tracks, car_counts, repeat),
+        benchGAGeneration([default_track, synthetic_tracks[-1]], ga_car_counts, repeat),
+        benchDQLTrain([default_track, synthetic_tracks[-1]], widths, 5 if quick else 20, repeat),
+    ]
+
+    results = []
+    for benchmark in benchmarks:
+        for name, params, (seconds, calls) in benchmark:
+            results.append({"name": name, "params": params, "seconds": seconds, "calls": calls})
+            print(formatResult(results[-1]))
+    return results
+
+def formatResult(result):
+    params = ", ".join(key + "=" + str(value) for key, value in result["params"].items())
+    return "{:<28} {:<50} {:>12.3f} us".format(result["name"], params, result["seconds"] * 1e6)
+
+def resultKey(result):
+    return (result["name"], json.dumps(result["params"], sort_keys=True))
+
+def compare(results, baselinePath):
+    baseline = json.loads(open(baselinePath, 'r').read())
+    baseline_seconds = {resultKey(result): result["seconds"] for result in baseline["results"]}
+    print("\nCompared to", baselinePath, "(" + str(baseline["meta"].get("commit")) + "), >1 is slower:")
+    for result in results:
+        old = baseline_seconds.get(resultKey(result))
+        if old:
+            print(formatResult(result), "  x{:.2f}".format(result["seconds"] / old))
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks")
+    parser.add_argument("--out", help="Path to save the results as JSON")
+    parser.add_argument("--compare", help="Path of earlier results to compare against")
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and smaller scaling curves")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1) # Keeps numbers comparable between machines
+    results = runAll(args.quick)
+
+    if args.out:
+        meta = {
+            "commit": gitCommit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "torch": torch.__version__,
+            "machine": platform.machine(),
+            "quick": args.quick,
+        }
+        with open(args.out, 'w') as f:
+            f.write(json.dumps({"meta": meta, "results": results}, indent=2))
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Sample efficiency of prioritized experience replay against uniform sampling
+
+Run from the repository root:
+
+    python -m benchmarks.sample_efficiency --trains 600 --seeds 3
+
+Trains DQL_Controller both ways with the same seeds and, every --eval-every train steps,
+scores the predicting network by driving a fleet of cars greedily (with a little noise so the
+cars don't all drive the same line). Prioritized replay is better when it reaches the same
+score in fewer train steps, which is what the summary reports.
+"""
+import argparse
+import json
+import numpy as np
+import torch
+from Cars.car_fleet import CarFleet
+from Controllers.DQL_controller import DQL_Controller
+from benchmarks.run import DEFAULT_TRACK_PATH, loadTrack, seedEverything
+
+EVAL_CARS = 16
+EVAL_EPSILON = 0.05 # Chance an evaluated car takes a random action
+EVAL_MAX_FRAMES = 2000
+
+def evaluate(controller, track, seed):
+    """Mean final score of EVAL_CARS cars driven by the controller's predicting network"""
+    rng = np.random.default_rng(seed)
+    fleet = CarFleet(track, EVAL_CARS)
+    frames = 0
+    while fleet.alive.any() and frames < EVAL_MAX_FRAMES:
+        states = torch.from_numpy(fleet.getStates()).to(controller.device)
+        with torch.no_grad():
+            actions = torch.argmax(controller.predicting_network(states), dim=1).cpu().numpy()
+        random_actions = rng.random(EVAL_CARS) < EVAL_EPSILON
+        actions[random_actions] = rng.integers(0, fleet.numActions, np.count_nonzero(random_actions))
+        fleet.step(actions)
+        frames += 1
+    return float(fleet.score.mean())
+
+def trainingCurve(track, prioritized, seed, trains, evalEvery, envs, width):
+    """Returns [(train steps, evaluation score)] of one training run"""
+    seedEverything(seed)
+    controller = DQL_Controller(track, [width, width], num_envs=envs, prioritizedReplay=prioritized)
+    controller.memory.rng = np.random.default_rng(seed)
+    curve = [(0, evaluate(controller, track, seed))]
+    while controller.train_steps < trains:
+        controller.update()
+        if controller.train_steps >= curve[-1][0] + evalEvery:
+            curve.append((controller.train_steps, evaluate(controller, track, seed)))
+    return curve
+
+def trainsToReach(curve, target):
+    """First train step count whose evaluation reaches target, None if it never does"""
+    for steps, score in curve:
+        if score >= target:
+            return steps
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Prioritized against uniform experience replay")
+    parser.add_argument("--trains", type=int, default=600, help="Train steps of each run")
+    parser.add_argument("--eval-every", type=int, default=50, help="Train steps between evaluations")
+    parser.add_argument("--seeds", type=int, default=3, help="Runs of each sampling mode")
+    parser.add_argument("--envs", type=int, default=32, help="Cars collecting experiences in parallel")
+    parser.add_argument("--width", type=int, default=128, help="Width of both hidden layers")
+    parser.add_argument("--out", help="Path to save every curve as JSON")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    track = loadTrack(open(DEFAULT_TRACK_PATH, 'r').read())
+    curves = {"uniform": [], "prioritized": []}
+    for seed in range(args.seeds):
+        for mode in curves:
+            curves[mode].append(trainingCurve(track, mode == "prioritized", seed, args.trains,
+                                              args.eval_every, args.envs, args.width))
+            print(mode, "seed", seed, " ".join("{}:{:.0f}".format(*point) for point in curves[mode][-1]))
+
+    # Target: the best score uniform sampling reaches on average, judged per seed
+    print("\n{:<12} {:>16} {:>22}".format("sampling", "final score", "trains to uniform best"))
+    uniform_best = [max(score for _, score in curve) for curve in curves["uniform"]]
+    for mode, runs in curves.items():
+        final = np.mean([curve[-1][1] for curve in runs])
+        reached = [trainsToReach(curve, target) for curve, target in zip(runs, uniform_best)]
+        reached = " ".join("-" if steps is None else str(steps) for steps in reached)
+        print("{:<12} {:>16.1f} {:>22}".format(mode, final, reached))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(json.dumps(curves, indent=2))
+
+if __name__ == '__main__':
+    main()
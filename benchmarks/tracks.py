@@ -0,0 +1,42 @@
+import json
+import math
+
+def ringTrackJSON(numSegments, numCheckpoints=12, center=(960, 470), outerRadius=(800, 420), innerRadius=(600, 250)):
+    """Builds a synthetic closed track made of two wobbly ellipses
+
+    Args:
+        numSegments: total number of boundary segments, split between the two boundaries
+        numCheckpoints: number of checkpoints spread evenly around the ring
+        center: center of the ring
+        outerRadius: (x radius, y radius) of the outer boundary
+        innerRadius: (x radius, y radius) of the inner boundary
+    Returns:
+        track JSON in the format of Track.save, can be given to Track.load
+    """
+    points_per_boundary = max(3, numSegments // 2)
+    cx, cy = center
+
+    def boundary(radius, phase):
+        points = []
+        for i in range(points_per_boundary):
+            theta = 2 * math.pi * i / points_per_boundary
+            wobble = 1 + 0.03 * math.sin(7 * theta + phase) # Keeps segments from being perfectly regular
+            points.append([cx + radius[0] * wobble * math.cos(theta), cy + radius[1] * wobble * math.sin(theta)])
+        return points
+
+    def radialLine(theta):
+        # Line across the ring at angle theta, slightly longer than the corridor
+        return [[cx + innerRadius[0] * 0.9 * math.cos(theta), cy + innerRadius[1] * 0.9 * math.sin(theta)],
+                [cx + outerRadius[0] * 1.1 * math.cos(theta), cy + outerRadius[1] * 1.1 * math.sin(theta)]]
+
+    # Cars start in the middle of the corridor on the right and drive clockwise (down the screen)
+    start_theta = 0
+    checkpoints = [radialLine(start_theta + 2 * math.pi * (i + 1) / (numCheckpoints + 1)) for i in range(numCheckpoints)]
+
+    return json.dumps({
+        "startPos": [cx + (outerRadius[0] + innerRadius[0]) / 2, cy],
+        "startDir": math.pi / 2,
+        "trackpoints": [boundary(outerRadius, 0), boundary(innerRadius, 1)],
+        "checkpoints": checkpoints,
+        "startLine": radialLine(start_theta - 0.05)
+    })
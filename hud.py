@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import pygame
+
+FONT_NAME = 'Comic Sans MS'
+FONT_SIZE = 10
+TEXT_COLOR = (0, 0, 0)
+POSITION = (20, 20) # Top left of the first line
+LINE_HEIGHT = 15
+CACHE_SIZE = 256 # Number of rendered lines of text kept around
+
+class HUD:
+    """Heads-up display of stats published by the main loop and the controllers
+
+    Anything can publish a stat at any time, publishing only stores the value so it costs
+    nothing when headless. Stats are drawn as "name: value" lines in the order they were
+    first published. Rendered lines are cached, so unchanged stats are never rendered twice.
+    """
+
+    def __init__(self):
+        self.stats = {} # Stat name to value, in the order they are drawn
+        self._font = None
+        self._textCache = OrderedDict() # Line of text to its rendered surface, least recently used first
+
+    def publish(self, name, value):
+        self.stats[name] = value
+
+    def clear(self):
+        self.stats = {}
+
+    def closeFont(self):
+        """Drops the font, it does not survive pygame.quit() and is loaded again when next needed"""
+        self._font = None
+
+    def draw(self, surface):
+        """Draws every stat, returns the list of rects drawn on"""
+        x, y = POSITION
+        rects = []
+        for name, value in self.stats.items():
+            rects.append(surface.blit(self._renderText(name + ": " + _format(value)), (x, y)))
+            y += LINE_HEIGHT
+        return rects
+
+    def _renderText(self, text):
+        if text in self._textCache:
+            self._textCache.move_to_end(text)
+            return self._textCache[text]
+
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+        rendered = self._font.render(text, False, TEXT_COLOR)
+
+        self._textCache[text] = rendered
+        if len(self._textCache) > CACHE_SIZE:
+            self._textCache.popitem(last=False)
+        return rendered
+
+def _format(value):
+    if isinstance(value, float):
+        return str(round(value, 3))
+    return str(value)
+
+
+# Shared by the whole simulation
+hud = HUD()
@@ -1,70 +1,212 @@
+import argparse
 import pygame
 from Track.track import Track
 from Controllers.GA_controller import GA_Controller
 from Controllers.user_controller import User_Controller
 from Controllers.DQL_controller import DQL_Controller
+from renderer import Renderer
+from profiling import profiler
+from hud import hud
 from time import perf_counter
 
 
 WIDTH = 1920
 HEIGHT = 1080
 
+TARGET_FPS = 60
+FIT_FRAME_BUDGET = 0 # Updates per frame value that runs as many updates as fit in a frame
+MAX_STEPS_PER_FRAME = 4096
+MAX_SIMULATION_TIME_PER_FRAME = 0.1 # Seconds, keeps the window responsive with many updates per frame
+
+PROFILE_HOTKEY_FRAMES = 300 # Frames captured with cProfile when P is pressed
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Self driving car simulation")
+    parser.add_argument("--controller", choices=["dql", "ga", "user"], default="dql",
+                        help="Which controller drives the cars")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the simulation without a display and without drawing anything")
+    parser.add_argument("--frames", type=int, default=0,
+                        help="Number of updates to run before stopping, 0 runs until closed")
+    parser.add_argument("--load", action="store_true",
+                        help="Load the previously saved model without asking")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the model when the simulation stops without asking")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="GA only: evaluate each generation across this many processes")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="GA only: checkpoint the whole population in the background every N generations")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="GA only: replace each car as soon as it dies instead of evolving in generations")
+    parser.add_argument("--envs", type=int, default=1,
+                        help="DQL only: number of cars collecting experiences in parallel")
+    parser.add_argument("--sensor-table", action="store_true",
+                        help="Answer sensor readings from a precomputed table, built once per track and cached on disk")
+    parser.add_argument("--distance-field", action="store_true",
+                        help="Skip exact crash tests for cars far from every wall using a baked distance field")
+    parser.add_argument("--steps-per-frame", type=int, default=1,
+                        help="Updates per rendered frame, 0 runs as many as fit in each frame (same as pressing 0)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each phase of every frame and print a summary when the simulation stops")
+    parser.add_argument("--profile-out",
+                        help="Also export the phase timings to this file, .csv for CSV and JSON otherwise")
+    parser.add_argument("--profile-frames", type=int, default=0,
+                        help="Capture a cProfile dump of the first N frames (press P to capture later ones)")
+    parser.add_argument("--profile-path",
+                        help="Where --profile-frames saves its cProfile dump, timestamped by default")
+    args = parser.parse_args()
+    if args.headless and args.controller == "user":
+        parser.error("the user controller needs a display")
+    return args
+
+def makeController(name, track, workers=0, envs=1, checkpointEvery=0, steadyState=False):
+    if name == "ga":
+        return GA_Controller(track, brain_template=[32, 32], num_cars=40, workers=workers,
+                             checkpointEvery=checkpointEvery, steadyState=steadyState)
+    if name == "user":
+        return User_Controller(track)
+    return DQL_Controller(track, brain_template=[128, 128], num_envs=envs)
+
+def confirm(question, flag, headless):
+    """Answers yes if the flag is set, otherwise asks unless running headless"""
+    if flag:
+        return True
+    if headless:
+        return False
+    return input(question + " (y/n): ") == "y"
+
 def main():
-    pygame.init()
+    args = parseArgs()
 
-    surface = pygame.display.set_mode((WIDTH, HEIGHT))
-    surface.set_alpha(None)
+    # Set up the track
+    track = Track()
+    defaultTrackCode = open('./Track/defaultTrackCode.json', 'r').read()
+    track.load(defaultTrackCode)
+    if args.sensor_table:
+        track.enableSensorTable()
+    if args.distance_field:
+        track.enableDistanceField()
+
+    # Initialize controller
+    controller = makeController(args.controller, track, args.workers, args.envs, args.checkpoint_every,
+                                args.steady_state)
+    canSave = type(controller) in (GA_Controller, DQL_Controller)
+
+    if canSave and confirm("Load previous best model?", args.load, args.headless):
+        controller.load()
+
+    if args.profile or args.profile_out:
+        profiler.enable()
+    if args.profile_frames > 0:
+        profiler.captureProfile(args.profile_frames, args.profile_path)
+
+    if args.headless:
+        runHeadless(controller, args.frames)
+    else:
+        runWindowed(track, controller, args.frames, args.steps_per_frame)
+    controller.close()
+
+    profiler.stopCapture()
+    if profiler.enabled:
+        print(profiler.report())
+        if args.profile_out:
+            profiler.export(args.profile_out)
+
+    if canSave and confirm("Save best model?", args.save, args.headless):
+        controller.save()
+
+def runHeadless(controller, frames):
+    """Steps the controller as fast as possible without ever touching the display"""
+    numframes = 0
+    start = perf_counter()
+    try:
+        while frames == 0 or numframes < frames:
+            with profiler.span("update"):
+                controller.update()
+            profiler.endFrame()
+            numframes += 1
+    except KeyboardInterrupt:
+        pass
+
+    totaltime = perf_counter() - start
+    print("Ran", numframes, "updates in", round(totaltime, 2), "seconds")
+
+def runSteps(controller, steps, deadline):
+    """Updates the controller up to steps times, stopping early once perf_counter() passes deadline
+
+    Always runs at least one update. Returns the number of updates run.
+    """
+    for step in range(steps):
+        controller.update()
+        if perf_counter() >= deadline:
+            return step + 1
+    return steps
+
+def speedLabel(stepsPerFrame):
+    return "max" if stepsPerFrame == FIT_FRAME_BUDGET else "x" + str(stepsPerFrame)
+
+def runWindowed(track, controller, frames, stepsPerFrame=1):
+    """Runs the simulation in a window, rendering once every stepsPerFrame updates
+
+    Keys: 0 runs as many updates per frame as fit in the frame budget, 9 goes back to
+    one update per frame, + and - double and halve the updates per frame.
+
+    Args:
+        frames: number of updates to run before stopping, 0 runs until closed
+        stepsPerFrame: updates per rendered frame, FIT_FRAME_BUDGET to fill each frame
+    """
+    renderer = Renderer(WIDTH, HEIGHT)
 
-    from Buttons.button_handler import handleButtons
     clock = pygame.time.Clock()
-    framerate_cap = 60
     running = True
     numframes = 0
+    numsteps = 0
+    totalsteps = 0
     totaltime = 0
     fps = 0
+    steps_per_second = 0
+    render_time = 0 # Time the last render took, what is left of the frame goes to the simulation
+    last_refresh = perf_counter()
 
-    # Set up the track
-    track = Track()
-    defaultTrackCode = open('./Track/defaultTrackCode.json', 'r').read()
-    track.load(defaultTrackCode)
-
-    # Initialize controller
-    # controller = GA_Controller(track, surface, brain_template=[32, 32], num_cars=40)
-    # controller =  User_Controller(track, surface)
-    controller = DQL_Controller(track, surface, brain_template=[128, 128])
-
-    if type(controller) == GA_Controller:
-        load = input("Load previous best model? (y/n): ")
-        if load == "y":
-            controller.load()
-    if type(controller) == DQL_Controller:
-        load = input("Load previous best model? (y/n): ")
-        if load == "y":
-            controller.load()
+    # Shown first on the HUD
+    hud.publish("FPS", fps)
+    hud.publish("Updates/s", steps_per_second)
+    hud.publish("Speed", speedLabel(stepsPerFrame))
 
     while running:
-        surface.fill("grey")
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                if type(controller) == GA_Controller:
-                    save = input("Save best model? (y/n): ")
-                    if save == "y":
-                        controller.save()
-                if type(controller) == DQL_Controller:
-                    save = input("Save best model? (y/n): ")
-                    if save == "y":
-                        controller.save()
                 running = False
-
-        # Render and update
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_p:
+                    profiler.captureProfile(PROFILE_HOTKEY_FRAMES)
+                # Press 0 for hyperspeed, 9 to go back to one update per frame
+                elif event.key == pygame.K_0:
+                    stepsPerFrame = FIT_FRAME_BUDGET
+                elif event.key == pygame.K_9:
+                    stepsPerFrame = 1
+                elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    stepsPerFrame = min(max(stepsPerFrame, 1) * 2, MAX_STEPS_PER_FRAME)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    stepsPerFrame = max(stepsPerFrame // 2, 1)
+
+        # Update as many times as asked, but never for so long that the window stops responding
         start = perf_counter()
-
-        track.render(surface)
-        controller.update()
-
-        # Button handler
-        handleButtons(surface, track)
-
+        if stepsPerFrame == FIT_FRAME_BUDGET:
+            steps = MAX_STEPS_PER_FRAME
+            deadline = start + max(1 / TARGET_FPS - render_time, 0)
+        else:
+            steps = stepsPerFrame
+            deadline = start + MAX_SIMULATION_TIME_PER_FRAME
+        if frames != 0:
+            steps = min(steps, frames - totalsteps)
+
+        with profiler.span("update"):
+            steps_run = runSteps(controller, steps, deadline)
+        with profiler.span("render"):
+            render_start = perf_counter()
+            renderer.render(track, controller)
+            render_time = perf_counter() - render_start
 
         # Track editing handler
         # if track.isEditingStartLine:
@@ -75,43 +217,31 @@ def main():
         #     track.addBoundary()
         # if track.isEditingStartPos:
         #     track.editStartPos()
-  
 
-        # Display FPS
-        end = perf_counter()
-        totaltime += end - start
-        numframes += 1   
+        # Fast-forward fills the whole frame with updates, so there is no need to cap it higher
+        clock.tick(TARGET_FPS)
+        profiler.endFrame()
+
+        # Compute FPS and updates per second
+        numframes += 1
+        numsteps += steps_run
+        totalsteps += steps_run
+        if frames != 0 and totalsteps >= frames:
+            running = False
 
+        now = perf_counter()
+        totaltime = now - last_refresh
         if totaltime >= 0.25: # Time to refresh fps
-            fps = int(numframes / totaltime) if totaltime > 0 else 0
+            fps = int(numframes / totaltime)
+            steps_per_second = int(numsteps / totaltime)
             numframes = 0
-            totaltime = 0
-
-        pygame.font.init()
-        font = pygame.font.SysFont('Comic Sans MS', 10)
-        fps_surface = font.render("FPS: " + str(fps), False, (0, 0, 0))
-        surface.blit(fps_surface, (20,20))
-
-        # flip() the display to put on screen
-        pygame.display.flip()
-
-        actual_end = perf_counter()
-        totaltime += actual_end - end
-        
-        # limits FPS to 60
-        # dt is delta time in seconds since last frame, used for framerate-
-        # independent physics.
-
-        # Press 0 for hyperspeed, 9 to go back to 60 fps
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_0]:
-            framerate_cap = 1000
-        if keys[pygame.K_9]:
-            framerate_cap = 60
-
-        dt = clock.tick(framerate_cap) / 1000
+            numsteps = 0
+            last_refresh = now
+            hud.publish("FPS", fps)
+            hud.publish("Updates/s", steps_per_second)
+        hud.publish("Speed", speedLabel(stepsPerFrame))
 
-    pygame.quit()
+    renderer.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
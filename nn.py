@@ -1,6 +1,8 @@
+import math
 import numpy as np
 import torch
 import torch.nn as nn
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
 
 class NeuralNetwork(nn.Module):
     def __init__(self, dimensions):
@@ -22,4 +24,97 @@ class NeuralNetwork(nn.Module):
         self.network = nn.Sequential(*layers)
     
     def forward(self, x):
-        return self.network(x)
\ No newline at end of file
+        return self.network(x)
+
+#============================================================================
+# Flat parameters
+#
+# A brain's parameters can be flattened into a single vector in the order of parameters():
+# the weight (out, in) then the bias (out,) of each layer. A population of brains is then a
+# (P, numParameters) tensor that can be bred with batched tensor ops, see GA_Controller.
+
+def parameterShapes(dimensions):
+    """Shapes of the parameters of a NeuralNetwork(dimensions), in the order they are flattened"""
+    shapes = []
+    for i in range(len(dimensions) - 1):
+        shapes += [(dimensions[i + 1], dimensions[i]), (dimensions[i + 1],)]
+    return shapes
+
+def numParameters(dimensions):
+    return sum(math.prod(shape) for shape in parameterShapes(dimensions))
+
+def flattenBrain(brain):
+    """Returns a copy of the brain's parameters as a vector of shape (numParameters,)"""
+    with torch.no_grad():
+        return parameters_to_vector(brain.parameters()).clone()
+
+def brainFromParameters(dimensions, parameters):
+    """Materializes a NeuralNetwork from a vector of flat parameters"""
+    brain = NeuralNetwork(dimensions)
+    with torch.no_grad():
+        vector_to_parameters(parameters.to(torch.float32), brain.parameters())
+    return brain
+
+def randomParameters(dimensions, count, generator=None):
+    """Returns (count, numParameters) freshly initialized flat parameters
+
+    Same distribution as the default initialization of NeuralNetwork's layers (nn.Linear):
+    every weight and bias of a layer with fan_in inputs is uniform in +-1 / sqrt(fan_in).
+    """
+    bounds = torch.cat([torch.full((math.prod(shape),), 1 / math.sqrt(dimensions[i // 2]))
+                        for i, shape in enumerate(parameterShapes(dimensions))])
+    return (torch.rand((count, len(bounds)), generator=generator) * 2 - 1) * bounds
+
+class StackedNetworks:
+    def __init__(self, weights, biases):
+        """Runs a population of NeuralNetworks with the same dimensions as one batched network
+
+        Build one with fromParameters rather than directly.
+
+        Args:
+            weights: weights[k] has shape (P, in, out) for layer k
+            biases: biases[k] has shape (P, 1, out) for layer k
+        """
+        self.weights = weights
+        self.biases = biases
+
+    @classmethod
+    def fromParameters(cls, dimensions, parameters):
+        """Runs a population of flat parameters, see flattenBrain
+
+        The weights are views into parameters rather than copies, so changing parameters in
+        place changes the networks too.
+
+        Args:
+            dimensions: dimensions of every brain, see NeuralNetwork
+            parameters: tensor of shape (P, numParameters(dimensions))
+        """
+        weights = []
+        biases = []
+        offset = 0
+        for out_size, in_size in parameterShapes(dimensions)[0::2]:
+            layer_weights = parameters[:, offset:offset + out_size * in_size]
+            offset += out_size * in_size
+            weights.append(layer_weights.view(-1, out_size, in_size).transpose(1, 2))
+            biases.append(parameters[:, offset:offset + out_size].unsqueeze(1))
+            offset += out_size
+        return cls(weights, biases)
+
+    def forward(self, x):
+        """Evaluates brain i on row i of x, for every brain at once
+
+        Args:
+            x: tensor of shape (P, input size)
+        Returns:
+            tensor of shape (P, output size)
+        """
+        with torch.no_grad():
+            x = x.unsqueeze(1)
+            for k in range(len(self.weights)):
+                x = torch.baddbmm(self.biases[k], x, self.weights[k])
+                if k < len(self.weights) - 1: # No activation function on the output layer
+                    x = torch.relu(x)
+            return x.squeeze(1)
+
+    def __call__(self, x):
+        return self.forward(x)
@@ -0,0 +1,207 @@
+"""Lightweight per-phase timing of the simulation
+
+Code marks the phases it wants timed with named spans:
+
+    from profiling import profiler
+
+    with profiler.span("fleet.sensors"):
+        ...
+
+Time spent in each span is summed per frame and the last HISTORY_FRAMES frame totals are
+kept per span, so the summary and exports always describe recent behaviour. The main loop
+calls profiler.endFrame() once per frame to close the frame.
+
+Spans cost a single attribute check while the profiler is disabled (the default). Capturing
+a cProfile dump of the next N frames works whether spans are enabled or not.
+"""
+import cProfile
+import csv
+import json
+import time
+import numpy as np
+
+HISTORY_FRAMES = 600 # Number of recent frames each span keeps, 10 seconds at 60 fps
+HISTOGRAM_BINS = 20
+
+class _NullSpan:
+    """Span handed out while the profiler is disabled, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class RollingHistogram:
+    """Keeps the last `size` samples of a value in a ring buffer"""
+
+    def __init__(self, size=HISTORY_FRAMES):
+        self.samples = np.zeros(size)
+        self.cursor = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.cursor] = value
+        self.cursor = (self.cursor + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+
+    def values(self):
+        return self.samples[:self.count]
+
+    def summary(self):
+        """Returns mean, percentiles and max of the kept samples in milliseconds"""
+        values = self.values() * 1000
+        if len(values) == 0:
+            return {"frames": 0, "mean_ms": 0, "p50_ms": 0, "p95_ms": 0, "p99_ms": 0, "max_ms": 0}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            "frames": int(len(values)),
+            "mean_ms": float(values.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(values.max()),
+        }
+
+    def histogram(self, bins=HISTOGRAM_BINS):
+        """Returns (counts, bin edges in milliseconds) of the kept samples"""
+        counts, edges = np.histogram(self.values() * 1000, bins=bins)
+        return counts.tolist(), edges.tolist()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {} # Span name to RollingHistogram of its time per frame
+        self._frameTotals = {} # Span name to time spent in it so far this frame
+        self._frameStart = time.perf_counter()
+
+        # cProfile capture
+        self._capture = None
+        self._captureFrames = 0
+        self._capturePath = None
+
+    def enable(self):
+        self.enabled = True
+        self._frameStart = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+        self._frameTotals = {}
+
+    def span(self, name):
+        """Context manager timing the code inside it under the given name"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        self._frameTotals[name] = self._frameTotals.get(name, 0) + seconds
+
+    def endFrame(self):
+        """Closes the current frame, call once per frame from the main loop"""
+        if self.enabled:
+            now = time.perf_counter()
+            self.record("frame", now - self._frameStart)
+            self._frameStart = now
+
+            for name, seconds in self._frameTotals.items():
+                if name not in self.histograms:
+                    self.histograms[name] = RollingHistogram()
+                self.histograms[name].add(seconds)
+            self._frameTotals = {}
+
+        if self._capture is not None:
+            self._captureFrames -= 1
+            if self._captureFrames <= 0:
+                self._finishCapture()
+
+    def reset(self):
+        self.histograms = {}
+        self._frameTotals = {}
+
+    #============================================================================
+    # cProfile capture
+
+    def captureProfile(self, frames, path=None):
+        """Runs cProfile over the next `frames` frames and dumps the stats to path
+
+        The dump can be read with `python -m pstats <path>` or snakeviz.
+        Does nothing if a capture is already running.
+        """
+        if self._capture is not None:
+            return
+        self._capturePath = path or time.strftime("profile_%Y%m%d_%H%M%S.prof")
+        self._captureFrames = frames
+        self._capture = cProfile.Profile()
+        self._capture.enable()
+        print("Profiling the next", frames, "frames")
+
+    def isCapturing(self):
+        return self._capture is not None
+
+    def stopCapture(self):
+        """Ends a running capture early and dumps what was captured"""
+        if self._capture is not None:
+            self._finishCapture()
+
+    def _finishCapture(self):
+        self._capture.disable()
+        self._capture.dump_stats(self._capturePath)
+        print("Saved profile to", self._capturePath)
+        self._capture = None
+
+    #============================================================================
+    # Reporting
+
+    def summary(self):
+        """Returns {span name: summary dict} sorted by mean time per frame, slowest first"""
+        summaries = {name: histogram.summary() for name, histogram in self.histograms.items()}
+        return dict(sorted(summaries.items(), key=lambda item: -item[1]["mean_ms"]))
+
+    def report(self):
+        """Returns the summary as a printable table"""
+        lines = ["{:<24} {:>7} {:>9} {:>9} {:>9} {:>9}".format("span", "frames", "mean ms", "p50 ms", "p95 ms", "max ms")]
+        for name, s in self.summary().items():
+            lines.append("{:<24} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                name, s["frames"], s["mean_ms"], s["p50_ms"], s["p95_ms"], s["max_ms"]))
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Writes the summary to path, as CSV if it ends in .csv and as JSON otherwise
+
+        The JSON version also holds each span's histogram.
+        """
+        summary = self.summary()
+        if path.endswith(".csv"):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["span", "frames", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+                for name, s in summary.items():
+                    writer.writerow([name, s["frames"], s["mean_ms"], s["p50_ms"], s["p95_ms"], s["p99_ms"], s["max_ms"]])
+        else:
+            for name in summary:
+                counts, edges = self.histograms[name].histogram()
+                summary[name]["histogram"] = {"counts": counts, "edges_ms": edges}
+            with open(path, 'w') as f:
+                f.write(json.dumps(summary, indent=2))
+
+
+# Shared by the whole simulation
+profiler = Profiler()
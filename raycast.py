@@ -0,0 +1,119 @@
+import numpy as np
+from vec_utils import segmentsIntersect, findIntersectionPoints
+
+# Batched raycasting against track boundaries.
+#
+# A ray is a row (x1, y1, x2, y2) where (x1, y1) is the origin and (x2, y2) is the furthest
+# point the ray can see. A segment is a row (x1, y1, x2, y2) of a track boundary.
+#
+# The math is vec_utils.segmentsIntersect + vec_utils.findIntersectionPoints, which mirror
+# utils.doIntersect + utils.findIntersectionPoint, so the batched results match a scalar loop
+# over every segment: a segment is a hit if doIntersect is true and the lines are not parallel
+# (parallel lines give (10**9, 10**9) in the scalar version, which can never beat the sensor range).
+
+MAX_PAIRS_PER_CHUNK = 1 << 20 # Upper bound on rays * segments evaluated at once, keeps memory in check
+
+def boundarySegments(trackpoints):
+    """Flattens track boundaries into an (S, 4) array of segments
+
+    Segments are ordered the same way Car._isCrashed walks them, i.e. for every boundary
+    (b[-1], b[0]), (b[0], b[1]), ..., (b[n - 2], b[n - 1])
+
+    Args:
+        trackpoints: array of arrays of points, see Track.trackpoints
+    Returns:
+        segments: float array of shape (S, 4)
+    """
+    segments = []
+    for boundary in trackpoints:
+        if len(boundary) == 0:
+            continue
+        points = np.asarray(boundary, dtype=np.float64).reshape(-1, 2)
+        segments.append(np.hstack((np.roll(points, 1, axis=0), points)))
+    if len(segments) == 0:
+        return np.empty((0, 4))
+    return np.vstack(segments)
+
+def drivableGrid(xs, ys, segments):
+    """Finds which points of a grid are drivable
+
+    Even-odd rule: a point is drivable if it lies inside an odd number of track boundaries, i.e.
+    a ray going right from it crosses an odd number of segments. With an outer and an inner
+    boundary this is everything between the two.
+
+    Args:
+        xs: sorted x coordinates of the grid's columns, shape (C,)
+        ys: sorted y coordinates of the grid's rows, shape (R,)
+        segments: float array of shape (S, 4), see boundarySegments
+    Returns:
+        bool array of shape (R, C)
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    x1, y1, x2, y2 = segments.T
+
+    # Rows whose y is in [min(y1, y2), max(y1, y2)) are the ones a segment crosses
+    first_row = np.searchsorted(ys, np.minimum(y1, y2), side='left')
+    end_row = np.searchsorted(ys, np.maximum(y1, y2), side='left')
+    counts = end_row - first_row
+    segment = np.repeat(np.arange(len(segments)), counts)
+    row = np.repeat(first_row, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Each crossing flips every point of its row to the left of it
+    crossing_x = x1[segment] + (ys[row] - y1[segment]) * (x2[segment] - x1[segment]) / (y2[segment] - y1[segment])
+    flips = np.zeros((len(ys), len(xs) + 1), dtype=np.int64)
+    np.add.at(flips, (row, 0), 1)
+    np.add.at(flips, (row, np.searchsorted(xs, crossing_x, side='left')), -1)
+    return np.cumsum(flips[:, :-1], axis=1) % 2 == 1
+
+def _castChunk(rays, segments):
+    """Intersects every ray with every segment
+
+    Returns:
+        (distances, xs, ys) each of shape (R, S), distance is inf where there is no hit
+    """
+    rays = rays[:, None, :]
+    hit = segmentsIntersect(rays, segments[None, :, :])
+    points, parallel = findIntersectionPoints(rays, segments[None, :, :])
+    hit &= ~parallel
+
+    xs, ys = points[..., 0], points[..., 1]
+    distances = np.sqrt((rays[..., 0] - xs)**2 + (rays[..., 1] - ys)**2)
+    distances[~hit] = np.inf
+    return distances, xs, ys
+
+def castRays(rays, segments):
+    """Finds the closest boundary hit along every ray in one batched pass
+
+    Args:
+        rays: array-like of shape (R, 4) or a list of sensors ((p1x, p1y), (p2x, p2y))
+        segments: float array of shape (S, 4), see boundarySegments
+    Returns:
+        (distances, points) where distances has shape (R,) and points has shape (R, 2).
+        Each distance is min(length of ray, distance to closest hit) and each point is the
+        closest hit or the end of the ray if nothing was hit
+    """
+    rays = np.asarray(rays, dtype=np.float64).reshape(-1, 4)
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+
+    # By default, a ray 'detects' its own end point
+    distances = np.sqrt((rays[:, 0] - rays[:, 2])**2 + (rays[:, 1] - rays[:, 3])**2)
+    points = rays[:, 2:4].copy()
+    if len(rays) == 0 or len(segments) == 0:
+        return distances, points
+
+    rows = np.arange(len(rays))
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // len(rays))
+    for start in range(0, len(segments), chunk):
+        chunk_distances, xs, ys = _castChunk(rays, segments[start:start + chunk])
+        best = np.argmin(chunk_distances, axis=1)
+        best_distances = chunk_distances[rows, best]
+
+        # Strictly closer only, so earlier segments win ties just like the scalar loop
+        closer = best_distances < distances
+        distances[closer] = best_distances[closer]
+        points[closer, 0] = xs[rows, best][closer]
+        points[closer, 1] = ys[rows, best][closer]
+
+    return distances, points
@@ -0,0 +1,65 @@
+import pygame
+from profiling import profiler
+from hud import hud
+
+class Renderer:
+    """Draws the simulation to a window
+
+    Rendering is an observer of the main loop: controllers and the track never draw during
+    their updates, so a loop without a Renderer attached runs fully headless.
+
+    Only the parts of the screen that changed are redrawn and pushed to the display: everything
+    drawn last frame is covered with the track's cached background, then everything is drawn
+    again and both sets of rects are updated.
+    """
+
+    def __init__(self, width, height, dirtyRects=True):
+        """
+        Args:
+            dirtyRects: only update the changed parts of the screen, False redraws and flips the
+                        whole screen every frame
+        """
+        pygame.init()
+        self.surface = pygame.display.set_mode((width, height))
+        self.surface.set_alpha(None)
+        self.dirtyRects = dirtyRects
+        self._drawnRects = None # Rects drawn over the background last frame, None redraws everything
+
+    def render(self, track, controller):
+        """Draws one frame and puts it on screen
+
+        Args:
+            track: the track being driven, also handles track editing input
+            controller: the controller whose cars should be drawn
+        """
+        # Imported here as buttons need a display to load their images
+        from Buttons.button_handler import handleButtons
+
+        # The track draws the background as well
+        with profiler.span("track.render"):
+            restored = track.render(self.surface, self._drawnRects if self.dirtyRects else None)
+        with profiler.span("controller.render"):
+            controller_rects = controller.render(self.surface)
+
+        # Button handler
+        with profiler.span("buttons"):
+            button_rects = handleButtons(self.surface, track)
+
+        # Display FPS and everything else published to the HUD
+        with profiler.span("hud"):
+            hud_rects = hud.draw(self.surface)
+
+        # Put the changed parts of the frame on screen
+        with profiler.span("display.flip"):
+            if controller_rects is None:
+                # The controller can't tell what it drew, so everything has to be redrawn next frame
+                self._drawnRects = None
+                pygame.display.flip()
+            else:
+                self._drawnRects = controller_rects + button_rects + hud_rects
+                pygame.display.update(restored + self._drawnRects)
+
+    def close(self):
+        """Closes the window, a new Renderer can open another one afterwards"""
+        hud.closeFont()
+        pygame.quit()
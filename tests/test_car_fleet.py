@@ -0,0 +1,42 @@
+import random
+import numpy as np
+from Track.track import Track
+from Cars.aicar import AICar
+from Cars.car_fleet import CarFleet
+
+NUM_CARS = 30
+
+def loadDefaultTrack():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    return track
+
+def test_fleet_matches_aicars():
+    track = loadDefaultTrack()
+    cars = [AICar(track) for _ in range(NUM_CARS)]
+    for car in cars:
+        car.update()
+    fleet = CarFleet(track, NUM_CARS)
+    fleet.step(np.full(NUM_CARS, -1))
+
+    rng = random.Random(1)
+    for _ in range(400):
+        # Mostly forward so cars get far enough to pass checkpoints and crash into walls
+        actions = [rng.choice([0, 0, 0, 4, 5, 1, 3, 2, 6, 7, 8]) for _ in range(NUM_CARS)]
+        for car, action in zip(cars, actions):
+            car.update(action=action)
+        fleet.step(np.array(actions))
+
+        assert fleet.alive.tolist() == [car.alive for car in cars]
+        assert fleet.checkpointsPassed.tolist() == [car.checkpointsPassed for car in cars]
+        assert np.allclose(fleet.score, [car.score for car in cars])
+        assert np.allclose(fleet.pos, [car.pos for car in cars])
+        assert np.allclose(fleet.direction, [car.direction for car in cars])
+        states = fleet.getStates()
+        for i, car in enumerate(cars):
+            if car.alive:
+                assert np.allclose(states[i], car.getState(), atol=1e-3)
+
+    # The run covered crashes and checkpoints, not just cars idling at the start
+    assert not fleet.alive.all()
+    assert fleet.checkpointsPassed.max() > 0
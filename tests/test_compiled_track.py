@@ -0,0 +1,89 @@
+import json
+import math
+import os
+import numpy as np
+import pytest
+from Track import track as track_module
+from Track import compiled_track
+from Track.track import Track
+
+DEFAULT_JSON = open('./Track/defaultTrackCode.json', 'r').read()
+
+@pytest.fixture
+def cacheDirectory(tmp_path, monkeypatch):
+    """Caches into tmp_path, and caches every track however small"""
+    monkeypatch.setattr(track_module, "cachePath", lambda saveJSON: compiled_track.cachePath(saveJSON, str(tmp_path)))
+    monkeypatch.setattr(track_module, "CACHE_MIN_SEGMENTS", 0)
+    return tmp_path
+
+def circleTrackJSON(points):
+    """Two concentric circles with float coordinates"""
+    angles = 2 * math.pi * np.arange(points) / points
+    circle = lambda radius: [(500 + radius * math.cos(a), 500 + radius * math.sin(a)) for a in angles]
+    return json.dumps({
+        "startPos": (700.0, 500.0),
+        "startDir": 1.5,
+        "trackpoints": [circle(300), circle(100)],
+        "checkpoints": [[(500.0, 700.0), (500.0, 900.0)]],
+        "startLine": [(600.0, 500.0), (800.0, 500.0)],
+    })
+
+def load(saveJSON, useCache=True):
+    track = Track()
+    track.load(saveJSON, useCache)
+    return track
+
+def assertSameTrack(track, expected):
+    assert track.toJSON() == expected.toJSON()
+    for name in compiled_track.ARRAY_NAMES + ["checkpoints", "startLine"]:
+        assert np.array_equal(getattr(track.getCompiled(), name), getattr(expected.getCompiled(), name))
+
+@pytest.mark.parametrize("saveJSON", [DEFAULT_JSON, circleTrackJSON(1500)])
+def test_cached_load_matches_parsing(cacheDirectory, saveJSON):
+    load(saveJSON) # Parses and caches
+    cached = load(saveJSON)
+
+    assert cached._trackpoints is None # Memory-mapped, nothing was parsed
+    assertSameTrack(cached, load(saveJSON, useCache=False))
+
+def test_large_tracks_are_cached_without_patching(tmp_path, monkeypatch):
+    monkeypatch.setattr(track_module, "cachePath", lambda saveJSON: compiled_track.cachePath(saveJSON, str(tmp_path)))
+    saveJSON = circleTrackJSON(compiled_track.CACHE_MIN_SEGMENTS // 2)
+    load(saveJSON)
+    load(DEFAULT_JSON)
+
+    assert compiled_track.isCached(compiled_track.cachePath(saveJSON, str(tmp_path)))
+    assert not compiled_track.isCached(compiled_track.cachePath(DEFAULT_JSON, str(tmp_path)))
+
+def test_other_format_versions_are_misses(cacheDirectory):
+    load(DEFAULT_JSON)
+    path = compiled_track.cachePath(DEFAULT_JSON, str(cacheDirectory))
+    header_path = os.path.join(path, "header.json")
+    header = json.loads(open(header_path, "r").read())
+    with open(header_path, "w") as f:
+        f.write(json.dumps({**header, "version": compiled_track.FORMAT_VERSION - 1}))
+    np.save(os.path.join(path, "segments.npy"), np.zeros((3, 4))) # What an old format might hold
+
+    assert not compiled_track.isCached(path)
+    track = load(DEFAULT_JSON)
+    assert track._trackpoints is not None # Parsed
+    assertSameTrack(track, load(DEFAULT_JSON, useCache=False))
+    assert compiled_track.isCached(path) # Replaced by a cache in the current format
+
+def test_incomplete_caches_are_misses(cacheDirectory):
+    load(DEFAULT_JSON)
+    os.remove(os.path.join(compiled_track.cachePath(DEFAULT_JSON, str(cacheDirectory)), "segmentBoxes.npy"))
+
+    assertSameTrack(load(DEFAULT_JSON), load(DEFAULT_JSON, useCache=False))
+
+def test_edits_drop_the_cached_geometry(cacheDirectory):
+    load(DEFAULT_JSON)
+    track = load(DEFAULT_JSON)
+    track.clearCheckpoints()
+    assert len(track.getCompiled().checkpoints) == 0
+    track.clearBoundaries()
+    assert len(track.getBoundarySegments()) == 0
+
+    # The edited track is a different JSON, it never loads the original's cache
+    editedJSON = track.toJSON()
+    assertSameTrack(load(editedJSON), load(editedJSON, useCache=False))
@@ -0,0 +1,71 @@
+import math
+import numpy as np
+from raycast import drivableGrid
+from Track.track import Track
+from Track.distance_field import DistanceField
+from Cars.car import Car
+from Cars.car_fleet import CarFleet
+
+NUM_POSES = 5000
+
+def loadDefaultTrack():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    return track
+
+def randomPoses(track, count, seed):
+    """Random positions over the whole track, many of them touching or across a wall"""
+    rng = np.random.default_rng(seed)
+    points = track.getBoundarySegments().reshape(-1, 2)
+    low, high = points.min(axis=0) - 20, points.max(axis=0) + 20
+    return low + rng.random((count, 2)) * (high - low), rng.random(count) * 2 * math.pi
+
+def distanceToSegments(points, segments):
+    """Exact distance from each of the (N, 2) points to the closest segment"""
+    starts, ends = segments[:, 0:2], segments[:, 2:4]
+    along = ends - starts
+    t = np.einsum('nsk,sk->ns', points[:, None] - starts, along) / np.maximum((along**2).sum(axis=1), 1e-12)
+    closest = starts + np.clip(t, 0, 1)[..., None] * along
+    return np.hypot(*(points[:, None] - closest).transpose(2, 0, 1)).min(axis=1)
+
+def test_clear_points_are_far_from_every_wall():
+    segments = loadDefaultTrack().getBoundarySegments()
+    field = DistanceField.build(segments)
+    points, _ = randomPoses(loadDefaultTrack(), 20000, 0)
+    radius = 7.5
+    clear = field.isClear(points[:, None], radius)
+
+    assert clear.any() and not clear.all()
+    assert (distanceToSegments(points[clear], segments) > radius).all()
+    for x, y in points[clear]:
+        assert drivableGrid(np.array([x]), np.array([y]), segments)[0, 0]
+
+def test_fleet_never_reports_a_crashed_car_clear():
+    exact_track = loadDefaultTrack()
+    field_track = loadDefaultTrack()
+    field_track.enableDistanceField()
+    exact = CarFleet(exact_track, NUM_POSES)
+    fast = CarFleet(field_track, NUM_POSES)
+    everyone = np.arange(NUM_POSES)
+    for fleet in (exact, fast):
+        fleet.pos[:], fleet.direction[:] = randomPoses(exact_track, NUM_POSES, 1)
+        fleet._updateHitboxPoints(everyone)
+
+    crashed = exact._isCrashed(everyone)
+    assert crashed.any() and not crashed.all()
+    assert np.array_equal(fast._isCrashed(everyone), crashed)
+
+def test_car_never_reports_a_crashed_car_clear():
+    exact_track = loadDefaultTrack()
+    field_track = loadDefaultTrack()
+    field_track.enableDistanceField()
+    exact = Car(exact_track)
+    fast = Car(field_track)
+
+    positions, directions = randomPoses(exact_track, NUM_POSES, 2)
+    for position, direction in zip(positions.tolist(), directions.tolist()):
+        for car in (exact, fast):
+            car.pos = position
+            car.direction = direction
+            car._updateHitboxPoints()
+        assert fast._isCrashed() == exact._isCrashed()
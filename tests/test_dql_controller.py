@@ -0,0 +1,20 @@
+import pytest
+from Track.track import Track
+from Controllers import DQL_controller
+from Controllers.DQL_controller import DQL_Controller, STEPS_BETWEEN_TRAIN
+
+@pytest.mark.parametrize("num_envs", [1, 4, 16, 64])
+def test_trains_once_every_steps_between_train_experiences(monkeypatch, num_envs):
+    monkeypatch.setattr(DQL_controller, "MIN_REPLAY_SIZE", 0)
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    controller = DQL_Controller(track, [8], num_envs=num_envs)
+    trains = []
+    monkeypatch.setattr(controller, "_train", lambda: trains.append(controller.total_experiences))
+
+    num_experiences = 6000
+    for _ in range(num_experiences // num_envs):
+        controller.update()
+    # Cars keep dying along the way, which hard updates the optimizing network
+    assert controller.generation > 1
+    assert len(trains) == (num_experiences // num_envs * num_envs) // STEPS_BETWEEN_TRAIN
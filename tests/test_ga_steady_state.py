@@ -0,0 +1,39 @@
+import threading
+from multiprocessing.pool import ThreadPool
+from Track.track import Track
+from Controllers import GA_controller
+from Controllers.GA_controller import GA_Controller
+
+def test_slow_chunk_does_not_hold_up_the_others(monkeypatch):
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+
+    def evaluateCars(task):
+        _, genomes, _ = task
+        with lock:
+            started.append(len(genomes))
+            first = len(started) == 1
+        if first:
+            release.wait(10) # The first chunk submitted is stuck until the end of the test
+        return [1.0] * len(genomes)
+    monkeypatch.setattr(GA_controller, "_evaluateCars", evaluateCars)
+
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    controller = GA_Controller(track, [4], num_cars=20, workers=2, steadyState=True)
+    # Threads instead of processes so the patched evaluation is used, already built for this track
+    controller.pool = ThreadPool(2)
+    controller._poolTrackVersion = track.version
+    try:
+        for _ in range(20):
+            controller.update()
+        births = (controller.generation - 1) * controller.num_cars + controller.births
+
+        # The other chunks were archived, replaced and resubmitted many times over meanwhile
+        assert not release.is_set()
+        assert 0 in controller._inFlight
+        assert births > controller.num_cars
+    finally:
+        release.set()
+        controller.close()
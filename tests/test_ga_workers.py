@@ -0,0 +1,25 @@
+import numpy as np
+import torch
+from Track.track import Track
+from Controllers import GA_controller
+from nn import randomParameters
+
+def test_workers_sense_like_the_parent_track(tmp_path, monkeypatch):
+    trackJSON = open('./Track/defaultTrackCode.json', 'r').read()
+    track = Track()
+    track.load(trackJSON)
+    track.enableSensorTable(cellSize=40, numAngles=16, cacheDirectory=str(tmp_path)) # Coarse, quick to build
+    track.enableDistanceField()
+
+    GA_controller._initWorker(trackJSON, track.getSensingOptions())
+    worker_track = GA_controller._workerTrack
+    assert worker_track.getSensingOptions() == track.getSensingOptions()
+    assert worker_track.sensorTable is not None and worker_track.getDistanceField() is not None
+
+    # Cars scored by a worker score the same as on the parent track
+    brain_template = [12, 8, 9]
+    genomes = randomParameters(brain_template, 6, torch.Generator().manual_seed(0)).numpy()
+    task = (brain_template, genomes, 1)
+    worker_scores = GA_controller._evaluateCars(task)
+    monkeypatch.setattr(GA_controller, "_workerTrack", track)
+    assert worker_scores == GA_controller._evaluateCars(task)
@@ -0,0 +1,50 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import torch
+from time import perf_counter
+import main
+from Track.track import Track
+from Controllers.GA_controller import GA_Controller
+
+class CountingController:
+    def __init__(self):
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+def makeController(seed):
+    torch.manual_seed(seed)
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    controller = GA_Controller(track, [6], num_cars=20)
+    controller.rng = np.random.default_rng(seed)
+    return track, controller
+
+def test_run_steps_stops_at_step_count():
+    controller = CountingController()
+    assert main.runSteps(controller, 25, perf_counter() + 60) == 25
+    assert controller.updates == 25
+
+def test_run_steps_stops_at_deadline_after_one_update():
+    controller = CountingController()
+    assert main.runSteps(controller, 25, perf_counter() - 1) == 1
+    assert controller.updates == 1
+
+def test_steps_per_frame_does_not_change_the_simulation():
+    frames = 500 # Enough for several generations to die and be bred
+    track, headless = makeController(3)
+    main.runHeadless(headless, frames)
+    assert headless.generation > 1
+
+    for stepsPerFrame in (1, 7):
+        track, windowed = makeController(3)
+        main.runWindowed(track, windowed, frames, stepsPerFrame)
+
+        # Exactly frames updates ran, however they were split into rendered frames
+        assert windowed.generation == headless.generation
+        assert torch.equal(windowed.genomes, headless.genomes)
+        assert np.array_equal(windowed.fleet.pos, headless.fleet.pos)
+        assert np.array_equal(windowed.fleet.alive, headless.fleet.alive)
@@ -0,0 +1,24 @@
+import torch
+from nn import NeuralNetwork, StackedNetworks, flattenBrain, brainFromParameters, numParameters
+
+DIMENSIONS = [12, 16, 8, 9]
+
+def test_stacked_networks_match_each_brain():
+    torch.manual_seed(0)
+    brains = [NeuralNetwork(DIMENSIONS) for _ in range(5)]
+    parameters = torch.stack([flattenBrain(brain) for brain in brains])
+    assert parameters.shape == (5, numParameters(DIMENSIONS))
+
+    x = torch.randn(5, DIMENSIONS[0])
+    with torch.no_grad():
+        expected = torch.stack([brain(x[i]) for i, brain in enumerate(brains)])
+    assert torch.allclose(StackedNetworks.fromParameters(DIMENSIONS, parameters)(x), expected, atol=1e-6)
+
+def test_stacked_networks_view_their_parameters():
+    parameters = torch.randn(3, numParameters(DIMENSIONS))
+    stacked = StackedNetworks.fromParameters(DIMENSIONS, parameters)
+    x = torch.randn(3, DIMENSIONS[0])
+    parameters[1] = flattenBrain(NeuralNetwork(DIMENSIONS)) # Changed in place, like GA_Controller._replace
+    with torch.no_grad():
+        expected = brainFromParameters(DIMENSIONS, parameters[1])(x[1])
+    assert torch.allclose(stacked(x)[1], expected, atol=1e-6)
@@ -0,0 +1,69 @@
+import numpy as np
+from raycast import castRays
+from Track.track import Track
+from Cars.aicar import AICar
+from Cars.car_fleet import CarFleet
+from Cars.car_env import VecCarEnv
+
+NUM_CARS = 20
+ACTIONS = [0, 0, 0, 4, 5, 1, 3, 2, 6, 7, 8] # Mostly forward so cars reach the walls
+
+def loadDefaultTrack():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    return track
+
+def castState(sensors, speed, segments):
+    """What a state should hold, cast from scratch"""
+    distances, _ = castRays(np.asarray(sensors, dtype=np.float64).reshape(-1, 4), segments)
+    return np.append(distances, speed).astype(np.float32)
+
+def test_car_state_is_recast_after_every_move():
+    track = loadDefaultTrack()
+    segments = track.getBoundarySegments()
+    car = AICar(track)
+    rng = np.random.default_rng(0)
+    buffer = car.getState()
+    for frame in range(300):
+        if frame == 150:
+            car.reset()
+        else:
+            car.update(action=int(rng.choice(ACTIONS)))
+        state = car.getState()
+
+        assert state is buffer
+        assert np.allclose(state, castState(car.sensors, car.getSpeed(), segments), atol=1e-3)
+        assert car.getSensorData() == car.sensorDistances.tolist()
+
+def test_fleet_states_are_recast_after_every_change():
+    track = loadDefaultTrack()
+    segments = track.getBoundarySegments()
+    fleet = CarFleet(track, NUM_CARS)
+    rng = np.random.default_rng(1)
+    buffer = fleet.getStates()
+    for frame in range(300):
+        if frame % 50 == 25:
+            fleet.reset(np.arange(0, NUM_CARS, 3))
+        elif frame % 50 == 40:
+            fleet.kill(np.arange(1, NUM_CARS, 4))
+        else:
+            fleet.step(rng.choice(ACTIONS, NUM_CARS))
+        states = fleet.getStates()
+
+        assert states is buffer
+        assert (states[~fleet.alive] == 0).all()
+        for i in np.flatnonzero(fleet.alive):
+            assert np.allclose(states[i], castState(fleet.sensors[i], fleet._getSpeed([i])[0], segments), atol=1e-3)
+
+def test_env_states_stay_valid_through_the_next_step():
+    env = VecCarEnv(loadDefaultTrack(), NUM_CARS)
+    rng = np.random.default_rng(2)
+    old_states = env.reset()
+    expected_old = old_states.copy()
+    for _ in range(300):
+        states, _, _ = env.step(rng.choice(ACTIONS, NUM_CARS))
+
+        # The states handed out last step are what the replay memory stores as old states
+        assert np.array_equal(old_states, expected_old)
+        assert np.array_equal(states, env.fleet.getStates())
+        old_states, expected_old = states, states.copy()
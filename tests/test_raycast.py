@@ -0,0 +1,72 @@
+import math
+import numpy as np
+from Track.track import Track
+from raycast import castRays
+from utils import doIntersect, findIntersectionPoint
+from benchmarks.tracks import ringTrackJSON
+
+def randomRays(count, seed, center, spread=300, sensorRange=800):
+    rng = np.random.default_rng(seed)
+    starts = np.asarray(center) + rng.uniform(-spread, spread, (count, 2))
+    angles = rng.uniform(0, 2 * np.pi, count)
+    ends = starts + sensorRange * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+    return np.hstack((starts, ends))
+
+def test_grid_culled_cast_matches_full_cast():
+    for trackJSON in (open('./Track/defaultTrackCode.json', 'r').read(), ringTrackJSON(2000)):
+        track = Track()
+        track.load(trackJSON, useCache=False)
+        segments = track.getBoundarySegments()
+        rays = randomRays(400, 0, track.startPos)
+
+        full_distances, full_points = castRays(rays, segments)
+        sensors = rays.reshape(-1, 2, 2).tolist()
+        culled_distances, culled_points = castRays(rays, track.segmentGrid.segmentsAlongRays(sensors))
+        assert np.array_equal(full_distances, culled_distances)
+        assert np.array_equal(full_points, culled_points)
+
+def scalarCast(ray, segments):
+    """Closest hit along one ray by looping over every segment with utils, ties go to the first segment"""
+    p1, p2 = tuple(ray[0:2]), tuple(ray[2:4])
+    min_distance = math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+    best = p2
+    for segment in segments:
+        p, q = tuple(segment[0:2]), tuple(segment[2:4])
+        if doIntersect(p1, p2, p, q):
+            intersection = findIntersectionPoint(p1, p2, p, q)
+            distance = math.sqrt((p1[0] - intersection[0])**2 + (p1[1] - intersection[1])**2)
+            if distance < min_distance:
+                min_distance = distance
+                best = intersection
+    return min_distance, best
+
+def assertMatchesScalar(rays, segments):
+    distances, points = castRays(rays, segments)
+    for ray, distance, point in zip(np.asarray(rays, dtype=np.float64), distances.tolist(), points.tolist()):
+        expected_distance, expected_point = scalarCast(ray.tolist(), np.asarray(segments, dtype=np.float64).tolist())
+        assert distance == expected_distance
+        assert tuple(point) == tuple(expected_point)
+
+def test_castRays_matches_scalar_on_a_track():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read(), useCache=False)
+    assertMatchesScalar(randomRays(200, 1, track.startPos), track.getBoundarySegments())
+
+def test_castRays_edge_cases():
+    segments = [(10, -5, 10, 5),     # Wall across the x axis at x = 10
+                (0, 3, 20, 3),       # Wall parallel to rays along the x axis
+                (30, 0, 40, 0),      # Wall collinear with rays along the x axis
+                (50, -5, 50, 5)]
+    rays = [(0, 10, 20, 10),         # Misses everything
+            (0, 0, 10, 0),           # Ends exactly on a wall
+            (10, 0, 20, 0),          # Starts exactly on a wall
+            (0, 5, 20, 5),           # Hits a wall's end point
+            (0, 3, 5, 3),            # Runs along a parallel wall
+            (20, 0, 35, 0),          # Runs into a collinear wall
+            (0, 0, 100, 0),          # Several walls, the closest wins
+            (60, 0, 60, 0)]          # Zero length
+    assertMatchesScalar(rays, segments)
+    assertMatchesScalar(rays, np.empty((0, 4)))
+
+    distances, points = castRays([(0, 10, 20, 10)], segments)
+    assert distances.tolist() == [20] and points.tolist() == [[20, 10]]
@@ -0,0 +1,63 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+from hud import hud
+from renderer import Renderer
+from Track.track import Track
+from tests.test_main_loop import makeController
+
+WIDTH = 800
+HEIGHT = 600
+
+def test_dirty_rects_draw_the_same_frames_as_full_redraws():
+    track_dirty, dirty = makeController(5)
+    track_full, full = makeController(5)
+    renderer_dirty = Renderer(WIDTH, HEIGHT)
+    renderer_full = Renderer(WIDTH, HEIGHT, dirtyRects=False)
+    # Both draw off screen, the window can only hold one of them
+    renderer_dirty.surface = pygame.Surface((WIDTH, HEIGHT))
+    renderer_full.surface = pygame.Surface((WIDTH, HEIGHT))
+
+    try:
+        for frame in range(300):
+            # Text that gets shorter leaves old text behind unless its whole rect is restored
+            hud.publish("Test", 1000 - frame if frame % 50 < 25 else frame % 7)
+            dirty.update()
+            full.update()
+            renderer_dirty.render(track_dirty, dirty)
+            renderer_full.render(track_full, full)
+
+            assert renderer_dirty._drawnRects is not None # Frames after the first were partial
+            assert (pygame.surfarray.array3d(renderer_dirty.surface) ==
+                    pygame.surfarray.array3d(renderer_full.surface)).all(), frame
+    finally:
+        hud.clear()
+        renderer_dirty.close()
+
+def loadDefaultTrack():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    return track
+
+def test_track_edits_redraw_the_cached_layer():
+    renderer = Renderer(WIDTH, HEIGHT) # Tracks read the mouse while rendering
+    try:
+        cached = loadDefaultTrack()
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        cached.render(surface)
+        cached.clearCheckpoints()
+        cached.render(surface, [])
+
+        # Drawn from scratch, without a layer cached from before the edit
+        fresh = loadDefaultTrack()
+        fresh.clearCheckpoints()
+        expected = pygame.Surface((WIDTH, HEIGHT))
+        fresh.render(expected)
+        blank = pygame.Surface((WIDTH, HEIGHT))
+        blank.fill(Track.BACKGROUND_COLOR)
+
+        assert (pygame.surfarray.array3d(surface) == pygame.surfarray.array3d(expected)).all()
+        assert not (pygame.surfarray.array3d(surface) == pygame.surfarray.array3d(blank)).all()
+    finally:
+        renderer.close()
@@ -0,0 +1,45 @@
+from collections import deque
+import numpy as np
+from Controllers.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+
+def randomExperiences(rng, count, stateSize=3):
+    return (rng.random((count, stateSize)).astype(np.float32), rng.integers(0, 9, count),
+            rng.random((count, stateSize)).astype(np.float32), rng.standard_normal(count).astype(np.float32),
+            rng.random(count) < 0.1)
+
+def test_ring_buffer_keeps_the_same_experiences_as_a_deque():
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(50, 3)
+    memory = deque(maxlen=50) # What the controller kept experiences in before
+    for count in (7, 1, 30, 49, 50, 13):
+        experiences = randomExperiences(rng, count)
+        buffer.push(*experiences)
+        memory.extend(zip(*experiences))
+
+        assert len(buffer) == len(memory)
+        oldest_first = (buffer.cursor - len(buffer) + np.arange(len(buffer))) % buffer.capacity
+        for stored, expected in zip(buffer._gather(oldest_first), zip(*memory)):
+            assert np.array_equal(stored, np.array(expected))
+
+def test_ring_buffer_samples_distinct_stored_experiences():
+    rng = np.random.default_rng(1)
+    buffer = ReplayBuffer(64, 3, stateDtype=np.float16)
+    buffer.push(*randomExperiences(rng, 100))
+    states, actions, nextStates, rewards, dones = buffer.sample(32)
+    assert states.dtype == np.float32 and nextStates.dtype == np.float32
+    stored = {tuple(row) for row in buffer.states.astype(np.float32).tolist()}
+    sampled = [tuple(row) for row in states.tolist()]
+    assert len(set(sampled)) == 32 and set(sampled) <= stored
+
+def test_prioritized_save_restore_after_update(tmp_path):
+    buffer = PrioritizedReplayBuffer(16, 3)
+    buffer.push(np.ones((4, 3)), np.arange(4), np.zeros((4, 3)), np.ones(4), np.zeros(4, dtype=bool))
+    # TD errors come out of the network as float32
+    buffer.updatePriorities(np.arange(4), np.array([0.5, 2.0, 3.0, 0.1], dtype=np.float32))
+    buffer.save(str(tmp_path))
+
+    restored = PrioritizedReplayBuffer(16, 3)
+    restored.restore(str(tmp_path))
+    assert restored.size == 4
+    assert restored.maxPriority == buffer.maxPriority
+    assert np.allclose(restored.priorities.tree, buffer.priorities.tree)
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+import pytest
+from raycast import castRays
+from Track.track import Track
+from Track.sensor_table import SensorTable
+from Cars.car_fleet import CarFleet
+
+SENSOR_RANGE = 800
+CELL_SIZE = 16 # Coarser than the default so the table builds in a couple of seconds
+NUM_ANGLES = 64
+
+def loadDefaultTrack():
+    track = Track()
+    track.load(open('./Track/defaultTrackCode.json', 'r').read())
+    return track
+
+@pytest.fixture(scope="module")
+def table():
+    return SensorTable.build(loadDefaultTrack().getBoundarySegments(), SENSOR_RANGE, CELL_SIZE, NUM_ANGLES)
+
+def randomRays(table, count, seed):
+    rng = np.random.default_rng(seed)
+    rows, columns, _ = table.table.shape
+    starts = np.array(table.origin) + rng.random((count, 2)) * (np.array([columns, rows]) - 1) * table.cellSize
+    angles = rng.random(count) * 2 * math.pi
+    return np.hstack((starts, starts + np.stack((np.cos(angles), np.sin(angles)), axis=1) * SENSOR_RANGE))
+
+def test_answered_rays_are_close_to_raycasts(table):
+    segments = loadDefaultTrack().getBoundarySegments()
+    rays = randomRays(table, 20000, 0)
+    approximate = table.lookup(rays)
+    answered = ~np.isnan(approximate)
+    exact, _ = castRays(rays[answered], segments)
+
+    assert answered.mean() > 0.1
+    errors = np.abs(approximate[answered] - exact)
+    assert errors.mean() < 1
+    assert errors.max() <= table.maxSpread
+
+def test_grid_samples_match_raycasts(table):
+    segments = loadDefaultTrack().getBoundarySegments()
+    sampled = np.argwhere((table.table != table.missing).all(axis=2))
+    row, column = sampled[len(sampled) // 2]
+    start = np.array(table.origin) + table.cellSize * np.array([column, row])
+    angles = 2 * math.pi * np.arange(NUM_ANGLES) / NUM_ANGLES
+    rays = np.hstack((np.tile(start, (NUM_ANGLES, 1)),
+                      start + np.stack((np.cos(angles), np.sin(angles)), axis=1) * SENSOR_RANGE))
+    exact, _ = castRays(rays, segments)
+    samples = table.table[row, column].astype(np.float64) * table.scale
+
+    assert np.allclose(samples, exact, atol=table.scale / 2 + 1e-9)
+
+def test_rays_it_cannot_answer_are_nan(table):
+    rows, columns, _ = table.table.shape
+    inside = np.array(table.origin) + table.cellSize * np.array([columns, rows]) / 2
+    outside = np.array(table.origin) - table.cellSize * 10
+    unsampled = np.argwhere((table.table == table.missing).all(axis=2))[0]
+    unsampled = np.array(table.origin) + table.cellSize * (unsampled[::-1] + 0.5)
+    rays = np.array([
+        [*outside, *(outside + [SENSOR_RANGE, 0])], # Off the grid
+        [*unsampled, *(unsampled + [SENSOR_RANGE, 0])], # Off the track
+        [*inside, *(inside + [SENSOR_RANGE / 2, 0])], # Too short
+    ])
+
+    assert np.isnan(table.lookup(rays)).all()
+
+def test_saved_table_answers_the_same(table, tmp_path):
+    path = str(tmp_path / "table")
+    table.save(path)
+    rays = randomRays(table, 2000, 1)
+
+    assert np.array_equal(SensorTable.load(path).lookup(rays), table.lookup(rays), equal_nan=True)
+
+def test_fleet_senses_like_without_the_table(tmp_path):
+    exact_track = loadDefaultTrack()
+    table_track = loadDefaultTrack()
+    table_track.enableSensorTable(SENSOR_RANGE, cellSize=CELL_SIZE, numAngles=NUM_ANGLES, cacheDirectory=str(tmp_path))
+    exact = CarFleet(exact_track, 20)
+    approximate = CarFleet(table_track, 20)
+
+    rng = np.random.default_rng(2)
+    answered = 0
+    for _ in range(200):
+        # Sensing doesn't change how cars move, both fleets drive the same way
+        actions = rng.choice([0, 0, 0, 4, 5, 1, 3, 2, 6, 7, 8], 20)
+        exact.step(actions)
+        approximate.step(actions)
+
+        assert np.array_equal(exact.alive, approximate.alive)
+        assert np.allclose(exact.getStates(), approximate.getStates(), atol=table_track.sensorTable.maxSpread)
+        sensors = approximate.sensors[approximate.alive].reshape(-1, 4)
+        answered += np.count_nonzero(~np.isnan(table_track.sensorTable.lookup(sensors)))
+
+    assert answered > 0 # Not every sensor fell back to raycasting
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import utils
+import vec_utils
+
+# (A, B, C, D): segments AB and CD the scalar and vectorized versions are most likely to disagree on
+EDGE_CASES = {
+    "crossing": ((0, 0), (10, 10), (0, 10), (10, 0)),
+    "collinear overlap": ((0, 0), (10, 0), (5, 0), (15, 0)),
+    "collinear disjoint": ((0, 0), (4, 0), (5, 0), (15, 0)),
+    "collinear touching": ((0, 0), (5, 0), (5, 0), (15, 0)),
+    "touching endpoints": ((0, 0), (5, 5), (5, 5), (10, 0)),
+    "endpoint on segment": ((0, 0), (10, 0), (5, 0), (5, 7)),
+    "parallel": ((0, 0), (10, 0), (0, 1), (10, 1)),
+    "parallel diagonal": ((0, 0), (10, 10), (1, 0), (11, 10)),
+    "zero length on segment": ((0, 0), (10, 0), (3, 0), (3, 0)),
+    "zero length off segment": ((0, 0), (10, 0), (3, 1), (3, 1)),
+    "both zero length, same point": ((2, 2), (2, 2), (2, 2), (2, 2)),
+    "both zero length, apart": ((2, 2), (2, 2), (3, 3), (3, 3)),
+    "near miss": ((0, 0), (10, 0), (10.000001, -1), (10.000001, 1)),
+}
+
+def randomSegments(count, seed):
+    """Random segments on a small integer grid, so collinear and touching cases come up often"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 6, (count, 4)).astype(np.float64), rng.integers(0, 6, (count, 4)).astype(np.float64)
+
+def scalarIntersects(ab, cd):
+    return [utils.doIntersect(tuple(a[0:2]), tuple(a[2:4]), tuple(c[0:2]), tuple(c[2:4])) for a, c in zip(ab, cd)]
+
+@pytest.mark.parametrize("case", EDGE_CASES)
+def test_doIntersect_edge_cases(case):
+    A, B, C, D = EDGE_CASES[case]
+    for p1, q1, p2, q2 in ((A, B, C, D), (C, D, A, B), (B, A, D, C)):
+        assert bool(vec_utils.doIntersect(p1, q1, p2, q2)) == utils.doIntersect(p1, q1, p2, q2)
+
+def test_doIntersect_random():
+    ab, cd = randomSegments(5000, 0)
+    assert vec_utils.segmentsIntersect(ab, cd).tolist() == scalarIntersects(ab, cd)
+
+    # Continuous coordinates too, and broadcasting one segment against many
+    rng = np.random.default_rng(1)
+    ab, cd = rng.uniform(-100, 100, (2000, 4)), rng.uniform(-100, 100, (2000, 4))
+    assert vec_utils.segmentsIntersect(ab, cd).tolist() == scalarIntersects(ab, cd)
+    assert vec_utils.segmentsIntersect(ab[0], cd).tolist() == scalarIntersects(np.broadcast_to(ab[0], cd.shape), cd)
+
+@pytest.mark.parametrize("case", EDGE_CASES)
+def test_findIntersectionPoints_edge_cases(case):
+    A, B, C, D = EDGE_CASES[case]
+    points, parallel = vec_utils.findIntersectionPoints((*A, *B), (*C, *D))
+    expected = utils.findIntersectionPoint(A, B, C, D)
+    if expected == (10**9, 10**9):
+        assert parallel and np.isnan(points).all()
+    else:
+        assert not parallel and tuple(points.tolist()) == expected
+
+def test_findIntersectionPoints_random():
+    for ab, cd in (randomSegments(5000, 2), np.random.default_rng(3).uniform(-100, 100, (2, 2000, 4))):
+        points, parallel = vec_utils.findIntersectionPoints(ab, cd)
+        for a, c, point, is_parallel in zip(ab, cd, points.tolist(), parallel.tolist()):
+            expected = utils.findIntersectionPoint(tuple(a[0:2]), tuple(a[2:4]), tuple(c[0:2]), tuple(c[2:4]))
+            if expected == (10**9, 10**9):
+                assert is_parallel
+            else:
+                assert not is_parallel and tuple(point) == expected
+
+def test_transforms_match_scalar():
+    rng = np.random.default_rng(4)
+    points = rng.uniform(-50, 50, (100, 2))
+    thetas = rng.uniform(-7, 7, 100)
+    offsets = rng.uniform(-50, 50, (100, 2))
+    for point, theta, offset, rotated, moved, both in zip(points, thetas, offsets,
+                                                         vec_utils.rotateClockwise2d(points, thetas).tolist(),
+                                                         vec_utils.translate2d(points, offsets).tolist(),
+                                                         vec_utils.rotateTranslate2d(points, thetas, offsets).tolist()):
+        assert tuple(rotated) == utils.rotateClockwise2d(tuple(point), theta)
+        assert tuple(moved) == utils.translate2d(tuple(point), tuple(offset))
+        assert tuple(both) == utils.translate2d(utils.rotateClockwise2d(tuple(point), theta), tuple(offset))
+    assert vec_utils.scale2d(points, 3.5).tolist() == [list(utils.scale2d(tuple(point), 3.5)) for point in points]
@@ -0,0 +1,152 @@
+import numpy as np
+
+# Array counterparts of the geometry helpers in utils.
+#
+# Points are arrays of shape (..., 2) and segments are arrays of shape (..., 4) holding rows
+# (x1, y1, x2, y2). Every function broadcasts over the leading axes, so e.g. (N, 1, 4) hitbox
+# edges against (1, S, 4) track segments gives an (N, S) result. The formulas are written in the
+# same order as in utils so results match the scalar versions exactly.
+
+def onSegment(p, q, r):
+    """utils.onSegment over arrays of points: q lies within the bounding box of segment pr
+
+    Args:
+        p, q, r: broadcastable float arrays of shape (..., 2)
+    Returns:
+        bool array of shape (...)
+    """
+    p, q, r = np.asarray(p), np.asarray(q), np.asarray(r)
+    return ((q[..., 0] <= np.maximum(p[..., 0], r[..., 0])) & (q[..., 0] >= np.minimum(p[..., 0], r[..., 0])) &
+            (q[..., 1] <= np.maximum(p[..., 1], r[..., 1])) & (q[..., 1] >= np.minimum(p[..., 1], r[..., 1])))
+
+def orientation(p, q, r):
+    """utils.orientation over arrays of points
+
+    Args:
+        p, q, r: broadcastable float arrays of shape (..., 2)
+    Returns:
+        int array of shape (...), 0 (collinear), 1 (clockwise) or 2 (counterclockwise)
+    """
+    p, q, r = np.asarray(p), np.asarray(q), np.asarray(r)
+    val = (q[..., 1] - p[..., 1]) * (r[..., 0] - q[..., 0]) - (q[..., 0] - p[..., 0]) * (r[..., 1] - q[..., 1])
+    return np.where(val > 0, 1, np.where(val < 0, 2, 0))
+
+def doIntersect(p1, q1, p2, q2):
+    """utils.doIntersect over arrays of points, checks if segments p1q1 and p2q2 intersect
+
+    Args:
+        p1, q1, p2, q2: broadcastable float arrays of shape (..., 2)
+    Returns:
+        bool array of shape (...)
+    """
+    o1 = orientation(p1, q1, p2)
+    o2 = orientation(p1, q1, q2)
+    o3 = orientation(p2, q2, p1)
+    o4 = orientation(p2, q2, q1)
+
+    # General case
+    hit = (o1 != o2) & (o3 != o4)
+
+    # Special cases, one endpoint is collinear with and lies on the other segment
+    hit |= (o1 == 0) & onSegment(p1, p2, q1)
+    hit |= (o2 == 0) & onSegment(p1, q2, q1)
+    hit |= (o3 == 0) & onSegment(p2, p1, q2)
+    hit |= (o4 == 0) & onSegment(p2, q1, q2)
+    return hit
+
+def segmentsIntersect(ab, cd):
+    """doIntersect for segments given as (..., 4) arrays
+
+    Args:
+        ab, cd: broadcastable float arrays of shape (..., 4)
+    Returns:
+        bool array of shape (...)
+    """
+    ab, cd = np.asarray(ab), np.asarray(cd)
+    return doIntersect(ab[..., 0:2], ab[..., 2:4], cd[..., 0:2], cd[..., 2:4])
+
+def findIntersectionPoints(ab, cd):
+    """utils.findIntersectionPoint of the lines through segments given as (..., 4) arrays
+
+    Unlike the scalar version, parallel lines give NaN rather than (10**9, 10**9).
+
+    Args:
+        ab, cd: broadcastable float arrays of shape (..., 4)
+    Returns:
+        (points, parallel) where points is a float array of shape (..., 2), NaN where the lines
+        are parallel, and parallel is the bool array of shape (...) of those cases
+    """
+    ab, cd = np.asarray(ab, dtype=np.float64), np.asarray(cd, dtype=np.float64)
+    ax, ay, bx, by = ab[..., 0], ab[..., 1], ab[..., 2], ab[..., 3]
+    cx, cy, dx, dy = cd[..., 0], cd[..., 1], cd[..., 2], cd[..., 3]
+
+    # Line AB represented as a1x + b1y = c1
+    a1 = by - ay
+    b1 = ax - bx
+    c1 = a1 * ax + b1 * ay
+
+    # Line CD represented as a2x + b2y = c2
+    a2 = dy - cy
+    b2 = cx - dx
+    c2 = a2 * cx + b2 * cy
+
+    determinant = a1 * b2 - a2 * b1
+    parallel = determinant == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (b2 * c1 - b1 * c2) / determinant
+        y = (a1 * c2 - a2 * c1) / determinant
+    points = np.stack((x, y), axis=-1)
+    points[parallel] = np.nan
+    return points, parallel
+
+def rotateClockwise2d(points, theta):
+    """utils.rotateClockwise2d over arrays of points, cos and sin are computed once per angle
+
+    Args:
+        points: float array of shape (..., 2)
+        theta: radians to rotate clockwise, a scalar or an array broadcastable to (...)
+    Returns:
+        rotated points, float array of shape (..., 2)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    theta = np.asarray(theta, dtype=np.float64)
+    return _rotate(points, np.cos(theta), np.sin(theta))
+
+def translate2d(points, translation):
+    """utils.translate2d over arrays of points
+
+    Args:
+        points: float array of shape (..., 2)
+        translation: float array broadcastable to (..., 2)
+    Returns:
+        translated points, float array of shape (..., 2)
+    """
+    return np.asarray(points, dtype=np.float64) + translation
+
+def scale2d(points, c):
+    """utils.scale2d over arrays of points
+
+    Args:
+        points: float array of shape (..., 2)
+        c: scalar or array broadcastable to (...)
+    Returns:
+        scaled points, float array of shape (..., 2)
+    """
+    return np.asarray(c, dtype=np.float64)[..., None] * np.asarray(points, dtype=np.float64)
+
+def rotateTranslate2d(points, theta, translation):
+    """translate2d(rotateClockwise2d(points, theta), translation) in one pass
+
+    Used to place shapes given relative to a car, e.g. (4, 2) hitbox offsets rotated by each
+    car's direction of shape (N, 1) and moved to its position of shape (N, 1, 2).
+
+    Returns:
+        float array of the broadcast shape (..., 2)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    theta = np.asarray(theta, dtype=np.float64)
+    return translate2d(_rotate(points, np.cos(theta), np.sin(theta)), translation)
+
+def _rotate(points, cos, sin):
+    x, y = points[..., 0], points[..., 1]
+    return np.stack((x * cos + -y * sin, x * sin + y * cos), axis=-1)